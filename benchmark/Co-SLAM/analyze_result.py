@@ -51,10 +51,15 @@ for foldername in os.listdir(root_folder):
                     data = file.read()
                 error_mean = float(data.split(' ')[5][:-1])
                 perturb_config = subsubfoldername.split('_')
+                # runs with a perturb_seed other than 0 end in _pseed_<seed>
+                pseed = ""
+                if len(perturb_config) > 2 and perturb_config[-2] == 'pseed':
+                    pseed = "_pseed" + perturb_config[-1]
+                    perturb_config = perturb_config[:-2]
                 # Append the results to the list
                 if len(perturb_config)<=4:
                     print( perturb_mapping[int(perturb_config[1])])
-                    results.append((subfolder_path.split(os.sep)[-1], perturb_mapping[int(perturb_config[1])]+"_"+severity_mapping[int(perturb_config[2])]+"_"+dynamic_mapping[int(perturb_config[3])], error_mean))
+                    results.append((subfolder_path.split(os.sep)[-1], perturb_mapping[int(perturb_config[1])]+"_"+severity_mapping[int(perturb_config[2])]+"_"+dynamic_mapping[int(perturb_config[3])]+pseed, error_mean))
 
 # Define the path to the output CSV file
 csv_file_path = './replica_output.csv'
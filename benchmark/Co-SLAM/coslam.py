@@ -10,9 +10,9 @@ import torch.nn.functional as F
 import argparse
 import shutil
 import json
+import time
 import cv2
 
-from torch.utils.data import DataLoader
 from tqdm import tqdm
 
 # Local imports
@@ -20,9 +20,13 @@ import config
 from model.scene_rep import JointEncoding
 from model.keyframe import KeyFrameDatabase
 from datasets.dataset import get_dataset
+from datasets.prefetch import DevicePrefetcher
+from datasets.utils import pixel_table
 from utils import coordinates, extract_mesh, colormap_image
+from mesher import IncrementalMesher
 from tools.eval_ate import pose_evaluation
-from optimization.utils import at_to_transform_matrix, qt_to_transform_matrix, matrix_to_axis_angle, matrix_to_quaternion
+from slam_perturbation import profiling, results
+from optimization.utils import at_to_transform_matrix, qt_to_transform_matrix, matrix_to_axis_angle, matrix_to_quaternion, axis_angle_to_matrix
 
 
 class CoSLAM():
@@ -36,6 +40,7 @@ class CoSLAM():
         self.get_pose_representation()
         self.keyframeDatabase = self.create_kf_database(config)
         self.model = JointEncoding(config, self.bounding_box).to(self.device)
+        self.mesher = self.create_mesher(config)
     
     def seed_everything(self, seed):
         random.seed(seed)
@@ -89,6 +94,33 @@ class CoSLAM():
                                 self.dataset.num_rays_to_save, 
                                 self.device)
     
+    def create_mesher(self, config):
+        '''
+        Incremental mesher of the periodic snapshots, None to extract them from scratch
+        '''
+        if not config['mesh'].get('incremental', True):
+            return None
+        return IncrementalMesher(self.model.query_sdf,
+                                 config,
+                                 self.bounding_box,
+                                 marching_cube_bound=self.marching_cube_bound,
+                                 voxel_size=config['mesh']['voxel_eval'],
+                                 block_size=config['mesh'].get('block_size', 32),
+                                 refresh_every=config['mesh'].get('refresh_every', 10))
+
+    def touch_mesh(self, batch, frame_id, step=8):
+        '''
+        Mark the mesh blocks around the surface seen by a keyframe for the next snapshot
+        '''
+        if self.mesher is None:
+            return
+        c2w = self.est_c2w_data[frame_id].to(self.device)
+        rays_d_cam = batch['direction'].squeeze(0)[::step, ::step].reshape(-1, 3).to(self.device)
+        depth = batch['depth'].squeeze(0)[::step, ::step].reshape(-1, 1).to(self.device)
+        valid = depth[:, 0] > 0
+        pts = c2w[None, :3, -1] + torch.sum((rays_d_cam * depth)[valid, None, :] * c2w[:3, :3], -1)
+        self.mesher.touch(pts)
+
     def load_gt_pose(self):
         '''
         Load the ground truth pose
@@ -113,6 +145,20 @@ class CoSLAM():
         torch.save(save_dict, save_path)
         print('Save the checkpoint')
 
+    def record_run(self, timings):
+        '''
+        Write the structured record of the run (ATE / RPE, per-frame errors, timings, peak memory)
+        next to its outputs and append it to the results store
+        '''
+        frames = sorted(self.est_c2w_data.keys())
+        gt = torch.stack([self.pose_gt[i] for i in frames]).cpu().numpy()
+        est = torch.stack([self.est_c2w_data[i] for i in frames]).detach().cpu().numpy()
+        return results.record_run('coslam', os.path.basename(os.path.normpath(self.config['data']['datadir'])),
+                                  self.config.get('robustness', {}), gt, est, valid=np.isfinite(gt).all((1, 2)),
+                                  downsample=self.config['data'].get('trainskip', 1), timings=timings, config=self.config,
+                                  output_dir=os.path.join(self.config['data']['output'], self.config['data']['exp_name']),
+                                  db=self.config['data'].get('results_db'))
+
     def load_ckpt(self, load_path):
         '''
         Load the model parameters and the estimated pose
@@ -128,7 +174,7 @@ class CoSLAM():
         '''
         #indice = torch.randint(H*W, (samples,))
         indice = random.sample(range(H * W), int(samples))
-        indice = torch.tensor(indice)
+        indice = torch.tensor(indice, device=self.device)
         return indice
 
     def get_loss_from_ret(self, ret, rgb=True, sdf=True, depth=True, fs=True, smooth=False):
@@ -171,16 +217,16 @@ class CoSLAM():
         self.est_c2w_data_rel[0] = c2w
 
         self.model.train()
+        pixels = pixel_table(self.dataset.H, self.dataset.W, device=self.device)
 
         # Training
-        for i in range(n_iters):
+        for i in profiling.iterations(range(n_iters), 'map iter'):
             self.map_optimizer.zero_grad()
-            indice = self.select_samples(self.dataset.H, self.dataset.W, self.config['mapping']['sample'])
-            
-            indice_h, indice_w = indice % (self.dataset.H), indice // (self.dataset.H)
-            rays_d_cam = batch['direction'].squeeze(0)[indice_h, indice_w, :].to(self.device)
-            target_s = batch['rgb'].squeeze(0)[indice_h, indice_w, :].to(self.device)
-            target_d = batch['depth'].squeeze(0)[indice_h, indice_w].to(self.device).unsqueeze(-1)
+            indice = pixels.sample(self.config['mapping']['sample'])
+
+            rays_d_cam = batch['direction'].reshape(-1, 3)[indice]
+            target_s = batch['rgb'].reshape(-1, 3)[indice]
+            target_d = batch['depth'].reshape(-1, 1)[indice]
 
             rays_o = c2w[None, :3, -1].repeat(self.config['mapping']['sample'], 1)
             rays_d = torch.sum(rays_d_cam[..., None, :] * c2w[:3, :3], -1)
@@ -193,6 +239,7 @@ class CoSLAM():
         
         # First frame will always be a keyframe
         self.keyframeDatabase.add_keyframe(batch, filter_depth=self.config['mapping']['filter_depth'])
+        self.touch_mesh(batch, 0)
         if self.config['mapping']['first_mesh']:
             self.save_mesh(0)
         
@@ -219,16 +266,16 @@ class CoSLAM():
         c2w = self.est_c2w_data[cur_frame_id].to(self.device)
 
         self.model.train()
+        pixels = pixel_table(self.dataset.H, self.dataset.W, device=self.device)
 
         # Training
-        for i in range(self.config['mapping']['cur_frame_iters']):
+        for i in profiling.iterations(range(self.config['mapping']['cur_frame_iters']), 'map iter'):
             self.cur_map_optimizer.zero_grad()
-            indice = self.select_samples(self.dataset.H, self.dataset.W, self.config['mapping']['sample'])
-            
-            indice_h, indice_w = indice % (self.dataset.H), indice // (self.dataset.H)
-            rays_d_cam = batch['direction'].squeeze(0)[indice_h, indice_w, :].to(self.device)
-            target_s = batch['rgb'].squeeze(0)[indice_h, indice_w, :].to(self.device)
-            target_d = batch['depth'].squeeze(0)[indice_h, indice_w].to(self.device).unsqueeze(-1)
+            indice = pixels.sample(self.config['mapping']['sample'])
+
+            rays_d_cam = batch['direction'].reshape(-1, 3)[indice]
+            target_s = batch['rgb'].reshape(-1, 3)[indice]
+            target_d = batch['depth'].reshape(-1, 1)[indice]
 
             rays_o = c2w[None, :3, -1].repeat(self.config['mapping']['sample'], 1)
             rays_d = torch.sum(rays_d_cam[..., None, :] * c2w[:3, :3], -1)
@@ -324,7 +371,7 @@ class CoSLAM():
 
         
 
-        for i in range(self.config['mapping']['iters']):
+        for i in profiling.iterations(range(self.config['mapping']['iters']), 'BA iter'):
 
             # Sample rays with real frame ids
             # rays [bs, 7]
@@ -335,13 +382,13 @@ class CoSLAM():
             idx_cur = random.sample(range(0, self.dataset.H * self.dataset.W),max(self.config['mapping']['sample'] // len(self.keyframeDatabase.frame_ids), self.config['mapping']['min_pixels_cur']))
             current_rays_batch = current_rays[idx_cur, :]
 
-            rays = torch.cat([rays, current_rays_batch], dim=0) # N, 7
-            ids_all = torch.cat([ids//self.config['mapping']['keyframe_every'], -torch.ones((len(idx_cur)))]).to(torch.int64)
+            rays = torch.cat([rays.to(self.device), current_rays_batch], dim=0) # N, 7
+            ids_all = torch.cat([ids//self.config['mapping']['keyframe_every'], -torch.ones((len(idx_cur)), device=ids.device)]).to(torch.int64)
 
 
-            rays_d_cam = rays[..., :3].to(self.device)
-            target_s = rays[..., 3:6].to(self.device)
-            target_d = rays[..., 6:7].to(self.device)
+            rays_d_cam = rays[..., :3]
+            target_s = rays[..., 3:6]
+            target_d = rays[..., 6:7]
 
             # [N, Bs, 1, 3] * [N, 1, 3, 3] = (N, Bs, 3)
             rays_d = torch.sum(rays_d_cam[..., None, None, :] * poses_all[ids_all, None, :3, :3], -1)
@@ -428,16 +475,12 @@ class CoSLAM():
         thresh=0
 
         if self.config['tracking']['iter_point'] > 0:
-            indice_pc = self.select_samples(self.dataset.H-iH*2, self.dataset.W-iW*2, self.config['tracking']['pc_samples'])
-            rays_d_cam = batch['direction'][:, iH:-iH, iW:-iW].reshape(-1, 3)[indice_pc].to(self.device)
-            target_s = batch['rgb'][:, iH:-iH, iW:-iW].reshape(-1, 3)[indice_pc].to(self.device)
-            target_d = batch['depth'][:, iH:-iH, iW:-iW].reshape(-1, 1)[indice_pc].to(self.device)
-
-            valid_depth_mask = ((target_d > 0.) * (target_d < 5.))[:,0]
-
-            rays_d_cam = rays_d_cam[valid_depth_mask]
-            target_s = target_s[valid_depth_mask]
-            target_d = target_d[valid_depth_mask]
+            # only pixels with a valid depth are drawn, instead of dropping the invalid ones after drawing
+            pixels = pixel_table(self.dataset.H, self.dataset.W, iH, iW, self.device).valid_depth(batch['depth'], 0., 5.)
+            indice_pc = pixels.sample(min(self.config['tracking']['pc_samples'], len(pixels)))
+            rays_d_cam = batch['direction'].reshape(-1, 3)[indice_pc]
+            target_s = batch['rgb'].reshape(-1, 3)[indice_pc]
+            target_d = batch['depth'].reshape(-1, 1)[indice_pc]
 
             for i in range(self.config['tracking']['iter_point']):
                 pose_optimizer.zero_grad()
@@ -503,6 +546,8 @@ class CoSLAM():
             batch['direction']: Ray direction [B, H, W, 3]
             frame_id: Current frame id (int)
         '''
+        if self.config['tracking'].get('hypotheses', 1) > 1:
+            return self.tracking_render_batched(batch, frame_id)
 
         c2w_gt = batch['c2w'][0].to(self.device)
 
@@ -522,19 +567,16 @@ class CoSLAM():
         cur_rot, cur_trans, pose_optimizer = self.get_pose_param_optim(cur_c2w[None,...], mapping=False)
 
         # Start tracking
-        for i in range(self.config['tracking']['iter']):
+        for i in profiling.iterations(range(self.config['tracking']['iter']), 'track iter'):
             pose_optimizer.zero_grad()
             c2w_est = self.matrix_from_tensor(cur_rot, cur_trans)
 
             # Note here we fix the sampled points for optimisation
             if indice is None:
-                indice = self.select_samples(self.dataset.H-iH*2, self.dataset.W-iW*2, self.config['tracking']['sample'])
-            
-                # Slicing
-                indice_h, indice_w = indice % (self.dataset.H - iH * 2), indice // (self.dataset.H - iH * 2)
-                rays_d_cam = batch['direction'].squeeze(0)[iH:-iH, iW:-iW, :][indice_h, indice_w, :].to(self.device)
-            target_s = batch['rgb'].squeeze(0)[iH:-iH, iW:-iW, :][indice_h, indice_w, :].to(self.device)
-            target_d = batch['depth'].squeeze(0)[iH:-iH, iW:-iW][indice_h, indice_w].to(self.device).unsqueeze(-1)
+                indice = pixel_table(self.dataset.H, self.dataset.W, iH, iW, self.device).sample(self.config['tracking']['sample'])
+                rays_d_cam = batch['direction'].reshape(-1, 3)[indice]
+                target_s = batch['rgb'].reshape(-1, 3)[indice]
+                target_d = batch['depth'].reshape(-1, 1)[indice]
 
             rays_o = c2w_est[...,:3, -1].repeat(self.config['tracking']['sample'], 1)
             rays_d = torch.sum(rays_d_cam[..., None, :] * c2w_est[:, :3, :3], -1)
@@ -578,6 +620,92 @@ class CoSLAM():
             self.est_c2w_data_rel[frame_id] = delta
         
         print('Best loss: {}, Last loss{}'.format(F.l1_loss(best_c2w_est.to(self.device)[0,:3], c2w_gt[:3]).cpu().item(), F.l1_loss(c2w_est[0,:3], c2w_gt[:3]).cpu().item()))
+
+    def pose_hypotheses(self, frame_id, n):
+        '''
+        Initial poses [n, 4, 4] for batched tracking: the prediction of the motion
+        model (tracking.const_speed), previous pose, then the prediction jittered by
+        tracking.jitter_rot (rad) and tracking.jitter_trans
+        '''
+        c2w_pred = self.predict_current_pose(frame_id, self.config['tracking']['const_speed']).to(self.device)
+        c2w_prev = self.est_c2w_data[frame_id-1].to(self.device)
+        poses = [c2w_pred, c2w_prev][:n]
+        n_jitter = n - len(poses)
+        if n_jitter > 0:
+            jitter = c2w_pred[None].repeat(n_jitter, 1, 1)
+            rot = torch.randn(n_jitter, 3, device=self.device) * self.config['tracking'].get('jitter_rot', 0.01)
+            jitter[:, :3, :3] = axis_angle_to_matrix(rot) @ c2w_pred[:3, :3]
+            jitter[:, :3, 3] += torch.randn(n_jitter, 3, device=self.device) * self.config['tracking'].get('jitter_trans', 0.02)
+            poses += list(jitter)
+        return torch.stack(poses)
+
+    def tracking_render_batched(self, batch, frame_id):
+        '''
+        Tracking camera pose of the current frame from tracking.hypotheses initial poses
+        optimized together (see pose_hypotheses). The hypotheses share the sampled
+        pixels and one render per iteration, and the best pose seen is kept on the
+        device, so the loop never waits for the losses. tracking.wait_iters would need
+        them on the host and is not used here.
+        Params:
+            batch: as in tracking_render
+            frame_id: Current frame id (int)
+        '''
+        c2w_gt = batch['c2w'][0].to(self.device)
+        n_hyp = self.config['tracking']['hypotheses']
+        n_rays = self.config['tracking']['sample']
+
+        poses = self.pose_hypotheses(frame_id, n_hyp)
+        cur_rot, cur_trans, pose_optimizer = self.get_pose_param_optim(poses, mapping=False)
+
+        iW = self.config['tracking']['ignore_edge_W']
+        iH = self.config['tracking']['ignore_edge_H']
+        indice = pixel_table(self.dataset.H, self.dataset.W, iH, iW, self.device).sample(n_rays)
+        rays_d_cam = batch['direction'].reshape(-1, 3)[indice]
+        target_s = batch['rgb'].reshape(-1, 3)[indice].repeat(n_hyp, 1)
+        target_d = batch['depth'].reshape(-1, 1)[indice].repeat(n_hyp, 1)
+
+        best_loss = torch.full((n_hyp,), float('inf'), device=self.device)
+        best_c2w_est = poses.clone()
+
+        for i in profiling.iterations(range(self.config['tracking']['iter']), 'track iter'):
+            pose_optimizer.zero_grad()
+            c2w_est = self.matrix_from_tensor(cur_rot, cur_trans)
+
+            # [n_hyp, n_rays, 3] rays, hypothesis by hypothesis
+            rays_o = c2w_est[:, None, :3, -1].expand(-1, n_rays, -1).reshape(-1, 3)
+            rays_d = torch.sum(rays_d_cam[None, :, None, :] * c2w_est[:, None, :3, :3], -1).reshape(-1, 3)
+
+            ret = self.model.forward(rays_o, rays_d, target_s, target_d, groups=n_hyp)
+            loss = self.get_loss_from_ret(ret)
+
+            with torch.no_grad():
+                improved = loss < best_loss
+                best_loss = torch.where(improved, loss, best_loss)
+                best_c2w_est = torch.where(improved[:, None, None], c2w_est.detach(), best_c2w_est)
+
+            # hypotheses do not share parameters, their gradients stay apart
+            loss.sum().backward()
+            pose_optimizer.step()
+
+        best = torch.argmin(best_loss)
+        if self.config['tracking']['best']:
+            # Use the pose with smallest loss
+            self.est_c2w_data[frame_id] = best_c2w_est[best].detach().clone()
+        else:
+            # Use the pose after the last iteration, of the hypothesis with the smallest last loss
+            with torch.no_grad():
+                c2w_est = self.matrix_from_tensor(cur_rot, cur_trans)
+            self.est_c2w_data[frame_id] = c2w_est[torch.argmin(loss.detach())].detach().clone()
+
+        # Save relative pose of non-keyframes
+        if frame_id % self.config['mapping']['keyframe_every'] != 0:
+            kf_id = frame_id // self.config['mapping']['keyframe_every']
+            kf_frame_id = kf_id * self.config['mapping']['keyframe_every']
+            c2w_key = self.est_c2w_data[kf_frame_id]
+            delta = self.est_c2w_data[frame_id] @ c2w_key.float().inverse()
+            self.est_c2w_data_rel[frame_id] = delta
+
+        print('Hypothesis {}, best loss: {}'.format(best.item(), F.l1_loss(self.est_c2w_data[frame_id][:3].to(self.device), c2w_gt[:3]).cpu().item()))
     
     def convert_relative_pose(self):
         poses = {}
@@ -615,12 +743,15 @@ class CoSLAM():
             self.cur_map_optimizer = optim.Adam(params_cur_mapping, betas=(0.9, 0.99))
         
     
-    def save_mesh(self, i, voxel_size=0.05):
+    def save_mesh(self, i, voxel_size=0.05, incremental=False):
         mesh_savepath = os.path.join(self.config['data']['output'], self.config['data']['exp_name'], 'mesh_track{}.ply'.format(i))
         if self.config['mesh']['render_color']:
             color_func = self.model.render_surface_color
         else:
             color_func = self.model.query_color
+        if incremental and self.mesher is not None:
+            self.mesher.extract(color_func=color_func, mesh_savepath=mesh_savepath)
+            return
         extract_mesh(self.model.query_sdf, 
                         self.config, 
                         self.bounding_box, 
@@ -630,11 +761,14 @@ class CoSLAM():
                         mesh_savepath=mesh_savepath)      
         
     def run(self):
+        start_time = time.time()
         self.create_optimizer()
-        data_loader = DataLoader(self.dataset, num_workers=self.config['data']['num_workers'])
+        # frames arrive on the device, the mapping / tracking iterations below only index them
+        data_loader = DevicePrefetcher(self.dataset, self.device, num_workers=self.config['data']['num_workers'])
 
         # Start Co-SLAM!
-        for i, batch in tqdm(enumerate(data_loader)):
+        for i, batch in tqdm(enumerate(profiling.iterate(data_loader))):
+            profiling.frame(i)
             # Visualisation
             if self.config['mesh']['visualisation']:
                 rgb = cv2.cvtColor(batch["rgb"].squeeze().cpu().numpy(), cv2.COLOR_BGR2RGB)
@@ -650,30 +784,38 @@ class CoSLAM():
 
             # First frame mapping
             if i == 0:
-                self.first_frame_mapping(batch, self.config['mapping']['first_iters'])
+                with profiling.span('map'):
+                    self.first_frame_mapping(batch, self.config['mapping']['first_iters'])
             
             # Tracking + Mapping
             else:
-                if self.config['tracking']['iter_point'] > 0:
-                    self.tracking_pc(batch, i)
-                self.tracking_render(batch, i)
+                with profiling.span('track'):
+                    if self.config['tracking']['iter_point'] > 0:
+                        self.tracking_pc(batch, i)
+                    self.tracking_render(batch, i)
     
                 if i%self.config['mapping']['map_every']==0:
-                    self.current_frame_mapping(batch, i)
-                    self.global_BA(batch, i)
+                    with profiling.span('map'):
+                        self.current_frame_mapping(batch, i)
+                    with profiling.span('BA'):
+                        self.global_BA(batch, i)
 
                     
                 # Add keyframe
                 if i % self.config['mapping']['keyframe_every'] == 0:
                     self.keyframeDatabase.add_keyframe(batch, filter_depth=self.config['mapping']['filter_depth'])
+                    self.touch_mesh(batch, i)
+                    profiling.count('keyframes')
                     print('add keyframe:',i)
             
 
                 if i % self.config['mesh']['vis']==0:
-                    self.save_mesh(i, voxel_size=self.config['mesh']['voxel_eval'])
-                    pose_relative = self.convert_relative_pose()
-                    pose_evaluation(self.pose_gt, self.est_c2w_data, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i)
-                    pose_evaluation(self.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i, img='pose_r', name='output_relative.txt')
+                    with profiling.span('mesh'):
+                        self.save_mesh(i, voxel_size=self.config['mesh']['voxel_eval'], incremental=True)
+                    with profiling.span('eval'):
+                        pose_relative = self.convert_relative_pose()
+                        pose_evaluation(self.pose_gt, self.est_c2w_data, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i)
+                        pose_evaluation(self.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i, img='pose_r', name='output_relative.txt')
 
                     if cfg['mesh']['visualisation']:
                         cv2.namedWindow('Traj:'.format(i), cv2.WINDOW_AUTOSIZE)
@@ -688,16 +830,20 @@ class CoSLAM():
         #print("self.pose_gt",self.pose_gt)
         #print("self.est_c2w_data",self.est_c2w_data)
         self.save_ckpt(model_savepath)
-        self.save_mesh(i, voxel_size=self.config['mesh']['voxel_final'])
-        
-        pose_relative = self.convert_relative_pose()
-        pose_evaluation(self.pose_gt, self.est_c2w_data, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i)
-        pose_evaluation(self.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i, img='pose_r', name='output_relative.txt')
+        with profiling.span('mesh'):
+            self.save_mesh(i, voxel_size=self.config['mesh']['voxel_final'])
+        
+        with profiling.span('eval'):
+            pose_relative = self.convert_relative_pose()
+            pose_evaluation(self.pose_gt, self.est_c2w_data, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i)
+            pose_evaluation(self.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), i, img='pose_r', name='output_relative.txt')
+        self.record_run({'wall': time.time() - start_time, 'frames': i + 1})
         pose_savepath = os.path.join(self.config['data']['output'], self.config['data']['exp_name'], 'traj_checkpoint{}.npy'.format(i)) 
-        # Save the arrays to an npy file
-        np.save(pose_savepath, [self.pose_gt.detach().cpu().numpy(), 
-                                self.est_c2w_data.detach().cpu().numpy(),
-                                pose_relative.detach().cpu().numpy()])
+        # Save the arrays to an npy file, the poses are dicts of frame id: [4, 4]
+        frames = sorted(self.est_c2w_data.keys())
+        np.save(pose_savepath, np.stack([torch.stack([self.pose_gt[f] for f in frames]).cpu().numpy(),
+                                         torch.stack([self.est_c2w_data[f] for f in frames]).detach().cpu().numpy(),
+                                         torch.stack([pose_relative[f] for f in frames]).detach().cpu().numpy()]))
         #TODO: Evaluation of reconstruction
 
 
@@ -718,12 +864,25 @@ if __name__ == '__main__':
                         help='')
     parser.add_argument('--perturb_dynamic', type=int, default=0,
                         help='')
+    parser.add_argument('--packed_dir', type=str, default=None,
+                        help='frames packed by slam_perturbation.packed')
+    parser.add_argument('--perturb_cache', type=str, default=None,
+                        help='perturbed frames written by slam_perturbation.materialize')
+    parser.add_argument('--perturb_seed', type=int, default=0,
+                        help='seed of the materialized frames')
     parser.add_argument('--perturb_traj', type=int, default=0,
                         help='')
     parser.add_argument('--frame_downsample', type=int, default=1,
                         help='')
+    parser.add_argument('--results_db', type=str, default=None,
+                        help='results store the run record is appended to, see slam_perturbation.results')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='folder for the span trace and summary of the run, see slam_perturbation.profiling')
+    parser.add_argument('--profile_torch', type=str, default=None,
+                        help='frames start:end to record with the torch profiler, needs --profile')
 
     args = parser.parse_args()
+    profiling.configure(args.profile, torch_window=args.profile_torch)
 
     cfg = config.load_config(args.config)
     if args.output is not None:
@@ -736,10 +895,16 @@ if __name__ == '__main__':
     cfg['robustness']['perturb_severity']=args.perturb_severity
     cfg['robustness']['perturb_dynamic']=args.perturb_dynamic
     cfg['robustness']['perturb_traj']=args.perturb_traj
+    cfg['robustness']['perturb_cache']=args.perturb_cache
+    cfg['robustness']['perturb_seed']=args.perturb_seed
+    cfg['data']['packed_dir']=args.packed_dir
     cfg['data']['trainskip']=args.frame_downsample
+    cfg['data']['results_db']=args.results_db
 
     if args.perturb_traj==0:
         cfg['data']['exp_name'] = cfg['data']['exp_name'] + "_" + str(args.perturb_type) + "_" +str(args.perturb_severity) + "_" +str(args.perturb_dynamic)+"_ds_"+str(args.frame_downsample)+"_"+str(args.perturb_traj)
+        if args.perturb_seed != 0:
+            cfg['data']['exp_name'] = cfg['data']['exp_name'] + "_pseed_" + str(args.perturb_seed)
     else:
         cfg['data']['exp_name'] = cfg['data']['exp_name'] + "_" +  args.input_folder.split(os.sep)[-1]
         
@@ -750,6 +915,7 @@ if __name__ == '__main__':
     save_path = os.path.join(cfg["data"]["output"], cfg['data']['exp_name'])
     if not os.path.exists(save_path):
         os.makedirs(save_path)
+    cfg['robustness']['perturb_schedule'] = os.path.join(save_path, 'perturb_schedule.npz')
     shutil.copy("coslam.py", os.path.join(save_path, 'coslam.py'))
 
     with open(os.path.join(save_path, 'config.json'),"w", encoding='utf-8') as f:
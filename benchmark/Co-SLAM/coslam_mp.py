@@ -22,6 +22,7 @@ from model.keyframe import KeyFrameDatabase
 from datasets.dataset import get_dataset
 from utils import coordinates, extract_mesh
 from tools.eval_ate import pose_evaluation
+from slam_perturbation import profiling, results
 from optimization.utils import at_to_transform_matrix, qt_to_transform_matrix, matrix_to_axis_angle, matrix_to_quaternion
 
 # Multiprocessing imports
@@ -29,6 +30,7 @@ import torch.multiprocessing as mp
 mp.set_sharing_strategy('file_system')
 from mp_slam.tracker import Tracker
 from mp_slam.mapper import Mapper
+from mp_slam.sync import SharedParams, Handoff
 
 
 class CoSLAM():
@@ -50,6 +52,7 @@ class CoSLAM():
 
         self.keyframeDatabase = self.create_kf_database(config)
         self.model = JointEncoding(config, self.bounding_box).to(self.device).share_memory()
+        self.shared_params = SharedParams(self.model)
         self.create_optimizer()
 
         self.tracker = Tracker(config, self)
@@ -63,6 +66,8 @@ class CoSLAM():
         self.mapping_first_frame = torch.zeros((1)).int().share_memory_()
         self.mapping_idx = torch.zeros((1)).share_memory_()
         self.tracking_idx = torch.zeros((1)).share_memory_()
+        # wakes the tracker and the mapper up when the other side moves
+        self.handoff = Handoff()
     
     def seed_everything(self, seed):
         random.seed(seed)
@@ -294,30 +299,40 @@ class CoSLAM():
         return cur_rot, cur_trans, pose_optimizer
     
     def tracking(self, rank):
-        while True:
-            if self.mapping_first_frame[0] == 1:
-                print('Start tracking')
-                break
-            time.sleep(0.5)
-        
+        self.handoff.first_frame.wait()
+        print('Start tracking')
         self.tracker.run()
     
     def mapping(self, rank):
         self.mapper.run()
     
+    def record_run(self, timings):
+        '''
+        Write the structured record of the run (ATE / RPE, per-frame errors, timings, peak memory)
+        next to its outputs and append it to the results store
+        '''
+        gt = self.pose_gt.cpu().numpy()
+        est = self.est_c2w_data.cpu().numpy()
+        return results.record_run('coslam_mp', os.path.basename(os.path.normpath(self.config['data']['datadir'])),
+                                  self.config.get('robustness', {}), gt, est, valid=np.isfinite(gt).all((1, 2)),
+                                  downsample=self.config['data'].get('trainskip', 1), timings=timings, config=self.config,
+                                  output_dir=os.path.join(self.config['data']['output'], self.config['data']['exp_name']),
+                                  db=self.config['data'].get('results_db'))
+
     def run(self):
+        start_time = time.time()
         processes = []
         for rank in range(2):
             if rank == 1:
-                p = mp.Process(target=self.tracking, args=(rank, ))
+                p = mp.Process(target=self.tracking, args=(rank, ), name='tracker')
             elif rank == 0:
-                p = mp.Process(target=self.mapping, args=(rank, ))
-                time.sleep(2)
+                p = mp.Process(target=self.mapping, args=(rank, ), name='mapper')
 
             p.start()
             processes.append(p)
         for p in processes:
             p.join()
+        self.record_run({'wall': time.time() - start_time, 'frames': len(self.est_c2w_data)})
 
         
 
@@ -333,12 +348,24 @@ if __name__ == '__main__':
                         help='input folder, this have higher priority, can overwrite the one in config file')
     parser.add_argument('--output', type=str,
                         help='output folder, this have higher priority, can overwrite the one in config file')
+    parser.add_argument('--latency_budget', type=float,
+                        help='max seconds the tracker waits for the mapper per frame, overwrites tracking.latency_budget')
+    parser.add_argument('--results_db', type=str, default=None,
+                        help='results store the run record is appended to, see slam_perturbation.results')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='folder for the span traces and summaries of the run, one per process, see slam_perturbation.profiling')
+    parser.add_argument('--profile_torch', type=str, default=None,
+                        help='frames start:end the tracker records with the torch profiler, needs --profile')
     
     args = parser.parse_args()
+    profiling.configure(args.profile, torch_window=args.profile_torch)
 
     cfg = config.load_config(args.config)
     if args.output is not None:
         cfg['data']['output'] = args.output
+    if args.latency_budget is not None:
+        cfg['tracking']['latency_budget'] = args.latency_budget
+    cfg['data']['results_db'] = args.results_db
 
     print("Saving config and script...")
     save_path = os.path.join(cfg["data"]["output"], cfg['data']['exp_name'])
@@ -7,10 +7,9 @@ import numpy as np
 from scipy.spatial.transform import Rotation
 from torch.utils.data import Dataset
 from .utils import get_camera_rays, alphanum_key, as_intrinsics_matrix
-from .robustness import brightness,contrast,spatter,zoom_blur,motion_blur,defocus_blur,gaussian_noise,shot_noise,impulse_noise,speckle_noise,gaussian_blur,glass_blur,fog,frost,snow,jpeg_compression,pixelate,gaussian_noise_strong
-from .robustness_depth import depth_add_random_mask, depth_add_fixed_mask, depth_add_edge_erosion, depth_add_gaussian_noise, depth_range
+from slam_perturbation import FramePerturbation
+from slam_perturbation.packed import PackedSequence
 from PIL import Image
-import random
 
 def quaternion_to_matrix(input_array):
     # Unpack the input array
@@ -233,7 +232,13 @@ class ReplicaDataset(BaseDataset):
         self.traj_perturb=0
         if  'robustness' in cfg.keys() and 'perturb_traj' in cfg['robustness'].keys():
             self.traj_perturb = cfg['robustness']['perturb_traj']
-        if self.traj_perturb == 0 or self.traj_perturb == 2:
+        self.packed = PackedSequence.from_config(cfg['data'])
+        if self.packed is not None:
+            # frames are served from the packed store, its header names them
+            self.img_files = self.packed.rgb_files
+            self.depth_paths = self.packed.depth_files
+            self.load_poses(os.path.join(self.basedir, 'trajectory.txt' if self.traj_perturb == 1 else 'traj.txt'))
+        elif self.traj_perturb == 0 or self.traj_perturb == 2:
             self.img_files = sorted(glob.glob(f'{self.basedir}/results/frame*.jpg'))
             self.depth_paths = sorted(
                 glob.glob(f'{self.basedir}/results/depth*.png'))
@@ -251,15 +256,12 @@ class ReplicaDataset(BaseDataset):
 
         self.num_frames = len(self.frame_ids)
 
-        self.perturb_type = 17
-        self.perturb_severity=0
-        self.perturb_dynamic=0
-        
-        if 'robustness' in cfg.keys():
-            self.perturb_type = cfg['robustness']['perturb_type']
-            self.perturb_severity = cfg['robustness']['perturb_severity']
-            self.perturb_dynamic = cfg['robustness']['perturb_dynamic']
+        self.perturbation = FramePerturbation.from_config(cfg.get('robustness'))
+        self.perturb_type = self.perturbation.perturb_type
+        self.perturb_severity = self.perturbation.severity
+        self.perturb_dynamic = self.perturbation.dynamic
 
+        if 'robustness' in cfg.keys():
             print("#############################################################")
             print("self.perturb_type",self.perturb_type)
             print("self.perturb_severity",self.perturb_severity)
@@ -271,110 +273,39 @@ class ReplicaDataset(BaseDataset):
     
     def __getitem__(self, index):
 
-        color_path = self.img_files[index * self.trainskip]
-
-        if self.perturb_type == 18:
-            if self.perturb_dynamic > 0:
-                # If dynamic perturbation is enabled, select a random delay within a range
-                min_delay = self.perturb_severity - self.perturb_dynamic
-                max_delay = self.perturb_severity + self.perturb_dynamic
-                # Make sure the min_delay is not negative
-                min_delay = max(0, min_delay)
-                delay = random.randint(min_delay, max_delay)
-            else:
-                # Static delay
-                delay = self.perturb_severity
+        depth_index = self.perturbation.depth_index(index, self.num_frames)
 
-            depth_index = max(0, min(index - delay, self.num_frames - 1))  # Ensure depth_index is within valid range
+        if self.packed is not None:
+            # zero-copy views, RGB already
+            color_data = self.packed.rgb[index * self.trainskip]
+            depth_data = self.packed.depth[depth_index * self.trainskip]
         else:
-            depth_index = index
-
-        depth_path = self.depth_paths[depth_index * self.trainskip]  # Apply offset to depth index
-
-
-
-        color_data = cv2.imread(color_path)
-        if '.png' in depth_path:
-            depth_data = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
-        elif '.npy' in depth_path:
-            depth_data = np.load(depth_path)
-        elif '.exr' in depth_path:
-            raise NotImplementedError()
+            color_path = self.img_files[index * self.trainskip]
+            depth_path = self.depth_paths[depth_index * self.trainskip]  # Apply offset to depth index
+
+            color_data = cv2.imread(color_path)
+            if '.png' in depth_path:
+                depth_data = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
+            elif '.npy' in depth_path:
+                depth_data = np.load(depth_path)
+            elif '.exr' in depth_path:
+                raise NotImplementedError()
+            color_data = cv2.cvtColor(color_data, cv2.COLOR_BGR2RGB)
         if self.distortion is not None:
             raise NotImplementedError()
 
-        color_data = cv2.cvtColor(color_data, cv2.COLOR_BGR2RGB)
-
         color_data = Image.fromarray(color_data)
 
-        if self.perturb_dynamic > 0:
-            print("dynamic perturbation")
-            rnd_severity = random.choice([0, 1, 2, 3, 4, 5])
-            if rnd_severity > 0:
-                perturb_type = self.perturb_type
-                perturb_severity = rnd_severity
-            else:
-                perturb_type = 17 # no perturbation
-                perturb_severity = self.perturb_severity
-            print("dyn_perturb: "+ str(perturb_type) + "_" + str(perturb_severity))
-        else:
-            perturb_type = self.perturb_type
-            perturb_severity = self.perturb_severity
-
-        if perturb_type == 0:
-            color_data = brightness(color_data,perturb_severity)
-        elif perturb_type == 1:
-            color_data = contrast(color_data,perturb_severity)
-        elif perturb_type == 2:
-            color_data = spatter(color_data,perturb_severity)
-        elif perturb_type == 3:
-            color_data = zoom_blur(color_data,perturb_severity)
-        elif perturb_type == 4:
-            color_data = motion_blur(color_data,perturb_severity)
-        elif perturb_type == 5:
-            color_data = defocus_blur(color_data,perturb_severity)
-        elif perturb_type == 6:
-            color_data = gaussian_noise(color_data,perturb_severity)
-        elif perturb_type == 7:
-            color_data = shot_noise(color_data,perturb_severity)
-        elif perturb_type == 8:
-            color_data = impulse_noise(color_data,perturb_severity)
-        elif perturb_type == 9:
-            color_data = speckle_noise(color_data,perturb_severity)
-        elif perturb_type == 10:
-            color_data = gaussian_blur(color_data,perturb_severity)
-        elif perturb_type == 11:
-            color_data = glass_blur(color_data,perturb_severity)
-        elif perturb_type == 12:
-            color_data = fog(color_data,perturb_severity)
-        elif perturb_type == 13:
-            color_data = frost(color_data,perturb_severity)
-        elif perturb_type == 14:
-            color_data = snow(color_data,perturb_severity)
-        elif perturb_type == 15:
-            color_data = jpeg_compression(color_data,perturb_severity)
-        elif perturb_type == 16:
-            color_data = pixelate(color_data,perturb_severity)
-        elif perturb_type == 17:
-            pass
-        elif perturb_type == 20:
-            depth_data = depth_add_gaussian_noise(depth_data,perturb_severity)
-        elif perturb_type == 21:
-            depth_data = depth_add_edge_erosion(depth_data,perturb_severity)
-        elif perturb_type == 22:
-            depth_data = depth_add_random_mask(depth_data,perturb_severity)
-        elif perturb_type == 23:
-            depth_data = depth_add_fixed_mask(depth_data,perturb_severity)
-        elif perturb_type >=25:
-            pass
+        perturb_type, perturb_severity, perturb_seed = self.perturbation.sample(index, self.num_frames)
+        color_data = self.perturbation.apply(color_data, 'rgb', perturb_type, perturb_severity, perturb_seed)
+        depth_data = self.perturbation.apply(depth_data, 'depth', perturb_type, perturb_severity, perturb_seed)
         color_data = np.array(color_data)
 
         #########################
 
         color_data = color_data / 255.
         depth_data = depth_data.astype(np.float32) / self.png_depth_scale * self.sc_factor
-        if perturb_type == 24:
-            depth_data = depth_range(depth_data,perturb_severity)
+        depth_data = self.perturbation.apply(depth_data, 'metric_depth', perturb_type, perturb_severity, perturb_seed)
         H, W = depth_data.shape
         color_data = cv2.resize(color_data, (W, H))
 
@@ -0,0 +1,85 @@
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+
+class SharedDirection(Dataset):
+    '''
+    Frames without the ray directions, which are the same for every frame:
+    only the first frame carries them, so the workers do not send and the
+    collate does not stack an H x W x 3 tensor per frame.
+    '''
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        ret = self.dataset[index]
+        if index > 0:
+            ret.pop('direction', None)
+        return ret
+
+
+class DevicePrefetcher(object):
+    '''
+    Iterate a dataset with the image tensors of each frame already on the device.
+
+    On CUDA the DataLoader pins its batches and the next frame is copied on a
+    side stream while the current one is processed, so the SLAM loop only
+    indexes device memory. On CPU the batches are yielded as they are. The ray
+    directions come with the first frame only, and that tensor is handed out
+    with every frame.
+
+    Args:
+        dataset: the SLAM dataset, one frame per item
+        device: target device
+        num_workers: DataLoader workers
+        keys: batch entries moved to the device, the others (frame_id, c2w) stay on the host
+    '''
+    def __init__(self, dataset, device, num_workers=0, keys=('rgb', 'depth', 'direction')):
+        self.device = torch.device(device)
+        self.keys = keys
+        self.cuda = self.device.type == 'cuda' and torch.cuda.is_available()
+        self.loader = DataLoader(SharedDirection(dataset), num_workers=num_workers, pin_memory=self.cuda)
+        self.direction = None
+        self.stream = torch.cuda.Stream(self.device) if self.cuda else None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def to_device(self, batch):
+        for key in self.keys:
+            if key in batch:
+                batch[key] = batch[key].to(self.device, non_blocking=True)
+        if 'direction' in batch:
+            self.direction = batch['direction']
+        else:
+            batch['direction'] = self.direction
+        return batch
+
+    def __iter__(self):
+        if not self.cuda:
+            for batch in self.loader:
+                yield self.to_device(batch)
+            return
+
+        loader = iter(self.loader)
+        next_batch = self.preload(loader)
+        while next_batch is not None:
+            torch.cuda.current_stream(self.device).wait_stream(self.stream)
+            batch = next_batch
+            for key in self.keys:
+                if key in batch and key != 'direction':
+                    # the tensors were allocated on the side stream
+                    batch[key].record_stream(torch.cuda.current_stream(self.device))
+            next_batch = self.preload(loader)
+            yield batch
+
+    def preload(self, loader):
+        try:
+            batch = next(loader)
+        except StopIteration:
+            return None
+        with torch.cuda.stream(self.stream):
+            return self.to_device(batch)
@@ -1,7 +1,13 @@
 import torch
 import re
+import random
 import numpy as np
 
+# get_camera_rays results per intrinsics, shared by the frames, datasets and runs of a process
+_CAMERA_RAYS = {}
+# PixelTable per image size, edges and device
+_PIXEL_TABLES = {}
+
 
 def as_intrinsics_matrix(intrinsics):
     """
@@ -22,7 +28,17 @@ def alphanum_key(s):
     return [int(x) if x.isdigit() else x for x in re.split('([0-9]+)', s)]
 
 def get_camera_rays(H, W, fx, fy=None, cx=None, cy=None, type='OpenGL'):
-    """Get ray origins, directions from a pinhole camera."""
+    """Get ray origins, directions from a pinhole camera.
+
+    The tensor is cached per intrinsics and shared, callers must not modify it in place.
+    """
+    key = (H, W, fx, fy, cx, cy, type)
+    if key not in _CAMERA_RAYS:
+        _CAMERA_RAYS[key] = _camera_rays(H, W, fx, fy, cx, cy, type)
+    return _CAMERA_RAYS[key]
+
+
+def _camera_rays(H, W, fx, fy=None, cx=None, cy=None, type='OpenGL'):
     #  ----> i
     # |
     # |
@@ -54,4 +70,43 @@ def get_camera_rays(H, W, fx, fy=None, cx=None, cy=None, type='OpenGL'):
         raise NotImplementedError()
 
     rays_d = dirs
-    return rays_d
\ No newline at end of file
+    return rays_d
+
+
+class PixelTable(object):
+    """
+    Flat indices (row * W + col) of the pixels of an H x W image that sampling
+    draws from, without the edge_h / edge_w borders. Drawing n pixels costs
+    O(n) instead of a pass over the image.
+    """
+    def __init__(self, H, W, edge_h=0, edge_w=0, device='cpu', index=None):
+        self.H, self.W = H, W
+        if index is None:
+            h = torch.arange(edge_h, H - edge_h, device=device)
+            w = torch.arange(edge_w, W - edge_w, device=device)
+            index = (h[:, None] * W + w[None, :]).reshape(-1)
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def valid_depth(self, depth, near=0., far=None):
+        """Table of the pixels with near < depth < far in this frame."""
+        d = depth.reshape(-1)[self.index]
+        mask = d > near
+        if far is not None:
+            mask &= d < far
+        return PixelTable(self.H, self.W, index=self.index[mask])
+
+    def sample(self, n):
+        """n distinct pixels drawn uniformly, as flat indices on the table's device."""
+        pick = random.sample(range(len(self.index)), int(n))
+        return self.index[torch.tensor(pick, device=self.index.device)]
+
+
+def pixel_table(H, W, edge_h=0, edge_w=0, device='cpu'):
+    """Shared PixelTable of an image size."""
+    key = (H, W, edge_h, edge_w, str(device))
+    if key not in _PIXEL_TABLES:
+        _PIXEL_TABLES[key] = PixelTable(H, W, edge_h, edge_w, device)
+    return _PIXEL_TABLES[key]
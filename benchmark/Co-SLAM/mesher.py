@@ -0,0 +1,140 @@
+import numpy as np
+import torch
+import marching_cubes as mcubes
+
+from utils import getVoxels, get_batch_query_fn, grid_to_mesh
+
+
+class IncrementalMesher(object):
+    '''
+    Periodic mesh snapshots re-extracted only where keyframes touched the scene.
+
+    The marching cubes grid of extract_mesh is cut into blocks of block_size
+    voxels. The cells of this marching cubes are centred on voxels and read
+    their neighbours, so each block is evaluated with one voxel layer more on
+    every side, and the per-block meshes stitch. touch() marks the blocks around the surface points of a
+    keyframe dirty; extract() evaluates the dirty blocks only, first on a
+    coarse sub-grid, and runs marching cubes on those the coarse SDF puts near
+    the surface. The other blocks keep their cached triangles.
+
+    The decoder is shared by the whole scene, so untouched blocks drift
+    slightly between snapshots: every refresh_every snapshots all blocks are
+    re-extracted, and the final mesh still comes from extract_mesh.
+
+    Args:
+        query_fn: SDF of the scene model
+        config: Co-SLAM config
+        bounding_box: model bounding box [3, 2]
+        marching_cube_bound: meshed region [3, 2], bounding_box if None
+        voxel_size: grid spacing, as in extract_mesh
+        block_size: voxels per block edge
+        coarse: stride of the coarse pass, 1 disables it
+        band: blocks whose coarse SDF keeps one sign and stays above band in magnitude are empty
+        margin: blocks dilated around the touched ones
+        refresh_every: snapshots between two full re-extractions, 0 never
+    '''
+    def __init__(self, query_fn, config, bounding_box, marching_cube_bound=None, voxel_size=0.05,
+                 block_size=32, coarse=4, band=0.5, margin=1, refresh_every=10, isolevel=0.0):
+        if marching_cube_bound is None:
+            marching_cube_bound = bounding_box
+        self.config = config
+        self.bounding_box = bounding_box
+        self.block_size = block_size
+        self.coarse = coarse
+        self.band = band
+        self.margin = margin
+        self.refresh_every = refresh_every
+        self.isolevel = isolevel
+
+        x_min, y_min, z_min = marching_cube_bound[:, 0]
+        x_max, y_max, z_max = marching_cube_bound[:, 1]
+        self.tx, self.ty, self.tz = getVoxels(x_max, x_min, y_max, y_min, z_max, z_min, voxel_size)
+        self.shape = np.array([len(self.tx), len(self.ty), len(self.tz)])
+        self.origin = np.array([float(self.tx[0]), float(self.ty[0]), float(self.tz[0])])
+        self.step = np.array([float(t[1] - t[0]) for t in (self.tx, self.ty, self.tz)])
+
+        # blocks cover voxel cells, the last one per axis may be smaller
+        self.num_blocks = np.maximum(np.ceil((self.shape - 1) / block_size).astype(int), 1)
+        self.dirty = np.ones(self.num_blocks, dtype=bool)
+        self.cache = {}
+        self.snapshots = 0
+        self.fn = get_batch_query_fn(query_fn, device=bounding_box.device)
+
+    def touch(self, points):
+        '''
+        Mark the blocks around points [N, 3], in scene coordinates, for re-extraction
+        '''
+        points = torch.as_tensor(points).reshape(-1, 3).detach().cpu().numpy()
+        voxels = np.floor((points - self.origin) / self.step).astype(int)
+        blocks = np.unique(voxels // self.block_size, axis=0)
+        for offset in np.ndindex(*(2 * self.margin + 1,) * 3):
+            b = blocks + np.array(offset) - self.margin
+            b = b[((b >= 0) & (b < self.num_blocks)).all(axis=1)]
+            self.dirty[b[:, 0], b[:, 1], b[:, 2]] = True
+
+    def block_range(self, block, stride=1):
+        '''
+        Voxel indices of a block along each axis, with the neighbour layers its
+        cells read, its last voxel always included
+        '''
+        ranges = []
+        for b, n in zip(block, self.shape):
+            start = max(b * self.block_size - 1, 0)
+            stop = min((b + 1) * self.block_size, n - 1)
+            ranges.append(np.unique(np.append(np.arange(start, stop, stride), stop)))
+        return ranges
+
+    @torch.no_grad()
+    def query(self, ranges):
+        ix, iy, iz = ranges
+        pts = torch.stack(torch.meshgrid(self.tx[ix], self.ty[iy], self.tz[iz], indexing='ij'), -1)
+        flat = pts.reshape(-1, 3)
+        if self.config['grid']['tcnn_encoding']:
+            bounding_box_cpu = self.bounding_box.cpu()
+            flat = (flat - bounding_box_cpu[:, 0]) / (bounding_box_cpu[:, 1] - bounding_box_cpu[:, 0])
+        chunk = 1024 * 64
+        raw = [self.fn(flat, i, i + chunk).cpu().numpy() for i in range(0, flat.shape[0], chunk)]
+        return np.concatenate(raw, 0).astype(np.float32).reshape(pts.shape[:-1])
+
+    def update_block(self, block):
+        if self.coarse > 1:
+            sdf = self.query(self.block_range(block, self.coarse))
+            same_sign = (sdf > self.isolevel).all() or (sdf < self.isolevel).all()
+            if same_sign and np.abs(sdf - self.isolevel).min() > self.band:
+                self.cache[block] = None
+                return
+        ranges = self.block_range(block)
+        sdf = self.query(ranges)
+        vertices, triangles = mcubes.marching_cubes(sdf, self.isolevel, truncation=3.0)
+        if len(triangles) == 0:
+            self.cache[block] = None
+            return
+        vertices[:, :3] += np.array([r[0] for r in ranges])
+        # uint64 triangles would turn float when offset in extract()
+        self.cache[block] = (vertices, triangles.astype(np.int64))
+
+    def extract(self, color_func=None, mesh_savepath=''):
+        '''
+        Re-extract the dirty blocks and export the stitched mesh
+        '''
+        if self.refresh_every > 0 and self.snapshots % self.refresh_every == 0:
+            self.dirty[:] = True
+        dirty = [tuple(b) for b in np.argwhere(self.dirty)]
+        print('Meshing {} / {} blocks'.format(len(dirty), self.dirty.size))
+        for block in dirty:
+            self.update_block(block)
+        self.dirty[:] = False
+        self.snapshots += 1
+
+        parts = [part for part in self.cache.values() if part is not None]
+        if len(parts) == 0:
+            print('Empty mesh, not saved')
+            return None
+        offsets = np.cumsum([0] + [len(v) for v, _ in parts[:-1]])
+        vertices = np.concatenate([v for v, _ in parts], 0)
+        triangles = np.concatenate([t + o for (_, t), o in zip(parts, offsets)], 0)
+        # blocks share their border voxels, weld the vertices found twice on the seams
+        vertices, inverse = np.unique(vertices, axis=0, return_inverse=True)
+        triangles = inverse.reshape(-1)[triangles]
+        return grid_to_mesh(vertices, triangles, self.tx, self.ty, self.tz, self.config,
+                            self.bounding_box, color_func, mesh_savepath)
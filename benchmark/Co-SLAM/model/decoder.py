@@ -1,7 +1,11 @@
 # Package imports
 import torch
 import torch.nn as nn
-import tinycudann as tcnn
+try:
+    import tinycudann as tcnn
+except (ImportError, OSError):
+    # CPU-only nodes, same modules and parameter layout in plain torch
+    from . import tcnn_torch as tcnn
 
 
 class ColorNet(nn.Module):
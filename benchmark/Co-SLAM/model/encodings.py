@@ -1,6 +1,10 @@
 import torch
 import numpy as np
-import tinycudann as tcnn
+try:
+    import tinycudann as tcnn
+except (ImportError, OSError):
+    # CPU-only nodes, same modules and parameter layout in plain torch
+    from . import tcnn_torch as tcnn
 
 
 def get_encoder(encoding, input_dim=3,
@@ -1,25 +1,76 @@
 import torch
 import numpy as np
 import random
+from slam_perturbation.keyframes import overlap_fractions, select_overlapping
 
 class KeyFrameDatabase(object):
+    '''
+    Preallocated ring buffer of the rays saved for each keyframe.
+
+    Directions are kept in float32, RGB and depth in mapping.kf_dtype (float32
+    or float16), on mapping.kf_device (the host by default). Frame ids live in
+    an index tensor next to the rays. When the buffer holds mapping.kf_capacity
+    keyframes, or fewer if the device runs out of memory at allocation, new
+    keyframes overwrite the oldest ones except the first.
+    '''
     def __init__(self, config, H, W, num_kf, num_rays_to_save, device) -> None:
         self.config = config
         self.keyframes = {}
         self.device = device
-        self.rays = torch.zeros((num_kf, num_rays_to_save, 7))
         self.num_rays_to_save = num_rays_to_save
-        self.frame_ids = None
         self.H = H
         self.W = W
 
-    
+        self.store_device = torch.device(config['mapping'].get('kf_device', 'cpu'))
+        self.dtype = getattr(torch, config['mapping'].get('kf_dtype', 'float32'))
+        kf_capacity = config['mapping'].get('kf_capacity')
+        if kf_capacity is not None and kf_capacity < 2:
+            raise ValueError('mapping.kf_capacity must be at least 2 (the first keyframe and one more), got {}'.format(kf_capacity))
+        # the first keyframe is never overwritten, the ring needs a second slot
+        capacity = max(2, min(num_kf, kf_capacity or num_kf))
+        while True:
+            try:
+                self.dirs = torch.zeros((capacity, num_rays_to_save, 3), device=self.store_device)
+                self.values = torch.zeros((capacity, num_rays_to_save, 4), dtype=self.dtype, device=self.store_device)
+                break
+            except RuntimeError:
+                if capacity <= 2:
+                    raise
+                self.dirs = self.values = None
+                capacity = max(2, capacity // 2)
+                print('Keyframe buffer does not fit, keeping {} keyframes'.format(capacity))
+        self.capacity = capacity
+        self.ids = torch.zeros(capacity, dtype=torch.int64, device=self.store_device)
+        # order in which the slots were last written
+        self.stamps = torch.zeros(capacity, dtype=torch.int64)
+        # filled slots, keyframes added so far and slot of the latest one
+        self.size = 0
+        self.count = 0
+        self.last = -1
+
     def __len__(self):
-        return len(self.frame_ids)
-    
+        return self.size
+
     def get_length(self):
         return self.__len__()
-    
+
+    @property
+    def frame_ids(self):
+        '''
+        Frame ids of the stored keyframes, by slot
+        '''
+        return self.ids[:self.size]
+
+    @property
+    def rays(self):
+        return self.get_rays(slice(None))
+
+    def get_rays(self, slots):
+        '''
+        Rays [n, num_rays_to_save, 7] of the given slots, float32
+        '''
+        return torch.cat([self.dirs[slots], self.values[slots].float()], dim=-1)
+
     def sample_single_keyframe_rays(self, rays, option='random'):
         '''
         Sampling strategy for current keyframe rays
@@ -28,24 +79,23 @@ class KeyFrameDatabase(object):
             idxs = random.sample(range(0, self.H*self.W), self.num_rays_to_save)
         elif option == 'filter_depth':
             valid_depth_mask = (rays[..., -1] > 0.0) & (rays[..., -1] <= self.config["cam"]["depth_trunc"])
-            rays_valid = rays[valid_depth_mask, :]  # [n_valid, 7]
-            num_valid = len(rays_valid)
+            rays = rays[valid_depth_mask, :][None]  # [1, n_valid, 7]
+            num_valid = rays.shape[1]
             idxs = random.sample(range(0, num_valid), self.num_rays_to_save)
 
         else:
             raise NotImplementedError()
         rays = rays[:, idxs]
         return rays
-    
-    def attach_ids(self, frame_ids):
+
+    def next_slot(self):
         '''
-        Attach the frame ids to list
+        Slot of the next keyframe, the oldest one but the first when the buffer is full
         '''
-        if self.frame_ids is None:
-            self.frame_ids = frame_ids
-        else:
-            self.frame_ids = torch.cat([self.frame_ids, frame_ids], dim=0)
-    
+        if self.size < self.capacity:
+            return self.size
+        return 1 + (self.count - self.capacity) % (self.capacity - 1)
+
     def add_keyframe(self, batch, filter_depth=False):
         '''
         Add keyframe rays to the keyframe database
@@ -57,27 +107,35 @@ class KeyFrameDatabase(object):
             rays = self.sample_single_keyframe_rays(rays, 'filter_depth')
         else:
             rays = self.sample_single_keyframe_rays(rays)
-        
-        if not isinstance(batch['frame_id'], torch.Tensor):
-            batch['frame_id'] = torch.tensor([batch['frame_id']])
 
-        self.attach_ids(batch['frame_id'])
+        frame_id = batch['frame_id']
+        if isinstance(frame_id, torch.Tensor):
+            frame_id = frame_id.item()
 
         # Store the rays
-        self.rays[len(self.frame_ids)-1] = rays
-    
+        slot = self.next_slot()
+        rays = rays[0].to(self.store_device)
+        self.dirs[slot] = rays[:, :3]
+        self.values[slot] = rays[:, 3:]
+        self.ids[slot] = int(frame_id)
+        self.stamps[slot] = self.count
+        self.size = max(self.size, slot + 1)
+        self.count += 1
+        self.last = slot
+
     def sample_global_rays(self, bs):
         '''
-        Sample rays from self.rays as well as frame_ids
+        Sample rays from the stored keyframes as well as frame_ids, on the store device
         '''
-        num_kf = self.__len__()
-        idxs = torch.tensor(random.sample(range(num_kf * self.num_rays_to_save), bs))
-        sample_rays = self.rays[:num_kf].reshape(-1, 7)[idxs]
+        idxs = torch.randint(self.size * self.num_rays_to_save, (bs,), device=self.store_device)
+        slots = idxs // self.num_rays_to_save
+        pixels = idxs % self.num_rays_to_save
+        sample_rays = torch.cat([self.dirs[slots, pixels], self.values[slots, pixels].float()], dim=-1)
 
-        frame_ids = self.frame_ids[idxs//self.num_rays_to_save]
+        frame_ids = self.ids[slots]
 
         return sample_rays, frame_ids
-    
+
     def sample_global_keyframe(self, window_size, n_fixed=1):
         '''
         Sample keyframe globally
@@ -85,20 +143,19 @@ class KeyFrameDatabase(object):
         n_fixed: sample the last n_fixed keyframes
         '''
         if window_size >= len(self.frame_ids):
-            return self.rays[:len(self.frame_ids)], self.frame_ids
-        
-        current_num_kf = len(self.frame_ids)
-        last_frame_ids = self.frame_ids[-n_fixed:]
+            return self.get_rays(slice(0, self.size)), self.frame_ids
+
+        # slots of the last n_fixed keyframes added
+        fixed = torch.argsort(self.stamps[:self.size])[-n_fixed:].tolist()
 
         # Random sampling
-        idx = random.sample(range(0, len(self.frame_ids) -n_fixed), window_size)
+        idx = random.sample([i for i in range(self.size) if i not in fixed], window_size)
 
         # Include last n_fixed 
-        idx_rays = idx + list(range(current_num_kf-n_fixed, current_num_kf))
-        select_rays = self.rays[idx_rays]
+        idx_rays = idx + fixed
+        select_rays = self.get_rays(idx_rays)
 
-        return select_rays, \
-               torch.cat([self.frame_ids[idx], last_frame_ids], dim=0)
+        return select_rays, self.ids[idx_rays]
                     
     @torch.no_grad()
     def sample_overlap_keyframe(self, batch, frame_id, est_c2w_list, k_frame, n_samples=16, n_pixel=100, dataset=None):
@@ -126,48 +183,19 @@ class KeyFrameDatabase(object):
         z_vals = near * (1.-t_vals) + far * (t_vals)
         pts = rays_o[..., None, :] + rays_d[..., None, :] * \
             z_vals[..., :, None]  # [N_rays, N_samples, 3]
-        pts_flat = pts.reshape(-1, 3).cpu().numpy()
-
-        key_frame_list = []
-
-        for i, frame_id in enumerate(self.frame_ids):
-            frame_id = int(frame_id.item())
-            c2w = est_c2w_list[frame_id].cpu().numpy()
-            w2c = np.linalg.inv(c2w)
-            ones = np.ones_like(pts_flat[:, 0]).reshape(-1, 1)
-            pts_flat_homo = np.concatenate(
-                [pts_flat, ones], axis=1).reshape(-1, 4, 1)  # (N, 4)
-            cam_cord_homo = w2c@pts_flat_homo  # (N, 4, 1)=(4,4)*(N, 4, 1)
-            cam_cord = cam_cord_homo[:, :3]  # (N, 3, 1)
-            K = np.array([[self.config['cam']['fx'], .0, self.config['cam']['cx']], 
-                          [.0, self.config['cam']['fy'], self.config['cam']['cy']],
-                         [.0, .0, 1.0]]).reshape(3, 3)
-            cam_cord[:, 0] *= -1
-            uv = K@cam_cord
-            z = uv[:, -1:]+1e-5
-            uv = uv[:, :2]/z
-            uv = uv.astype(np.float32)
-            edge = 20
-            mask = (uv[:, 0] < self.config['cam']['W']-edge)*(uv[:, 0] > edge) * \
-                (uv[:, 1] < self.config['cam']['H']-edge)*(uv[:, 1] > edge)
-            mask = mask & (z[:, :, 0] < 0)
-            mask = mask.reshape(-1)
-            percent_inside = mask.sum()/uv.shape[0]
-            key_frame_list.append(
-                {'id': frame_id, 'percent_inside': percent_inside, 'sample_id':i})
-        
-            
-
-        key_frame_list = sorted(
-        key_frame_list, key=lambda i: i['percent_inside'], reverse=True)
-        selected_keyframe_list = [dic['sample_id']
-                                for dic in key_frame_list if dic['percent_inside'] > 0.00]
-        selected_keyframe_list = list(np.random.permutation(
-            np.array(selected_keyframe_list))[:k_frame])
-
-        last_id = len(self.frame_ids) - 1
+        pts_flat = pts.reshape(-1, 3)
+
+        # project into all the stored keyframes at once
+        w2c = torch.linalg.inv(est_c2w_list[self.frame_ids.to(est_c2w_list.device)].to(pts_flat))
+        K = [[self.config['cam']['fx'], .0, self.config['cam']['cx']],
+             [.0, self.config['cam']['fy'], self.config['cam']['cy']],
+             [.0, .0, 1.0]]
+        percent_inside = overlap_fractions(pts_flat, w2c, K, self.config['cam']['H'], self.config['cam']['W'], opengl=True)
+        selected_keyframe_list = select_overlapping(percent_inside, k_frame)
+
+        last_id = self.last
 
         if last_id not in selected_keyframe_list:
             selected_keyframe_list.append(last_id)
 
-        return self.rays[selected_keyframe_list], selected_keyframe_list
\ No newline at end of file
+        return self.get_rays(selected_keyframe_list), selected_keyframe_list
\ No newline at end of file
@@ -5,7 +5,7 @@ import torch.nn as nn
 # Local imports
 from .encodings import get_encoder
 from .decoder import ColorSDFNet, ColorSDFNet_v2
-from .utils import sample_pdf, batchify, get_sdf_loss, mse2psnr, compute_loss
+from .utils import sample_pdf, batchify, get_sdf_loss, mse2psnr, compute_loss, compute_group_loss, get_group_sdf_loss
 
 class JointEncoding(nn.Module):
     def __init__(self, config, bound_box):
@@ -209,7 +209,9 @@ class JointEncoding(nn.Module):
         if target_d is not None:
             z_samples = torch.linspace(-self.config['training']['range_d'], self.config['training']['range_d'], steps=self.config['training']['n_range_d']).to(target_d) 
             z_samples = z_samples[None, :].repeat(n_rays, 1) + target_d
-            z_samples[target_d.squeeze()<=0] = torch.linspace(self.config['cam']['near'], self.config['cam']['far'], steps=self.config['training']['n_range_d']).to(target_d) 
+            # rays without depth sample the whole range, torch.where keeps the host out of it
+            z_range = torch.linspace(self.config['cam']['near'], self.config['cam']['far'], steps=self.config['training']['n_range_d']).to(target_d)
+            z_samples = torch.where(target_d <= 0, z_range[None, :], z_samples)
 
             if self.config['training']['n_samples_d'] > 0:
                 z_vals = torch.linspace(self.config['cam']['near'], self.config['cam']['far'], self.config['training']['n_samples_d'])[None, :].repeat(n_rays, 1).to(rays_o)
@@ -265,7 +267,7 @@ class JointEncoding(nn.Module):
 
         return ret
     
-    def forward(self, rays_o, rays_d, target_rgb, target_d, global_step=0):
+    def forward(self, rays_o, rays_d, target_rgb, target_d, global_step=0, groups=1):
         '''
         Params:
             rays_o: ray origins (Bs, 3)
@@ -273,6 +275,8 @@ class JointEncoding(nn.Module):
             frame_ids: use for pose correction (Bs, 1)
             target_rgb: rgb value (Bs, 3)
             target_d: depth value (Bs, 1)
+            groups: the batch holds groups equal chunks of rays (e.g. pose hypotheses),
+                    losses are then returned per chunk, shape (groups,)
             c2w_array: poses (N, 4, 4) 
              r r r tx
              r r r ty
@@ -284,6 +288,9 @@ class JointEncoding(nn.Module):
 
         if not self.training:
             return rend_dict
+
+        if groups > 1:
+            return self.group_losses(rend_dict, target_rgb, target_d, groups)
         
         # Get depth and rgb weights for loss
         valid_depth_mask = (target_d.squeeze() > 0.) * (target_d.squeeze() < self.config['cam']['depth_trunc'])
@@ -317,3 +324,29 @@ class JointEncoding(nn.Module):
         }
 
         return ret
+
+    def group_losses(self, rend_dict, target_rgb, target_d, groups):
+        '''
+        Losses of forward() for each of groups equal chunks of rays, computed without boolean
+        indexing so that the caller can compare them without syncing with the host
+        '''
+        valid_depth_mask = (target_d > 0.) * (target_d < self.config['cam']['depth_trunc'])  # (Bs, 1)
+        # forward() assigns rgb_missing into a bool tensor, which stores True, so every ray has rgb weight 1 there too
+
+        rgb_loss = compute_group_loss(rend_dict["rgb"], target_rgb, groups)
+        depth_loss = compute_group_loss(rend_dict["depth"].reshape(target_d.shape), target_d, groups, valid_depth_mask)
+        if 'rgb0' in rend_dict:
+            rgb_loss = rgb_loss + compute_group_loss(rend_dict["rgb0"], target_rgb, groups)
+            depth_loss = depth_loss + compute_group_loss(rend_dict["depth0"].reshape(target_d.shape), target_d, groups, valid_depth_mask)
+
+        truncation = self.config['training']['trunc'] * self.config['data']['sc_factor']
+        fs_loss, sdf_loss = get_group_sdf_loss(rend_dict['z_vals'], target_d, rend_dict['raw'][..., -1], truncation, groups)
+
+        return {
+            "rgb": rend_dict["rgb"],
+            "depth": rend_dict["depth"],
+            "rgb_loss": rgb_loss,
+            "depth_loss": depth_loss,
+            "sdf_loss": sdf_loss,
+            "fs_loss": fs_loss,
+        }
@@ -0,0 +1,273 @@
+'''
+Pure PyTorch stand-in for the tinycudann modules used by Co-SLAM, picked by
+encodings.py and decoder.py when tinycudann cannot be imported (CPU-only nodes).
+
+Encoding and Network follow the tcnn python API and keep all their weights in
+a single flat `params` parameter laid out as tcnn does, so state dicts load
+either way:
+    Grid encodings: level after level, [params_in_level, n_features_per_level]
+        each, with params_in_level = min(next_multiple(resolution^3, 8), 2^log2_hashmap_size)
+    FullyFusedMLP / CutlassMLP: layer after layer, row major [out, in], the
+        input padded to a multiple of 16 with ones and the output to a multiple of 16
+'''
+
+# Package imports
+import math
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+# tcnn coherent prime hash
+PRIMES = [1, 2654435761, 805459861, 3674653429, 2097192037, 1434869437, 2165219737]
+
+
+def next_multiple(value, multiple):
+    return (value + multiple - 1) // multiple * multiple
+
+
+class Encoding(nn.Module):
+    def __init__(self, n_input_dims, encoding_config, seed=1337, dtype=torch.float):
+        super(Encoding, self).__init__()
+        self.n_input_dims = n_input_dims
+        self.encoding_config = encoding_config
+        self.dtype = dtype
+        otype = encoding_config['otype']
+
+        if otype in ('Grid', 'HashGrid', 'DenseGrid', 'TiledGrid'):
+            self.encoding = GridEncoding(n_input_dims, encoding_config)
+        elif otype == 'SphericalHarmonics':
+            self.encoding = SphericalHarmonicsEncoding(n_input_dims, encoding_config['degree'])
+        elif otype == 'OneBlob':
+            self.encoding = OneBlobEncoding(n_input_dims, encoding_config['n_bins'])
+        elif otype == 'Frequency':
+            self.encoding = FrequencyEncoding(n_input_dims, encoding_config['n_frequencies'])
+        elif otype == 'Identity':
+            self.encoding = IdentityEncoding(n_input_dims)
+        else:
+            raise NotImplementedError('No torch fallback for tcnn encoding {}'.format(otype))
+
+        self.n_output_dims = self.encoding.n_output_dims
+        n_params = self.encoding.n_params
+        generator = torch.Generator().manual_seed(seed)
+        # tcnn grids start uniform in [-1e-4, 1e-4]
+        self.params = nn.Parameter(torch.rand(n_params, generator=generator) * 2e-4 - 1e-4)
+
+    def forward(self, x):
+        batch_shape = x.shape[:-1]
+        out = self.encoding(x.reshape(-1, self.n_input_dims).float(), self.params)
+        return out.to(self.dtype).reshape(*batch_shape, self.n_output_dims)
+
+
+class GridEncoding(nn.Module):
+    '''
+    Multi-resolution grid with trilinear interpolation, the 2^d corners of all
+    points gathered in one indexing call per level
+    '''
+    def __init__(self, n_input_dims, config):
+        super(GridEncoding, self).__init__()
+        otype = config['otype']
+        grid_type = config.get('type', {'HashGrid': 'Hash', 'DenseGrid': 'Dense', 'TiledGrid': 'Tiled'}.get(otype, 'Hash'))
+        if config.get('interpolation', 'Linear') != 'Linear':
+            raise NotImplementedError('Only linear grid interpolation has a torch fallback')
+        n_levels = config.get('n_levels', 16)
+        self.n_features = config.get('n_features_per_level', 2)
+        base_resolution = config.get('base_resolution', 16)
+        hashmap_size = 1 << config.get('log2_hashmap_size', 19)
+        log2_per_level_scale = np.float32(np.log2(np.float32(config.get('per_level_scale', 2.0))))
+
+        scales, resolutions, sizes, offsets, hashed = [], [], [], [], []
+        offset = 0
+        for level in range(n_levels):
+            # same float32 arithmetic as tcnn grid_scale / grid_resolution
+            scale = np.float32(np.exp2(np.float32(level) * log2_per_level_scale)) * np.float32(base_resolution) - np.float32(1.0)
+            resolution = int(np.ceil(scale)) + 1
+            dense = resolution ** n_input_dims
+            size = min(next_multiple(dense, 8), 2 ** 31 - 1)
+            if grid_type == 'Tiled':
+                size = min(size, base_resolution ** n_input_dims)
+            elif grid_type == 'Hash':
+                size = min(size, hashmap_size)
+            scales.append(float(scale))
+            resolutions.append(resolution)
+            sizes.append(size)
+            offsets.append(offset)
+            hashed.append(grid_type == 'Hash' and size < dense)
+            offset += size
+
+        self.n_input_dims = n_input_dims
+        self.n_levels = n_levels
+        self.n_output_dims = n_levels * self.n_features
+        self.n_params = offset * self.n_features
+        # plain lists, read in the level loop without touching the device
+        self.level_scales, self.level_resolutions = scales, resolutions
+        self.hashed_levels, self.level_sizes, self.level_offsets = hashed, sizes, offsets
+
+    def forward(self, x, params):
+        table = params.reshape(-1, self.n_features)
+        n_points = x.shape[0]
+        out = []
+        for level in range(self.n_levels):
+            # grid position as in tcnn: x * scale + 0.5
+            pos = x * self.level_scales[level] + 0.5
+            pos_floor = torch.floor(pos)
+            frac = pos - pos_floor
+            pos_grid = pos_floor.long()
+
+            # index and trilinear weight of the 2^d corners, built one axis at a
+            # time on [N, 2] pairs instead of on [N, 2^d, d] corner coordinates
+            index, weight = None, None
+            for d in range(self.n_input_dims):
+                coord = torch.stack([pos_grid[:, d], pos_grid[:, d] + 1], -1)
+                w = torch.stack([1 - frac[:, d], frac[:, d]], -1)
+                if self.hashed_levels[level]:
+                    term = coord * PRIMES[d]
+                else:
+                    term = coord * self.level_resolutions[level] ** d
+                if index is None:
+                    index, weight = term, w
+                else:
+                    index = index[:, :, None] ^ term[:, None, :] if self.hashed_levels[level] else index[:, :, None] + term[:, None, :]
+                    index = index.reshape(n_points, -1)
+                    weight = (weight[:, :, None] * w[:, None, :]).reshape(n_points, -1)
+
+            if self.hashed_levels[level]:
+                # hashed levels hold 2^log2_hashmap_size entries
+                index = index & (self.level_sizes[level] - 1)
+            else:
+                # the upper corners of points at 1 wrap around, as in tcnn
+                index = index % self.level_sizes[level]
+            # index_select, whose backward is an index_add, much faster than advanced indexing
+            features = torch.index_select(table, 0, (index + self.level_offsets[level]).reshape(-1))
+            out.append(torch.bmm(weight[:, None, :], features.reshape(n_points, -1, self.n_features))[:, 0])
+        return torch.cat(out, -1)
+
+
+class SphericalHarmonicsEncoding(nn.Module):
+    '''
+    Real spherical harmonics of the direction x * 2 - 1, up to degree 4 (16 outputs)
+    '''
+    def __init__(self, n_input_dims, degree):
+        super(SphericalHarmonicsEncoding, self).__init__()
+        if n_input_dims != 3 or degree > 4:
+            raise NotImplementedError('SphericalHarmonics fallback supports 3D inputs up to degree 4')
+        self.degree = degree
+        self.n_output_dims = degree ** 2
+        self.n_params = 0
+
+    def forward(self, x, params):
+        x, y, z = (x * 2 - 1).unbind(-1)
+        out = [torch.full_like(x, 0.28209479177387814)]
+        if self.degree > 1:
+            out += [-0.48860251190291987 * y, 0.48860251190291987 * z, -0.48860251190291987 * x]
+        if self.degree > 2:
+            x2, y2, z2 = x * x, y * y, z * z
+            out += [1.0925484305920792 * x * y, -1.0925484305920792 * y * z,
+                    0.94617469575755997 * z2 - 0.31539156525251999, -1.0925484305920792 * x * z,
+                    0.54627421529603959 * x2 - 0.54627421529603959 * y2]
+        if self.degree > 3:
+            out += [0.59004358992664352 * y * (-3.0 * x2 + y2), 2.8906114426405538 * x * y * z,
+                    0.45704579946446572 * y * (1.0 - 5.0 * z2), 0.3731763325901154 * z * (5.0 * z2 - 3.0),
+                    0.45704579946446572 * x * (1.0 - 5.0 * z2), 1.4453057213202769 * z * (x2 - y2),
+                    0.59004358992664352 * x * (-x2 + 3.0 * y2)]
+        return torch.stack(out, -1)
+
+
+class OneBlobEncoding(nn.Module):
+    '''
+    Each input in [0, 1] spread over n_bins by a quartic kernel of radius 1 / n_bins, wrapping around
+    '''
+    def __init__(self, n_input_dims, n_bins):
+        super(OneBlobEncoding, self).__init__()
+        self.n_bins = n_bins
+        self.n_output_dims = n_input_dims * n_bins
+        self.n_params = 0
+
+    def quartic_cdf(self, x):
+        u = x * self.n_bins
+        u2 = u * u
+        return torch.clamp(15.0 / 16.0 * u * (1 - 2.0 / 3.0 * u2 + 1.0 / 5.0 * u2 * u2) + 0.5, 0, 1)
+
+    def forward(self, x, params):
+        # [N, d, n_bins + 1] bin boundaries relative to x, periodic over [0, 1]
+        boundaries = torch.arange(self.n_bins + 1, device=x.device, dtype=x.dtype) / self.n_bins
+        rel = boundaries[None, None, :] - x[..., None]
+        cdf = self.quartic_cdf(rel) + self.quartic_cdf(rel - 1.0) + self.quartic_cdf(rel + 1.0)
+        return (cdf[..., 1:] - cdf[..., :-1]).reshape(x.shape[0], self.n_output_dims)
+
+
+class FrequencyEncoding(nn.Module):
+    '''
+    sin and cos of 2^i * pi * x for i < n_frequencies, interleaved per frequency
+    '''
+    def __init__(self, n_input_dims, n_frequencies):
+        super(FrequencyEncoding, self).__init__()
+        self.n_frequencies = n_frequencies
+        self.n_output_dims = n_input_dims * n_frequencies * 2
+        self.n_params = 0
+
+    def forward(self, x, params):
+        freqs = 2. ** torch.arange(self.n_frequencies, device=x.device, dtype=x.dtype) * math.pi
+        phase = x[..., None] * freqs  # [N, d, F]
+        out = torch.stack([torch.sin(phase), torch.cos(phase)], -1)  # [N, d, F, 2]
+        return out.reshape(x.shape[0], self.n_output_dims)
+
+
+class IdentityEncoding(nn.Module):
+    def __init__(self, n_input_dims):
+        super(IdentityEncoding, self).__init__()
+        self.n_output_dims = n_input_dims
+        self.n_params = 0
+
+    def forward(self, x, params):
+        return x
+
+
+ACTIVATIONS = {
+    'None': lambda x: x,
+    'ReLU': torch.relu,
+    'Sigmoid': torch.sigmoid,
+    'Tanh': torch.tanh,
+    'Exponential': torch.exp,
+    'Softplus': nn.functional.softplus,
+}
+
+
+class Network(nn.Module):
+    '''
+    Bias-free MLP with the parameter layout of tcnn FullyFusedMLP / CutlassMLP, computed in float32
+    '''
+    def __init__(self, n_input_dims, n_output_dims, network_config, seed=1337):
+        super(Network, self).__init__()
+        self.n_input_dims = n_input_dims
+        self.n_output_dims = n_output_dims
+        self.network_config = network_config
+        self.activation = ACTIVATIONS[network_config.get('activation', 'ReLU')]
+        self.output_activation = ACTIVATIONS[network_config.get('output_activation', 'None')]
+
+        width = network_config['n_neurons']
+        self.padded_input = next_multiple(n_input_dims, 16)
+        padded_output = next_multiple(n_output_dims, 16)
+        dims = [self.padded_input] + [width] * network_config['n_hidden_layers'] + [padded_output]
+        self.shapes = [(dims[i + 1], dims[i]) for i in range(len(dims) - 1)]
+
+        generator = torch.Generator().manual_seed(seed)
+        weights = []
+        for out_dim, in_dim in self.shapes:
+            # xavier uniform, as tcnn initializes its matrices
+            bound = math.sqrt(6.0 / (in_dim + out_dim))
+            weights.append((torch.rand(out_dim * in_dim, generator=generator) * 2 - 1) * bound)
+        self.params = nn.Parameter(torch.cat(weights))
+
+    def forward(self, x):
+        batch_shape = x.shape[:-1]
+        h = x.reshape(-1, self.n_input_dims).float()
+        # tcnn pads the input with ones, acting as a bias
+        h = torch.cat([h, h.new_ones(h.shape[0], self.padded_input - self.n_input_dims)], -1)
+        start = 0
+        for i, (out_dim, in_dim) in enumerate(self.shapes):
+            weight = self.params[start:start + out_dim * in_dim].reshape(out_dim, in_dim)
+            start += out_dim * in_dim
+            h = h @ weight.t()
+            h = self.activation(h) if i < len(self.shapes) - 1 else self.output_activation(h)
+        return h[:, :self.n_output_dims].reshape(*batch_shape, self.n_output_dims)
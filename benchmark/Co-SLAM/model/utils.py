@@ -146,4 +146,47 @@ def get_sdf_loss(z_vals, target_d, predicted_sdf, truncation, loss_type=None, gr
         eikonal_loss = (((grad.norm(2, dim=-1) - 1) ** 2) * sdf_mask / sdf_mask.sum()).sum()
         return fs_loss, sdf_loss, eikonal_loss
 
-    return fs_loss, sdf_loss
\ No newline at end of file
+    return fs_loss, sdf_loss
+def compute_group_loss(prediction, target, groups, mask=None):
+    '''
+    L2 loss of each of groups equal chunks of the batch, masked entries left out
+    Params:
+        prediction: torch.Tensor, (groups * Bs, ...)
+        target: torch.Tensor, (groups * Bs, ...)
+        groups: int
+        mask: torch.Tensor, broadcastable to prediction
+    Return:
+        loss: torch.Tensor, (groups,)
+    '''
+    err = (prediction - target) ** 2
+    if mask is None:
+        return err.reshape(groups, -1).mean(-1)
+    mask = mask.expand_as(err).reshape(groups, -1).float()
+    return (err.reshape(groups, -1) * mask).sum(-1) / mask.sum(-1).clamp(min=1)
+
+def get_group_sdf_loss(z_vals, target_d, predicted_sdf, truncation, groups):
+    '''
+    get_sdf_loss (l2) of each of groups equal chunks of rays, on the device
+    Params:
+        z_vals: torch.Tensor, (groups * Bs, N_samples)
+        target_d: torch.Tensor, (groups * Bs, 1)
+        predicted_sdf: torch.Tensor, (groups * Bs, N_samples)
+        truncation: float
+        groups: int
+    Return:
+        fs_loss: torch.Tensor, (groups,)
+        sdf_loss: torch.Tensor, (groups,)
+    '''
+    front_mask, sdf_mask, _, _ = get_masks(z_vals, target_d, truncation)
+    front_mask = front_mask.reshape(groups, -1)
+    sdf_mask = sdf_mask.reshape(groups, -1)
+
+    num_fs_samples = front_mask.sum(-1)
+    num_sdf_samples = sdf_mask.sum(-1)
+    num_samples = num_sdf_samples + num_fs_samples
+    fs_weight = 1.0 - num_fs_samples / num_samples
+    sdf_weight = 1.0 - num_sdf_samples / num_samples
+
+    fs_err = (predicted_sdf.reshape(groups, -1) - 1.) ** 2 * front_mask
+    sdf_err = ((z_vals + predicted_sdf * truncation) - target_d).reshape(groups, -1) ** 2 * sdf_mask
+    return fs_err.mean(-1) * fs_weight, sdf_err.mean(-1) * sdf_weight
@@ -5,6 +5,9 @@ import time
 import os
 import random
 
+from mp_slam.sync import Timings
+from slam_perturbation import profiling
+
 class Mapper():
     def __init__(self, config, SLAM) -> None:
         self.config = config
@@ -17,6 +20,9 @@ class Mapper():
         self.map_optimizer = SLAM.map_optimizer
         self.device = SLAM.device
         self.dataset = SLAM.dataset
+        self.shared_params = SLAM.shared_params
+        self.handoff = SLAM.handoff
+        self.timings = Timings('mapper')
 
         self.est_c2w_data = SLAM.est_c2w_data
         self.est_c2w_data_rel = SLAM.est_c2w_data_rel
@@ -44,7 +50,7 @@ class Mapper():
         self.model.train()
 
         # Training
-        for i in range(n_iters):
+        for i in profiling.iterations(range(n_iters), 'map iter'):
             self.map_optimizer.zero_grad()
             indice = self.slam.select_samples(self.slam.dataset.H, self.slam.dataset.W, self.config['mapping']['sample'])
             indice_h, indice_w = indice % (self.slam.dataset.H), indice // (self.slam.dataset.H)
@@ -69,6 +75,8 @@ class Mapper():
         
         print('First frame mapping done')
         self.mapping_first_frame[0] = 1
+        self.shared_params.publish(self.model)
+        self.handoff.first_frame.set()
         return ret, loss
 
     def global_BA(self, batch, cur_frame_id):
@@ -118,7 +126,7 @@ class Mapper():
 
         
 
-        for i in range(self.config['mapping']['iters']):
+        for i in profiling.iterations(range(self.config['mapping']['iters']), 'BA iter'):
 
             # Sample rays with real frame ids
             # rays [bs, 7]
@@ -201,42 +209,57 @@ class Mapper():
     def run(self):
 
         # Start mapping
-        while self.tracking_idx[0]< len(self.dataset)-1:
+        last = len(self.dataset) - 1
+        while self.tracking_idx[0]< last:
             if self.tracking_idx[0] == 0 and self.mapping_first_frame[0] == 0:
-                batch = self.dataset[0]
-                self.first_frame_mapping(batch, self.config['mapping']['first_iters'])
-                time.sleep(0.1)
+                with profiling.span('data load'):
+                    batch = self.dataset[0]
+                with profiling.span('map'):
+                    self.first_frame_mapping(batch, self.config['mapping']['first_iters'])
             else:
-                while self.tracking_idx[0] <= self.mapping_idx[0] + self.config['mapping']['map_every']:
-                    time.sleep(0.4)
+                map_every = self.config['mapping']['map_every']
+                self.timings.wait(self.handoff, 'wait', lambda: self.tracking_idx[0] > self.mapping_idx[0] + map_every or self.tracking_idx[0] >= last)
+                if self.tracking_idx[0] <= self.mapping_idx[0] + map_every:
+                    # tracking finished short of the next mapping frame
+                    break
+                # frames the tracker is ahead of the map
+                self.timings.add('lag', float(self.tracking_idx[0] - self.mapping_idx[0]))
                 current_map_id = int(self.mapping_idx[0] + self.config['mapping']['map_every'])
-                batch = self.dataset[current_map_id]
+                with profiling.span('data load'):
+                    batch = self.dataset[current_map_id]
                 for k, v in batch.items():
                     if isinstance(v, torch.Tensor):
                         batch[k] = v[None, ...]
                     else:
                         batch[k] = torch.tensor([v])
-                self.global_BA(batch, current_map_id)
+                with profiling.span('BA'):
+                    self.global_BA(batch, current_map_id)
+                self.shared_params.publish(self.model)
                 self.mapping_idx[0] = current_map_id
+                self.handoff.notify()
             
                 if self.mapping_idx[0] % self.config['mapping']['keyframe_every'] == 0:
                     self.keyframe.add_keyframe(batch)
+                    profiling.count('keyframes')
             
                 if self.mapping_idx[0] % self.config['mesh']['vis']==0:
                     idx = int(self.mapping_idx[0])
-                    self.slam.save_mesh(idx, voxel_size=self.config['mesh']['voxel_eval'])
-                    pose_relative = self.convert_relative_pose(idx)
-                    self.slam.pose_eval_func()(self.slam.pose_gt, self.est_c2w_data[:idx], 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx)
-                    self.slam.pose_eval_func()(self.slam.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx, img='pose_r', name='output_relative.txt')
-                
-                time.sleep(0.2)
+                    with profiling.span('mesh'):
+                        self.slam.save_mesh(idx, voxel_size=self.config['mesh']['voxel_eval'])
+                    with profiling.span('eval'):
+                        pose_relative = self.convert_relative_pose(idx)
+                        self.slam.pose_eval_func()(self.slam.pose_gt, self.est_c2w_data[:idx], 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx)
+                        self.slam.pose_eval_func()(self.slam.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx, img='pose_r', name='output_relative.txt')
 
         idx = int(self.tracking_idx[0])       
-        self.slam.save_mesh(idx, voxel_size=self.config['mesh']['voxel_final'])
-        pose_relative = self.convert_relative_pose(idx)
-        self.slam.pose_eval_func()(self.slam.pose_gt, self.est_c2w_data[:idx], 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx)
-        self.slam.pose_eval_func()(self.slam.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx, img='pose_r', name='output_relative.txt')
+        with profiling.span('mesh'):
+            self.slam.save_mesh(idx, voxel_size=self.config['mesh']['voxel_final'])
+        with profiling.span('eval'):
+            pose_relative = self.convert_relative_pose(idx)
+            self.slam.pose_eval_func()(self.slam.pose_gt, self.est_c2w_data[:idx], 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx)
+            self.slam.pose_eval_func()(self.slam.pose_gt, pose_relative, 1, os.path.join(self.config['data']['output'], self.config['data']['exp_name']), idx, img='pose_r', name='output_relative.txt')
 
         
         
         
+        self.timings.report(os.path.join(self.config['data']['output'], self.config['data']['exp_name']))
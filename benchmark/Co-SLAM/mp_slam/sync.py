@@ -0,0 +1,179 @@
+import os
+import copy
+import json
+import time
+import torch
+import torch.multiprocessing as mp
+
+
+class SharedParams():
+    '''
+    Double-buffered copy of the model parameters in shared memory.
+
+    The mapper publishes into the back buffer, then bumps the version, which
+    makes it the front one. The tracker copies the front buffer into its own
+    model only when the version moved. A copy is retried if the mapper
+    started writing that buffer again meanwhile (seqlock), so no lock is held
+    on either side.
+    '''
+    def __init__(self, model):
+        state = model.state_dict()
+        self.names = list(state.keys())
+        self.buffers = [[state[name].detach().clone().share_memory_() for name in self.names] for _ in range(2)]
+        self.cuda = any(buf.is_cuda for buf in self.buffers[0])
+        # version published last, and version being written
+        self.version = torch.zeros((1), dtype=torch.int64).share_memory_()
+        self.writing = torch.zeros((1), dtype=torch.int64).share_memory_()
+
+    @torch.no_grad()
+    def publish(self, model):
+        version = int(self.version[0]) + 1
+        self.writing[0] = version
+        state = model.state_dict()
+        for buf, name in zip(self.buffers[version % 2], self.names):
+            buf.copy_(state[name])
+        if self.cuda:
+            torch.cuda.synchronize()
+        self.version[0] = version
+        return version
+
+    @torch.no_grad()
+    def sync(self, model, seen):
+        '''
+        Load the latest parameters into model if newer than version seen, returns the version held
+        '''
+        while True:
+            version = int(self.version[0])
+            if version <= seen:
+                return seen
+            state = model.state_dict()
+            for buf, name in zip(self.buffers[version % 2], self.names):
+                state[name].copy_(buf)
+            if self.cuda:
+                torch.cuda.synchronize()
+            # version + 2 goes to the buffer just read
+            if int(self.writing[0]) <= version + 1:
+                return version
+
+
+class Handoff():
+    '''
+    Condition the tracker and the mapper wait on instead of polling their shared frame counters.
+
+    The counters stay the shared tensors of CoSLAM, a side updates its counter
+    then calls notify().
+    '''
+    def __init__(self):
+        self.cond = mp.Condition()
+        self.first_frame = mp.Event()
+
+    def wait_for(self, predicate, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(predicate, timeout)
+
+    def notify(self):
+        with self.cond:
+            self.cond.notify_all()
+
+
+class Timings():
+    '''
+    Stall and lag counters of one process, written to mp_<name>.json at the end of the run
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.totals = {}
+        self.counts = {}
+        self.maxima = {}
+
+    def add(self, key, value):
+        self.totals[key] = self.totals.get(key, 0.) + value
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.maxima[key] = max(self.maxima.get(key, value), value)
+
+    def wait(self, handoff, key, predicate, timeout=None):
+        '''
+        handoff.wait_for, timed under key; False if the timeout ran out
+        '''
+        start = time.perf_counter()
+        ok = handoff.wait_for(predicate, timeout)
+        self.add(key, time.perf_counter() - start)
+        return ok
+
+    def report(self, save_dir=None):
+        report = {key: {'total': self.totals[key], 'mean': self.totals[key] / self.counts[key],
+                        'max': self.maxima[key], 'count': self.counts[key]} for key in self.totals}
+        for key, r in report.items():
+            print('[{}] {}: total {:.3f}, mean {:.4f}, max {:.4f} over {}'.format(
+                self.name, key, r['total'], r['mean'], r['max'], r['count']))
+        if save_dir is not None:
+            os.makedirs(save_dir, exist_ok=True)
+            with open(os.path.join(save_dir, 'mp_{}.json'.format(self.name)), 'w') as f:
+                json.dump(report, f, indent=4)
+        return report
+
+
+def _demo_mapper(model, params, handoff, tracking_idx, mapping_idx, num_frames, map_every, ba_time):
+    timings = Timings('mapper')
+    params.publish(model)
+    handoff.first_frame.set()
+    while True:
+        timings.wait(handoff, 'wait', lambda: tracking_idx[0] > mapping_idx[0] + map_every or tracking_idx[0] >= num_frames - 1)
+        if tracking_idx[0] <= mapping_idx[0] + map_every:
+            break
+        timings.add('lag', float(tracking_idx[0] - mapping_idx[0]))
+        time.sleep(ba_time)
+        with torch.no_grad():
+            for p in model.parameters():
+                p.add_(1.)
+        params.publish(model)
+        mapping_idx[0] += map_every
+        handoff.notify()
+    timings.report()
+
+
+def _demo_tracker(model, params, handoff, tracking_idx, mapping_idx, num_frames, map_every, track_time, budget):
+    timings = Timings('tracker')
+    handoff.first_frame.wait()
+    model = copy.deepcopy(model)
+    version = params.sync(model, -1)
+    for idx in range(1, num_frames):
+        ok = timings.wait(handoff, 'stall', lambda: mapping_idx[0] >= idx - map_every - map_every // 2, budget)
+        if not ok:
+            timings.add('budget_miss', 1.)
+        start = time.perf_counter()
+        synced = params.sync(model, version)
+        if synced != version:
+            timings.add('sync', time.perf_counter() - start)
+            version = synced
+        time.sleep(track_time)
+        tracking_idx[0] = idx
+        handoff.notify()
+    timings.report()
+
+
+if __name__ == '__main__':
+    # CPU check of the handoff: a fake mapper and tracker exchanging a small model
+    import argparse
+    parser = argparse.ArgumentParser(description='Run a fake tracker / mapper pair through the shared-memory handoff')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--map_every', type=int, default=5)
+    parser.add_argument('--ba_time', type=float, default=0.02, help='seconds per fake BA')
+    parser.add_argument('--track_time', type=float, default=0.003, help='seconds per fake tracking step')
+    parser.add_argument('--budget', type=float, default=None, help='max tracker wait per frame [s]')
+    args = parser.parse_args()
+
+    mp.set_start_method('spawn', force=True)
+    model = torch.nn.Sequential(torch.nn.Linear(32, 256), torch.nn.ReLU(), torch.nn.Linear(256, 4)).share_memory()
+    params = SharedParams(model)
+    handoff = Handoff()
+    tracking_idx = torch.zeros((1)).share_memory_()
+    mapping_idx = torch.zeros((1)).share_memory_()
+    start = time.perf_counter()
+    processes = [mp.Process(target=_demo_mapper, args=(model, params, handoff, tracking_idx, mapping_idx, args.frames, args.map_every, args.ba_time)),
+                 mp.Process(target=_demo_tracker, args=(model, params, handoff, tracking_idx, mapping_idx, args.frames, args.map_every, args.track_time, args.budget))]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    print('{} frames in {:.2f} s, version {}'.format(args.frames, time.perf_counter() - start, int(params.version[0])))
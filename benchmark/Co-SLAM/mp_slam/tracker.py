@@ -1,3 +1,4 @@
+import os
 import time
 import copy
 import torch
@@ -5,6 +6,9 @@ import torch.nn.functional as F
 from torch.utils.data import DataLoader
 from tqdm import tqdm
 
+from mp_slam.sync import Timings
+from slam_perturbation import profiling
+
 class Tracker():
     def __init__(self, config, SLAM) -> None:
         self.config = config
@@ -13,18 +17,30 @@ class Tracker():
         self.tracking_idx = SLAM.tracking_idx
         self.mapping_idx = SLAM.mapping_idx
         self.share_model = SLAM.model
+        self.shared_params = SLAM.shared_params
+        self.handoff = SLAM.handoff
         self.est_c2w_data = SLAM.est_c2w_data
         self.est_c2w_data_rel = SLAM.est_c2w_data_rel
         self.pose_gt = SLAM.pose_gt
         self.data_loader = DataLoader(SLAM.dataset, num_workers=self.config['data']['num_workers'])
-        self.prev_mapping_idx = -1
+        self.model = None
+        self.version = -1
         self.device = SLAM.device
+        # max seconds to wait for the mapper per frame, None waits as long as needed
+        self.latency_budget = config['tracking'].get('latency_budget')
+        self.timings = Timings('tracker')
     
     def update_params(self):
-        if self.mapping_idx[0] != self.prev_mapping_idx:
-            print('Updating params...')
+        '''
+        Load the parameters last published by the mapper, only if they changed
+        '''
+        if self.model is None:
             self.model = copy.deepcopy(self.share_model).to(self.device)
-            self.prev_mapping_idx = self.mapping_idx[0].clone()
+        start = time.perf_counter()
+        version = self.shared_params.sync(self.model, self.version)
+        if version != self.version:
+            self.timings.add('sync', time.perf_counter() - start)
+            self.version = version
     
     def predict_current_pose(self, frame_id, constant_speed=True):
         '''
@@ -71,7 +87,7 @@ class Tracker():
         cur_rot, cur_trans, pose_optimizer = self.slam.get_pose_param_optim(cur_c2w[None,...], mapping=False)
 
         # Start tracking
-        for i in range(self.config['tracking']['iter']):
+        for i in profiling.iterations(range(self.config['tracking']['iter']), 'track iter'):
             pose_optimizer.zero_grad()
             c2w_est = self.slam.matrix_from_tensor(cur_rot, cur_trans)
 
@@ -129,38 +145,27 @@ class Tracker():
         print('{}:Best loss: {}, Last loss{}'.format(frame_id, F.l1_loss(best_c2w_est.to(self.device)[0,:3], c2w_gt[:3]).cpu().item(), F.l1_loss(c2w_est[0,:3], c2w_gt[:3]).cpu().item()))
     
     def run(self):
-        # profiling code
-        # import cProfile, pstats, io
-        # from pstats import SortKey
-        # pr = cProfile.Profile()
-        # pr.enable()
-        # do something
-        # from torch.profiler import profile, record_function, ProfilerActivity
-        # with profile(activities=[ProfilerActivity.CPU, ProfilerActivity.CUDA], record_shapes=True) as prof:
-        #     with record_function("slam"):
-        for idx, batch in tqdm(enumerate(self.data_loader)):
+        # spans and the torch profiler window: --profile / --profile_torch of coslam_mp.py
+        for idx, batch in tqdm(enumerate(profiling.iterate(self.data_loader))):
+            profiling.frame(idx)
             if idx == 0:
                 continue
-            while self.mapping_idx[0] < idx-self.config['mapping']['map_every']-\
-                self.config['mapping']['map_every']//2:
-                time.sleep(0.1)
+            lag = self.config['mapping']['map_every'] + self.config['mapping']['map_every']//2
+            if not self.timings.wait(self.handoff, 'stall', lambda: self.mapping_idx[0] >= idx - lag, self.latency_budget):
+                # over budget, track against the current map
+                self.timings.add('budget_miss', 1.)
             
             self.update_params()
-            self.tracking_render(batch, idx)  
+            with profiling.span('track'):
+                self.tracking_render(batch, idx)  
             
             self.tracking_idx[0] = idx
+            self.handoff.notify()
 
 
         
         print('tracking finished') 
-        
-        # pr.disable()
-        # s = io.StringIO()
-        # sortby = SortKey.TIME
-        # ps = pstats.Stats(pr, stream=s).sort_stats(sortby)
-        # ps.print_stats()
-        # print(s.getvalue())
-        #print(prof.key_averages().table(sort_by="cuda_time_total", row_limit=100))
+        self.timings.report(os.path.join(self.config['data']['output'], self.config['data']['exp_name']))
         
         
 
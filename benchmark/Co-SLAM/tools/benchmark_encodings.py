@@ -0,0 +1,109 @@
+import time
+import argparse
+import numpy as np
+import torch
+
+from model import tcnn_torch
+
+
+def hash_grid_loop(grid, x, params):
+    # level by level, corner by corner reference of tcnn_torch.GridEncoding
+    table = params.reshape(-1, grid.n_features)
+    primes = tcnn_torch.PRIMES
+    out = []
+    for level in range(grid.n_levels):
+        pos = x * grid.level_scales[level] + 0.5
+        pos_grid = torch.floor(pos).long()
+        frac = pos - torch.floor(pos)
+        res = grid.level_resolutions[level]
+        feat = 0
+        for corner in range(8):
+            bits = torch.tensor([(corner >> d) & 1 for d in range(3)], device=x.device)
+            c = pos_grid + bits
+            weight = torch.where(bits.bool(), frac, 1 - frac).prod(-1)
+            if grid.hashed_levels[level]:
+                index = ((c[:, 0] * primes[0]) ^ (c[:, 1] * primes[1]) ^ (c[:, 2] * primes[2])) & 0xffffffff
+            else:
+                index = c[:, 0] + c[:, 1] * res + c[:, 2] * res * res
+            index = index % grid.level_sizes[level] + grid.level_offsets[level]
+            feat = feat + table[index] * weight[:, None]
+        out.append(feat)
+    return torch.cat(out, -1)
+
+
+def time_call(fn, repeat, sync):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        sync()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def forward_backward(fn, x):
+    # gradients w.r.t. the inputs too, the parameter-free encodings have nothing else
+    x = x.detach().requires_grad_()
+    def run():
+        out = fn(x)
+        out.float().square().sum().backward()
+    return run
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Forward / backward throughput of the torch fallback of the tcnn modules")
+    parser.add_argument("--points", help = "points per batch",        type = int, default = 65536)
+    parser.add_argument("--device", help = "torch device",            default = "cpu")
+    parser.add_argument("--repeat", help = "timed runs per module",   type = int, default = 3)
+    parser.add_argument("--hash",   help = "log2 hash table size",    type = int, default = 16)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    sync = torch.cuda.synchronize if device.type == 'cuda' else (lambda: None)
+    torch.manual_seed(0)
+    x = torch.rand(args.points, 3, device=device)
+
+    n_levels, base_resolution, desired_resolution = 16, 16, 400
+    per_level_scale = np.exp2(np.log2(desired_resolution / base_resolution) / (n_levels - 1))
+    modules = {
+        'HashGrid': tcnn_torch.Encoding(3, {"otype": "HashGrid", "n_levels": n_levels, "n_features_per_level": 2,
+                                            "log2_hashmap_size": args.hash, "base_resolution": base_resolution,
+                                            "per_level_scale": per_level_scale}),
+        'DenseGrid': tcnn_torch.Encoding(3, {"otype": "Grid", "type": "Dense", "n_levels": 4, "n_features_per_level": 2,
+                                             "base_resolution": base_resolution, "per_level_scale": 2.0, "interpolation": "Linear"}),
+        'OneBlob': tcnn_torch.Encoding(3, {"otype": "OneBlob", "n_bins": 16}),
+        'SphericalHarmonics': tcnn_torch.Encoding(3, {"otype": "SphericalHarmonics", "degree": 4}),
+        'FullyFusedMLP': tcnn_torch.Network(80, 16, {"otype": "FullyFusedMLP", "activation": "ReLU", "output_activation": "None",
+                                                     "n_neurons": 32, "n_hidden_layers": 1}),
+    }
+    inputs = {'FullyFusedMLP': torch.rand(args.points, 80, device=device)}
+
+    for name, module in modules.items():
+        module = module.to(device)
+        inp = inputs.get(name, x)
+        t_fwd = time_call(lambda: module(inp), args.repeat, sync)
+        t_bwd = time_call(forward_backward(module, inp), args.repeat, sync)
+        print("%18s: forward %8.2f ms (%6.2f M pts/s), forward + backward %8.2f ms (%6.2f M pts/s)"
+              % (name, t_fwd * 1e3, args.points / t_fwd / 1e6, t_bwd * 1e3, args.points / t_bwd / 1e6))
+
+    grid = modules['HashGrid']
+    ref = lambda inp: hash_grid_loop(grid.encoding, inp, grid.params)
+    t_fwd = time_call(lambda: ref(x), args.repeat, sync)
+    t_bwd = time_call(forward_backward(ref, x), args.repeat, sync)
+    diff = (ref(x) - grid(x)).abs().max().item()
+    print("%18s: forward %8.2f ms (%6.2f M pts/s), forward + backward %8.2f ms (%6.2f M pts/s), max diff %.2e"
+          % ('HashGrid (loop)', t_fwd * 1e3, args.points / t_fwd / 1e6, t_bwd * 1e3, args.points / t_bwd / 1e6, diff))
+
+    try:
+        import tinycudann as tcnn
+    except (ImportError, OSError):
+        tcnn = None
+    if tcnn is not None and device.type == 'cuda':
+        # same layout, so the fallback and tcnn must agree on the same params
+        native = tcnn.Encoding(3, grid.encoding_config, dtype=torch.float).to(device)
+        native.params.data.copy_(grid.params.data)
+        t_fwd = time_call(lambda: native(x), args.repeat, sync)
+        t_bwd = time_call(forward_backward(native, x), args.repeat, sync)
+        diff = (native(x) - grid(x)).abs().max().item()
+        print("%18s: forward %8.2f ms (%6.2f M pts/s), forward + backward %8.2f ms (%6.2f M pts/s), max diff %.2e"
+              % ('HashGrid (tcnn)', t_fwd * 1e3, args.points / t_fwd / 1e6, t_bwd * 1e3, args.points / t_bwd / 1e6, diff))
@@ -0,0 +1,43 @@
+import argparse
+import numpy as np
+import torch
+
+import config
+from model.scene_rep import JointEncoding
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the per-hypothesis losses of forward(groups=M) with forward() on each chunk")
+    parser.add_argument("--config", help = "Co-SLAM config",          default = "configs/Replica/room0.yaml")
+    parser.add_argument("--rays",   help = "rays per hypothesis",     type = int, default = 1024)
+    parser.add_argument("--groups", help = "number of hypotheses",    type = int, default = 4)
+    parser.add_argument("--device", help = "torch device",            default = "cpu")
+    args = parser.parse_args()
+
+    cfg = config.load_config(args.config)
+    # stratified sampling draws per call, the chunks would not see the same z_vals
+    cfg['training']['perturb'] = 0
+    cfg['training']['n_importance'] = 0
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    bound = torch.from_numpy(np.array(cfg['mapping']['bound'])).to(device)
+    model = JointEncoding(cfg, bound).to(device)
+    model.train()
+
+    n = args.rays * args.groups
+    rays_o = bound[:, 0] + (bound[:, 1] - bound[:, 0]) * torch.rand(n, 3, device=device)
+    rays_d = torch.nn.functional.normalize(torch.randn(n, 3, device=device), dim=-1)
+    target_rgb = torch.rand(n, 3, device=device)
+    target_d = torch.rand(n, 1, device=device) * 3
+    # depth-less rays, so that the rgb weight of invalid depth is exercised
+    target_d[torch.rand(n, device=device) < 0.3] = 0
+
+    with torch.no_grad():
+        grouped = model(rays_o, rays_d, target_rgb, target_d, groups=args.groups)
+        chunks = [model(*(t[k * args.rays:(k + 1) * args.rays] for t in (rays_o, rays_d, target_rgb, target_d)))
+                  for k in range(args.groups)]
+    for name in ('rgb_loss', 'depth_loss', 'sdf_loss', 'fs_loss'):
+        single = torch.stack([c[name] for c in chunks])
+        diff = (grouped[name] - single).abs().max().item()
+        print("%10s: grouped %s, per chunk %s, max diff %.2e" % (
+            name, grouped[name].cpu().numpy().round(5), single.cpu().numpy().round(5), diff))
@@ -6,6 +6,7 @@ import torch
 import sys
 import numpy as np
 sys.path.append('.')
+from slam_perturbation import trajectory
 
 def get_tensor_from_camera(RT, Tquad=False):
     """
@@ -47,22 +48,7 @@ def associate(first_list, second_list, offset=0.0, max_difference=0.02):
     matches -- list of matched tuples ((stamp1,data1),(stamp2,data2))
 
     """
-    first_keys = list(first_list.keys())
-    second_keys = list(second_list.keys())
-    potential_matches = [(abs(a - (b + offset)), a, b)
-                         for a in first_keys
-                         for b in second_keys
-                         if abs(a - (b + offset)) < max_difference]
-    potential_matches.sort()
-    matches = []
-    for diff, a, b in potential_matches:
-        if a in first_keys and b in second_keys:
-            first_keys.remove(a)
-            second_keys.remove(b)
-            matches.append((a, b))
-
-    matches.sort()
-    return matches
+    return trajectory.associate(first_list, second_list, offset, max_difference)
 
 def align(model, data):
     """Align two trajectories using the method of Horn (closed-form).
@@ -78,27 +64,8 @@ def align(model, data):
 
     """
     numpy.set_printoptions(precision=3, suppress=True)
-    model_zerocentered = model - model.mean(1)
-    data_zerocentered = data - data.mean(1)
-
-    W = numpy.zeros((3, 3))
-    for column in range(model.shape[1]):
-        W += numpy.outer(model_zerocentered[:,
-                         column], data_zerocentered[:, column])
-    U, d, Vh = numpy.linalg.linalg.svd(W.transpose())
-    S = numpy.matrix(numpy.identity(3))
-    if(numpy.linalg.det(U) * numpy.linalg.det(Vh) < 0):
-        S[2, 2] = -1
-    rot = U*S*Vh
-    trans = data.mean(1) - rot * model.mean(1)
-
-    model_aligned = rot * model + trans
-    alignment_error = model_aligned - data
-
-    trans_error = numpy.sqrt(numpy.sum(numpy.multiply(
-        alignment_error, alignment_error), 0)).A[0]
-
-    return rot, trans, trans_error
+    rot, trans, trans_error, _ = trajectory.align(numpy.asarray(model), numpy.asarray(data))
+    return numpy.matrix(rot), numpy.matrix(trans), trans_error
 
 def plot_traj(ax, stamps, traj, style, color, label):
     """
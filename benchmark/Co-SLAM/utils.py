@@ -59,11 +59,104 @@ def get_batch_query_fn(query_fn, num_args=1, device=None):
 
     return fn
 
+@torch.no_grad()
+def stream_sdf_grid(query_fn, tx, ty, tz, bounding_box, normalize=True, dtype=np.float32, mmap_path=None, chunk=1024 * 64):
+    '''
+    SDF of the (tx, ty, tz) grid, written slab by slab into a preallocated [X, Y, Z] volume
+
+    The coordinates of each slab of x planes are generated on the device when
+    it is queried, so the full grid is never held in memory. On CUDA the
+    device-to-host copy of a slab runs on a side stream into a pinned buffer
+    while the next slab is queried. The volume is a float32 or float16 array,
+    or a .npy memory map at mmap_path.
+    '''
+    device = bounding_box.device
+    shape = (len(tx), len(ty), len(tz))
+    if mmap_path:
+        volume = np.lib.format.open_memmap(mmap_path, 'w+', dtype, shape)
+    else:
+        volume = np.empty(shape, dtype=dtype)
+
+    tx, ty, tz = tx.to(device), ty.to(device), tz.to(device)
+    rows = max(1, chunk // (shape[1] * shape[2]))
+    cuda = device.type == 'cuda'
+    if cuda:
+        copy_stream = torch.cuda.Stream(device)
+        buffers = [torch.empty((rows,) + shape[1:], dtype=getattr(torch, np.dtype(dtype).name), pin_memory=True)
+                   for _ in range(2)]
+    pending = None
+
+    for n, x0 in enumerate(range(0, shape[0], rows)):
+        x1 = min(x0 + rows, shape[0])
+        flat = torch.stack(torch.meshgrid(tx[x0:x1], ty, tz, indexing='ij'), -1).reshape(-1, 3)
+        if normalize:
+            flat = (flat - bounding_box[:, 0]) / (bounding_box[:, 1] - bounding_box[:, 0])
+        sdf = torch.cat([query_fn(flat[i:i + chunk, None, :]).reshape(-1) for i in range(0, flat.shape[0], chunk)])
+        sdf = sdf.reshape((x1 - x0,) + shape[1:])
+
+        if not cuda:
+            volume[x0:x1] = sdf.cpu().numpy()
+            continue
+
+        host = buffers[n % 2][:x1 - x0]
+        copy_stream.wait_stream(torch.cuda.current_stream(device))
+        with torch.cuda.stream(copy_stream):
+            host.copy_(sdf, non_blocking=True)
+            sdf.record_stream(copy_stream)
+            done = torch.cuda.Event()
+            done.record(copy_stream)
+        # the previous slab landed while this one was queried
+        if pending is not None:
+            pending[0].synchronize()
+            volume[pending[1]:pending[2]] = pending[3].numpy()
+        pending = (done, x0, x1, host)
+
+    if pending is not None:
+        pending[0].synchronize()
+        volume[pending[1]:pending[2]] = pending[3].numpy()
+    if mmap_path:
+        volume.flush()
+    return volume
+
+
+def marching_cubes_slabs(volume, isolevel=0.0, slab=64):
+    '''
+    Marching cubes of an [X, Y, Z] volume run on slabs of slab x planes, each
+    read as float32 on its own, so a float16 or memory mapped volume is never
+    converted whole. The cells of this marching cubes are centred on the
+    voxels and read their neighbours, so each slab takes one plane more on
+    both sides; the vertices found twice on the seams are welded.
+    '''
+    parts = []
+    # cell centres 1 .. X - 2 have both neighbours
+    for c0 in range(1, volume.shape[0] - 1, slab):
+        c1 = min(c0 + slab, volume.shape[0] - 1)
+        vertices, triangles = mcubes.marching_cubes(np.asarray(volume[c0 - 1:c1 + 1], dtype=np.float32), isolevel, truncation=3.0)
+        if len(triangles) == 0:
+            continue
+        vertices[:, 0] += c0 - 1
+        parts.append((vertices, triangles.astype(np.int64)))
+    if len(parts) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    if len(parts) == 1:
+        return parts[0]
+    offsets = np.cumsum([0] + [len(v) for v, _ in parts[:-1]])
+    vertices = np.concatenate([v for v, _ in parts], 0)
+    triangles = np.concatenate([t + o for (_, t), o in zip(parts, offsets)], 0)
+    vertices, inverse = np.unique(vertices, axis=0, return_inverse=True)
+    return vertices, inverse.reshape(-1)[triangles]
+
+
 #### NeuralRGBD ####
 @torch.no_grad()
 def extract_mesh(query_fn, config, bounding_box, marching_cube_bound=None, color_func = None, voxel_size=None, resolution=None, isolevel=0.0, scene_name='', mesh_savepath=''):
     '''
     Extracts mesh from the scene model using marching cubes (Adapted from NeuralRGBD)
+
+    With mesh.stream the SDF grid is evaluated slab by slab into a preallocated
+    volume of mesh.sdf_dtype (float32 or float16), memory mapped to the file
+    mesh.sdf_mmap if set, see stream_sdf_grid. Marching cubes then runs on
+    slabs of mesh.mc_slab x planes, so only one slab at a time is float32.
     '''
     # Query network on dense 3d grid of points
     if marching_cube_bound is None:
@@ -73,6 +166,20 @@ def extract_mesh(query_fn, config, bounding_box, marching_cube_bound=None, color
     x_max, y_max, z_max = marching_cube_bound[:, 1]
 
     tx, ty, tz = getVoxels(x_max, x_min, y_max, y_min, z_max, z_min, voxel_size, resolution)
+
+    if config['mesh'].get('stream', True):
+        raw = stream_sdf_grid(query_fn, tx, ty, tz, bounding_box,
+                              normalize=config['grid']['tcnn_encoding'],
+                              dtype=np.dtype(config['mesh'].get('sdf_dtype', 'float32')),
+                              mmap_path=config['mesh'].get('sdf_mmap'))
+
+        print('Running Marching Cubes')
+        vertices, triangles = marching_cubes_slabs(raw, isolevel, config['mesh'].get('mc_slab', 64))
+        print('done', vertices.shape, triangles.shape)
+        del raw
+
+        return grid_to_mesh(vertices, triangles, tx, ty, tz, config, bounding_box, color_func, mesh_savepath)
+
     query_pts = torch.stack(torch.meshgrid(tx, ty, tz, indexing='ij'), -1).to(torch.float32)
 
     
@@ -96,6 +203,16 @@ def extract_mesh(query_fn, config, bounding_box, marching_cube_bound=None, color
     vertices, triangles = mcubes.marching_cubes(raw.squeeze(), isolevel, truncation=3.0)
     print('done', vertices.shape, triangles.shape)
 
+    return grid_to_mesh(vertices, triangles, tx, ty, tz, config, bounding_box, color_func, mesh_savepath)
+
+
+@torch.no_grad()
+def grid_to_mesh(vertices, triangles, tx, ty, tz, config, bounding_box, color_func=None, mesh_savepath=''):
+    '''
+    Mesh of marching cubes vertices given in voxel indices of the (tx, ty, tz)
+    grid: metric positions, optional vertex colors, exported to mesh_savepath
+    '''
+    chunk = 1024 * 64
     # normalize vertex positions
     vertices[:, :3] /= np.array([[tx.shape[0] - 1, ty.shape[0] - 1, tz.shape[0] - 1]])
 
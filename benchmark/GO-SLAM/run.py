@@ -7,6 +7,7 @@ import os
 from src import config
 from src.slam import SLAM
 from src.datasets import get_dataset
+from slam_perturbation import profiling
 
 
 import random
@@ -61,11 +62,24 @@ if __name__ == '__main__':
                         help='')
     parser.add_argument('--perturb_dynamic', type=int, default=0,
                         help='')
+    parser.add_argument('--packed_dir', type=str, default=None,
+                        help='frames packed by slam_perturbation.packed')
+    parser.add_argument('--perturb_cache', type=str, default=None,
+                        help='perturbed frames written by slam_perturbation.materialize')
+    parser.add_argument('--perturb_seed', type=int, default=0,
+                        help='seed of the materialized frames')
+    parser.add_argument('--results_db', type=str, default=None,
+                        help='results store the run record is appended to, see slam_perturbation.results')
     parser.add_argument('--frame_downsample', type=int, default=1,
                         help='')
     parser.add_argument('--enable_loop_closure', type=bool, default=True,
                         help='')    
+    parser.add_argument('--profile', type=str, default=None,
+                        help='folder for the span trace and summary of the run, see slam_perturbation.profiling')
+    parser.add_argument('--profile_torch', type=str, default=None,
+                        help='frames start:end to record with the torch profiler, needs --profile')
     args = parser.parse_args()
+    profiling.configure(args.profile, torch_window=args.profile_torch)
 
     torch.multiprocessing.set_start_method('spawn')
 
@@ -101,7 +115,12 @@ if __name__ == '__main__':
     cfg['robustness']['perturb_type'] = args.perturb_type
     cfg['robustness']['perturb_severity'] = args.perturb_severity
     cfg['robustness']['perturb_dynamic'] = args.perturb_dynamic
+    cfg['robustness']['perturb_cache'] = args.perturb_cache
+    cfg['robustness']['perturb_seed'] = args.perturb_seed
+    cfg['data']['packed_dir'] = args.packed_dir
+    cfg['data']['results_db'] = args.results_db
     cfg['robustness']['trainskip']=args.frame_downsample
+    cfg['robustness']['perturb_schedule'] = os.path.join(output_dir, 'perturb_schedule.npz')
   
     print(cfg)
 
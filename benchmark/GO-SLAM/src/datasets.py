@@ -6,10 +6,9 @@ import numpy as np
 import torch
 import torch.nn.functional as F
 from torch.utils.data import Dataset
-from .robustness import brightness,contrast,spatter,zoom_blur,motion_blur,defocus_blur,gaussian_noise,shot_noise,impulse_noise,speckle_noise,gaussian_blur,glass_blur,fog,frost,snow,jpeg_compression,pixelate,gaussian_noise_strong
-from .robustness_depth import depth_add_random_mask, depth_add_fixed_mask, depth_add_edge_erosion, depth_add_gaussian_noise, depth_range
+from slam_perturbation import FramePerturbation
+from slam_perturbation.packed import PackedSequence
 from PIL import Image
-import random
 
 
 
@@ -77,14 +76,14 @@ class BaseDataset(Dataset):
         else:
             self.input_folder = args.input_folder
 
-        self.perturb_type = 17
-        self.perturb_severity=0
-        self.perturb_dynamic = 0
+        self.packed = PackedSequence.from_config(cfg['data'])
+        self._packed_rows = {}
+        self.perturbation = FramePerturbation.from_config(cfg.get('robustness'))
+        self.perturb_type = self.perturbation.perturb_type
+        self.perturb_severity = self.perturbation.severity
+        self.perturb_dynamic = self.perturbation.dynamic
         self.trainskip = 1
         if 'robustness' in cfg.keys():
-            self.perturb_type = cfg['robustness']['perturb_type']
-            self.perturb_severity = cfg['robustness']['perturb_severity']
-            self.perturb_dynamic = cfg['robustness']['perturb_dynamic']
             print("#############################################################")
             print("self.perturb_type",self.perturb_type)
             print("self.perturb_severity",self.perturb_severity)
@@ -98,9 +97,27 @@ class BaseDataset(Dataset):
     def __len__(self):
         return self.n_img
 
+    def packed_rows(self, kind):
+        '''
+        Row of the packed store holding each frame of color_paths (kind 'rgb') or
+        depth_paths ('depth'). The store holds every frame of the folder, the loaders
+        may keep a subset (stride, max_frames, timestamp association).
+        '''
+        if kind not in self._packed_rows:
+            paths, files = ((self.color_paths, self.packed.rgb_files) if kind == 'rgb'
+                            else (self.depth_paths, self.packed.depth_files))
+            row = {name: i for i, name in enumerate(files)}
+            missing = [path for path in paths if os.path.basename(path) not in row]
+            if missing:
+                raise ValueError('{} is not in the packed store {}'.format(missing[0], self.packed.root))
+            self._packed_rows[kind] = [row[os.path.basename(path)] for path in paths]
+        return self._packed_rows[kind]
+
     def depthloader(self, index):
         if self.depth_paths is None:
             return None
+        if self.packed is not None:
+            return self.packed.depth[self.packed_rows('depth')[index]]
         depth_path = self.depth_paths[index]
         if '.png' in depth_path:
             depth_data = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
@@ -113,8 +130,12 @@ class BaseDataset(Dataset):
         return depth_data
 
     def __getitem__(self, index):
-        color_path = self.color_paths[index*self.trainskip]
-        color_data = cv2.imread(color_path)
+        if self.packed is not None:
+            # zero-copy view, RGB already
+            color_data = self.packed.rgb[self.packed_rows('rgb')[index*self.trainskip]]
+        else:
+            color_path = self.color_paths[index*self.trainskip]
+            color_data = cv2.cvtColor(cv2.imread(color_path), cv2.COLOR_BGR2RGB)
         if self.distortion is not None:
             K = np.eye(3)
             K[0, 0], K[0, 2], K[1, 1], K[1, 2] = self.fx, self.cx, self.fy, self.cy
@@ -123,59 +144,10 @@ class BaseDataset(Dataset):
 
         ## robustness evaluation start
 
-        color_data = cv2.cvtColor(color_data, cv2.COLOR_BGR2RGB)
         color_data = Image.fromarray(color_data)
 
-        if self.perturb_dynamic > 0:
-            print("dynamic perturbation")
-            rnd_severity = random.choice([0, 1, 2, 3, 4, 5])
-            if rnd_severity > 0:
-                perturb_type = self.perturb_type
-                perturb_severity = rnd_severity
-            else:
-                perturb_type = 17 # no perturbation
-                perturb_severity = self.perturb_severity
-            print("dyn_perturb: "+ str(perturb_type) + "_" + str(perturb_severity))
-        else:
-            perturb_type = self.perturb_type
-            perturb_severity = self.perturb_severity
-
-        if perturb_type == 0:
-            color_data = brightness(color_data,perturb_severity)
-        elif perturb_type == 1:
-            color_data = contrast(color_data,perturb_severity)
-        elif perturb_type == 2:
-            color_data = spatter(color_data,perturb_severity)
-        elif perturb_type == 3:
-            color_data = zoom_blur(color_data,perturb_severity)
-        elif perturb_type == 4:
-            color_data = motion_blur(color_data,perturb_severity)
-        elif perturb_type == 5:
-            color_data = defocus_blur(color_data,perturb_severity)
-        elif perturb_type == 6:
-            color_data = gaussian_noise(color_data,perturb_severity)
-        elif perturb_type == 7:
-            color_data = shot_noise(color_data,perturb_severity)
-        elif perturb_type == 8:
-            color_data = impulse_noise(color_data,perturb_severity)
-        elif perturb_type == 9:
-            color_data = speckle_noise(color_data,perturb_severity)
-        elif perturb_type == 10:
-            color_data = gaussian_blur(color_data,perturb_severity)
-        elif perturb_type == 11:
-            color_data = glass_blur(color_data,perturb_severity)
-        elif perturb_type == 12:
-            color_data = fog(color_data,perturb_severity)
-        elif perturb_type == 13:
-            color_data = frost(color_data,perturb_severity)
-        elif perturb_type == 14:
-            color_data = snow(color_data,perturb_severity)
-        elif perturb_type == 15:
-            color_data = jpeg_compression(color_data,perturb_severity)
-        elif perturb_type == 16:
-            color_data = pixelate(color_data,perturb_severity)
-        elif perturb_type == 17:
-            pass
+        perturb_type, perturb_severity, perturb_seed = self.perturbation.sample(index, self.n_img)
+        color_data = self.perturbation.apply(color_data, 'rgb', perturb_type, perturb_severity, perturb_seed)
         
 
         color_data = np.array(color_data)
@@ -189,37 +161,13 @@ class BaseDataset(Dataset):
         color_data = torch.from_numpy(color_data).float().permute(2, 0, 1)[[2, 1, 0], :, :] / 255.0  # bgr -> rgb, [0, 1]
         color_data = color_data.unsqueeze(dim=0)  # [1, 3, h, w]
 
-        if self.perturb_type == 18:
-            if self.perturb_dynamic > 0:
-                # If dynamic perturbation is enabled, select a random delay within a range
-                min_delay = self.perturb_severity - self.perturb_dynamic
-                max_delay = self.perturb_severity + self.perturb_dynamic
-                # Make sure the min_delay is not negative
-                min_delay = max(0, min_delay)
-                delay = random.randint(min_delay, max_delay)
-            else:
-                # Static delay
-                delay = self.perturb_severity
-
-            depth_index = max(0, min(index - delay, self.n_img - 1))  # Ensure depth_index is within valid range
-        else:
-            depth_index = index
+        depth_index = self.perturbation.depth_index(index, self.n_img)
 
         #depth_path = self.depth_paths[depth_index * self.trainskip]  # Apply offset to depth index
         depth_data = self.depthloader(depth_index*self.trainskip)
-        if perturb_type == 20:
-            depth_data = depth_add_gaussian_noise(depth_data, perturb_severity)
-        elif perturb_type == 21:
-            depth_data = depth_add_edge_erosion(depth_data, perturb_severity)
-        elif perturb_type == 22:
-            depth_data = depth_add_random_mask(depth_data, perturb_severity)
-        elif perturb_type == 23:
-            depth_data = depth_add_fixed_mask(depth_data, perturb_severity)
-        elif perturb_type >= 25:
-            pass
+        depth_data = self.perturbation.apply(depth_data, 'depth', perturb_type, perturb_severity, perturb_seed)
         depth_data = depth_data.astype(np.float32) / self.png_depth_scale
-        if perturb_type == 24:
-            depth_data = depth_range(depth_data,perturb_severity)
+        depth_data = self.perturbation.apply(depth_data, 'metric_depth', perturb_type, perturb_severity, perturb_seed)
         if depth_data is not None:
             depth_data = torch.from_numpy(depth_data).float()
             depth_data = F.interpolate(
@@ -256,10 +204,13 @@ class Replica(BaseDataset):
     def __init__(self, cfg, args, device='cuda:0'):
         super(Replica, self).__init__(cfg, args, device)
         stride = cfg['stride']
-        self.color_paths = sorted(
-            glob.glob(f'{self.input_folder}/results/frame*.jpg'))
-        self.depth_paths = sorted(
-            glob.glob(f'{self.input_folder}/results/depth*.png'))
+        if self.packed is not None:
+            self.color_paths, self.depth_paths = self.packed.rgb_files, self.packed.depth_files
+        else:
+            self.color_paths = sorted(
+                glob.glob(f'{self.input_folder}/results/frame*.jpg'))
+            self.depth_paths = sorted(
+                glob.glob(f'{self.input_folder}/results/depth*.png'))
         self.n_img = len(self.color_paths)
 
         self.load_poses(f'{self.input_folder}/traj.txt')
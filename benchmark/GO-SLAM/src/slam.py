@@ -8,6 +8,7 @@ from tqdm import tqdm
 from lietorch import SE3
 from time import gmtime, strftime, time, sleep
 import torch.multiprocessing as mp
+from slam_perturbation import profiling, results
 
 from .droid_net import DroidNet
 from .frontend import Frontend
@@ -45,10 +46,12 @@ class Tracker(nn.Module):
         with torch.no_grad():
 
             ### check there is enough motion
-            self.motion_filter.track(timestamp, image, depth, intrinsic, gt_pose=gt_pose)
+            with profiling.span('motion filter'):
+                self.motion_filter.track(timestamp, image, depth, intrinsic, gt_pose=gt_pose)
 
             # local bundle adjustment
-            self.frontend()
+            with profiling.span('local BA'):
+                self.frontend()
 
 
 class BundleAdjustment(nn.Module):
@@ -212,10 +215,12 @@ class SLAM:
         self.all_trigered += 1
         while(self.all_trigered < self.num_running_thread):
             pass
-        for (timestamp, image, depth, intrinsic, gt_pose) in tqdm(stream):
+        for (timestamp, image, depth, intrinsic, gt_pose) in profiling.iterate(tqdm(stream)):
+            profiling.frame(int(timestamp))
             if self.mode != 'rgbd':
                 depth = None
-            self.tracker(timestamp, image, depth, intrinsic, gt_pose)
+            with profiling.span('track'):
+                self.tracker(timestamp, image, depth, intrinsic, gt_pose)
 
             # predict mesh every 50 frames for video making
             if timestamp % 50 == 0 and timestamp > 0 and self.make_video:
@@ -224,6 +229,7 @@ class SLAM:
                 sleep(1.0)
 
         self.tracking_finished += 1
+        profiling.count('keyframes', int(self.video.counter.value))
         print('Tracking Done!')
 
     def optimizing(self, rank, dont_run=False):
@@ -232,10 +238,12 @@ class SLAM:
         while(self.tracking_finished < 1 and not dont_run):
             while(self.hang_on > 0 and self.make_video):
                 sleep(1.0)
-            self.ba()
+            with profiling.span('BA'):
+                self.ba()
 
         if not dont_run:
-            self.ba()
+            with profiling.span('BA'):
+                self.ba()
         self.optimizing_finished += 1
 
         print('Full Bundle Adjustment Done!')
@@ -246,7 +254,8 @@ class SLAM:
         while((self.tracking_finished < 1 or self.optimizing_finished < 1) and not dont_run):
             while(self.hang_on > 0 and self.make_video):
                 sleep(1.0)
-            self.multiview_filter()
+            with profiling.span('multiview filter'):
+                self.multiview_filter()
 
         print('Multiview Filtering Done!')
 
@@ -256,12 +265,14 @@ class SLAM:
         while(self.tracking_finished < 1 and not dont_run):
             while(self.hang_on > 0 and self.make_video):
                 sleep(1.0)
-            self.mapper()
+            with profiling.span('map'):
+                self.mapper()
 
         if not dont_run:
             print('Start post-processing on mapping...')
             for i in tqdm(range(self.post_processing_iters)):
-                self.mapper(the_end=True)
+                with profiling.span('map'):
+                    self.mapper(the_end=True)
         self.mapping_finished += 1
         print('Dense Mapping Done!')
 
@@ -271,7 +282,8 @@ class SLAM:
         while(self.mapping_finished < 1 and (not dont_run)):
             while(self.hang_on < 1 and self.mapping_finished < 1 and self.make_video):
                 sleep(1.0)
-            self.mesher()
+            with profiling.span('mesh'):
+                self.mesher()
             self.hang_on[:] = 0
 
         self.meshing_finished += 1
@@ -286,6 +298,14 @@ class SLAM:
         self.visualizing_finished += 1
         print('Visualization Done!')
 
+    def record_run(self, stream, gt=None, est=None, metrics=None):
+        """ structured record of the run next to its outputs and in the results store """
+        return results.record_run('go-slam', os.path.basename(os.path.normpath(stream.input_folder)),
+                                  self.cfg.get('robustness', {}), gt, est, with_scale=True,
+                                  downsample=self.cfg.get('robustness', {}).get('trainskip', 1), variant=self.cfg['mode'],
+                                  metrics=metrics, timings={'wall': time() - self.start_time, 'frames': len(stream)},
+                                  config=self.cfg, output_dir=self.output, db=self.cfg['data'].get('results_db'))
+
     def terminate(self, rank, stream=None):
         """ fill poses for non-keyframe images and evaluate """
 
@@ -309,6 +329,7 @@ class SLAM:
             import numpy as np
 
             print("#"*20 + f" Results for {stream.input_folder} ...")
+            eval_span = profiling.begin('eval')
 
             timestamps = [i for i in range(len(stream))]
             camera_trajectory = self.traj_filler(stream)  # w2cs
@@ -337,7 +358,9 @@ class SLAM:
                 print("Terminate: no GT poses found!")
                 trans_init = None
                 gt_c2w_list = None
+                self.record_run(stream)
             else:
+                valid = []
                 for i in range(len(stream.poses)):
                     val = stream.poses[i].sum()
                     if np.isnan(val) or np.isinf(val):
@@ -345,6 +368,7 @@ class SLAM:
                         continue
                     traj_est_select.append(traj_est[i])
                     traj_ref.append(stream.poses[i])
+                    valid.append(i)
 
                 traj_est = np.stack(traj_est_select, axis=0)
                 gt_c2w_list = torch.from_numpy(np.stack(traj_ref, axis=0))
@@ -363,14 +387,21 @@ class SLAM:
                 with open(out_path, 'a') as fp:
                     fp.write(result.pretty_str())
                 trans_init = result.np_arrays['alignment_transformation_sim3']
+                # same Sim3 alignment as evo
+                self.record_run(stream, gt=gt_c2w_list.numpy(), est=estimate_c2w_list[valid].numpy(),
+                                metrics={'evo_ape_rmse': result.stats['rmse']})
+
+            profiling.end('eval', eval_span)
 
             if self.meshing_finished > 0 and (not self.only_tracking):
-                self.mesher(the_end=True, estimate_c2w_list=estimate_c2w_list, gt_c2w_list=gt_c2w_list, trans_init=trans_init)
+                with profiling.span('mesh'):
+                    self.mesher(the_end=True, estimate_c2w_list=estimate_c2w_list, gt_c2w_list=gt_c2w_list, trans_init=trans_init)
 
         print("Terminate: Done!")
 
 
     def run(self, stream):
+        self.start_time = time()
          # Call the tracking method
         print('Starting tracking...')
         self.tracking(0, stream)
@@ -41,6 +41,7 @@ For this purpose, you can use the ''associate.py'' script. It reads the time sta
 """
 
 import argparse
+import bisect
 import sys
 import os
 import numpy
@@ -84,17 +85,24 @@ def associate(first_list, second_list,offset=0.0,max_difference=0.02):
     
     """
     first_keys = list(first_list.keys())
-    second_keys = list(second_list.keys())
-    potential_matches = [(abs(a - (b + offset)), a, b) 
-                         for a in first_keys 
-                         for b in second_keys 
-                         if abs(a - (b + offset)) < max_difference]
+    second_keys = sorted(second_list.keys(), key=lambda b: b + offset)
+    shifted = [b + offset for b in second_keys]
+    # candidates from a sorted search window instead of all pairs, slightly
+    # widened, the exact test below decides
+    window = max_difference * (1 + 1e-6) + 1e-12
+    potential_matches = []
+    for a in first_keys:
+        for i in range(bisect.bisect_left(shifted, a - window), bisect.bisect_right(shifted, a + window)):
+            if abs(a - shifted[i]) < max_difference:
+                potential_matches.append((abs(a - shifted[i]), a, second_keys[i]))
     potential_matches.sort()
+    used_first = set()
+    used_second = set()
     matches = []
     for diff, a, b in potential_matches:
-        if a in first_keys and b in second_keys:
-            first_keys.remove(a)
-            second_keys.remove(b)
+        if a not in used_first and b not in used_second:
+            used_first.add(a)
+            used_second.add(b)
             matches.append((a, b))
     
     matches.sort()
@@ -64,9 +64,7 @@ def align(model,data):
     model_zerocentered = model - model.mean(1)
     data_zerocentered = data - data.mean(1)
     
-    W = numpy.zeros( (3,3) )
-    for column in range(model.shape[1]):
-        W += numpy.outer(model_zerocentered[:,column],data_zerocentered[:,column])
+    W = model_zerocentered * data_zerocentered.transpose()
     U,d,Vh = numpy.linalg.linalg.svd(W.transpose())
     S = numpy.matrix(numpy.identity( 3 ))
     if(numpy.linalg.det(U) * numpy.linalg.det(Vh)<0):
@@ -74,13 +72,8 @@ def align(model,data):
     rot = U*S*Vh
 
     rotmodel = rot*model_zerocentered
-    dots = 0.0
-    norms = 0.0
-
-    for column in range(data_zerocentered.shape[1]):
-        dots += numpy.dot(data_zerocentered[:,column].transpose(),rotmodel[:,column])
-        normi = numpy.linalg.norm(model_zerocentered[:,column])
-        norms += normi*normi
+    dots = numpy.sum(numpy.multiply(data_zerocentered,rotmodel))
+    norms = numpy.sum(numpy.multiply(model_zerocentered,model_zerocentered))
 
     s = float(dots/norms)    
     
@@ -1,5 +1,6 @@
 import os
 import argparse
+import functools
 import numpy as np
 import cv2
 
@@ -8,12 +9,21 @@ from sensor_msgs.msg import Image
 from cv_bridge import CvBridge
 
 import utils_and_methods as utils
+import pipeline
+from slam_perturbation import profiling
 from PIL import Image as PILImage
 
-def perturb_and_publish_to_topic(dir: str, stamp_file: str, perturb: callable, lv: int, topic: str):
+def perturb_to_gray(img, lv, perturb):
+    img = PILImage.fromarray(img)
+    img = perturb(img, lv)
+    img = np.array(img).astype(np.uint8)
+    return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+def perturb_and_publish_to_topic(dir: str, stamp_file: str, perturb: callable, lv: int, topic: str, opts):
     print("Processing input files...")
-    images = utils.load_images_from_folder(dir)
-    stamps = utils.load_timestamps_from_file(stamp_file)
+    with profiling.span('data load'):
+        images = utils.load_images_from_folder(dir)
+        stamps = utils.load_timestamps_from_file(stamp_file)
     if len(images) < len(stamps): 
         print("Number of timestamps (%i) does not match number of images (%i). " % (len(stamps), len(images)))
         return 
@@ -22,23 +32,13 @@ def perturb_and_publish_to_topic(dir: str, stamp_file: str, perturb: callable, l
     img_pub = rospy.Publisher(topic, Image, queue_size=20)
 
     bridge = CvBridge()
-    rate = rospy.Rate(20) # NEEDS TO DEFINE
-    rng = np.random.default_rng()
-    for i in range(len(images)):
+    stream = pipeline.perturbed_stream(images, functools.partial(perturb_to_gray, perturb=perturb), lv, opts)
+    rate = pipeline.RateKeeper(opts.rate)
+    for i, img in stream:
+        profiling.frame(i)
         # From time in seconds (float) to the ROS Time class, 
         # which consists of two integers: seconds since epoch and nanoseconds since seconds
         t = rospy.rostime.Time.from_sec(stamps[i])
-        if lv == 99:
-            img = PILImage.fromarray(images[i])
-            img = perturb(img, rng.integers(1, 5, endpoint=True))
-            img = np.array(img).astype(np.uint8)
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-
-        else:
-            img = PILImage.fromarray(images[i])
-            img = perturb(img, lv)
-            img = np.array(img).astype(np.uint8)
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
             
         # Create message and modify header
         msg = bridge.cv2_to_imgmsg(img, encoding="mono8")
@@ -47,16 +47,19 @@ def perturb_and_publish_to_topic(dir: str, stamp_file: str, perturb: callable, l
         msg.header.stamp = t
 
         # Publish to topic 
-        img_pub.publish(msg)
+        rate.wait()
+        with profiling.span('publish'):
+            img_pub.publish(msg)
         if (i % 200 == 0):    
             print("Published %i / %i" % (i, len(images)))
 
-        rate.sleep()
+    print(rate.report())
 
-def perturb_and_publish_to_topic_rgbd(dir_image: str, dir_depth: str, stamp_file: str, perturb: callable, lv: int, topic_image: str, topic_depth: str):
+def perturb_and_publish_to_topic_rgbd(dir_image: str, dir_depth: str, stamp_file: str, perturb: callable, lv: int, topic_image: str, topic_depth: str, opts):
     print("Processing input files...")
-    images = utils.load_images_from_folder(dir_image)
-    depths = utils.load_images_from_folder(dir_depth)
+    with profiling.span('data load'):
+        images = utils.load_images_from_folder(dir_image)
+        depths = utils.load_images_from_folder(dir_depth)
     # images, depths = utils.load_rgbd_from_folder(dir_image)
     stamps = utils.load_timestamps_from_file(stamp_file)
     if len(images) < len(stamps): 
@@ -68,41 +71,33 @@ def perturb_and_publish_to_topic_rgbd(dir_image: str, dir_depth: str, stamp_file
     dep_pub = rospy.Publisher(topic_depth, Image, queue_size=20)
 
     bridge = CvBridge()
-    rate = rospy.Rate(20) # NEEDS TO DEFINE
-    rng = np.random.default_rng()
-    for i in range(len(images)):
+    stream = pipeline.perturbed_stream(images, functools.partial(perturb_to_gray, perturb=perturb), lv, opts)
+    rate = pipeline.RateKeeper(opts.rate)
+    for i, img in stream:
+        profiling.frame(i)
         # From time in seconds (float) to the ROS Time class, 
         # which consists of two integers: seconds since epoch and nanoseconds since seconds
         t = rospy.rostime.Time.from_sec(stamps[i])
-        if lv == 99:
-            img = PILImage.fromarray(images[i])
-            img = perturb(img, rng.integers(1, 5, endpoint=True))
-            img = np.array(img).astype(np.uint8)
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-
-        else:
-            img = PILImage.fromarray(images[i])
-            img = perturb(img, lv)
-            img = np.array(img).astype(np.uint8)
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
         # Create message and modify header
         msg = bridge.cv2_to_imgmsg(img, encoding="mono8")
         msg.header.seq = i
         msg.header.stamp = t
 
-        # Publish to topic 
-        img_pub.publish(msg)
-
         msg_depth = bridge.cv2_to_imgmsg(depths[i], encoding="passthrough")
         msg_depth.header.seq = i
         msg_depth.header.stamp = t
-        dep_pub.publish(msg_depth)
+
+        # Publish to topic 
+        rate.wait()
+        with profiling.span('publish'):
+            img_pub.publish(msg)
+            dep_pub.publish(msg_depth)
 
         if (i % 200 == 0):    
             print("Published %i / %i" % (i, len(images)))
 
-        rate.sleep()
+    print(rate.report())
 
 
 if __name__ == '__main__':
@@ -114,8 +109,15 @@ if __name__ == '__main__':
     parser.add_argument("--depth_topic", help = "Depth topic.",             nargs = '?', default = '/camera/depth_registered/image_raw') # topic name to be written
     parser.add_argument("--method",      help = "method name (see script)", nargs = '?', default = "gaussian_blur")
     parser.add_argument("--severity",    help = "severity [1,5]",           nargs = '?', type = int, default = 1)
+    parser.add_argument("--rate",        help = "publish rate [Hz]",        nargs = '?', type = float, default = 20)
+    parser.add_argument("--workers",     help = "perturbation processes, 0 perturbs in the publish loop", nargs = '?', type = int, default = 4)
+    parser.add_argument("--read_ahead",  help = "frames perturbed ahead of the publisher", nargs = '?', type = int, default = 16)
+    parser.add_argument("--seed",        help = "seed of the perturbations (random if unset)", nargs = '?', type = int, default = None)
+    parser.add_argument("--precompute_dir", help = "perturb all frames into this folder first, then replay", nargs = '?', default = "")
+    parser.add_argument("--profile",     help = "folder for the span trace and summary of the run, see slam_perturbation.profiling", nargs = '?', default = None)
 
     args = parser.parse_args()
+    profiling.configure(args.profile)
     dir = args.folder_path
     stamp_file = args.timestamp_file
     print("start_perturbation")
@@ -149,6 +151,6 @@ if __name__ == '__main__':
            (dir, args.method, args.severity, args.image_topic))
     
     if args.depth_path == "":
-        perturb_and_publish_to_topic(dir, stamp_file, perturb, args.severity, args.image_topic)
+        perturb_and_publish_to_topic(dir, stamp_file, perturb, args.severity, args.image_topic, args)
     else: 
-        perturb_and_publish_to_topic_rgbd(dir, args.depth_path, stamp_file, perturb, args.severity, "/camera/rgb/image_raw", args.depth_topic)
+        perturb_and_publish_to_topic_rgbd(dir, args.depth_path, stamp_file, perturb, args.severity, "/camera/rgb/image_raw", args.depth_topic, args)
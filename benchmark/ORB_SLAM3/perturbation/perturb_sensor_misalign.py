@@ -7,40 +7,14 @@ import rospy
 from sensor_msgs.msg import Image
 from cv_bridge import CvBridge
 
+import utils_and_methods as utils
 from PIL import Image as PILImage
 
-def load_images_from_folder(dir):
-    images = []
-    i = 0
-
-    for filename in sorted(os.listdir(dir)):
-        if filename[-3:] == "npy": 
-            img = np.load(os.path.join(dir,filename))
-            # img = np.clip(img, 0, 6)
-        else: 
-            img = cv2.imread(os.path.join(dir,filename))
-        if img is not None:
-            images.append(img)
-            
-        if i % 200 == 0: 
-            print(i)
-        i += 1
-    return images
-
-
-def load_timestamps_from_file(stamp_file): 
-    stamps = []
-    with open(stamp_file) as f:
-        for stamp in f:
-            stamps.append(float(stamp))
-    return stamps
-
-
 def misalign_and_publish_to_topic_rgbd(dir_image: str, dir_depth: str, stamp_file: str, to_add: int, dynamic: int, topic_image: str, topic_depth: str):
     print("Processing input files...")
-    images = load_images_from_folder(dir_image)
-    depths = load_images_from_folder(dir_depth)
-    stamps = load_timestamps_from_file(stamp_file)
+    images = utils.load_images_from_folder(dir_image)
+    depths = utils.load_images_from_folder(dir_depth)
+    stamps = utils.load_timestamps_from_file(stamp_file)
     if len(images) < len(stamps): 
         print("Number of timestamps (%i) does not match number of images (%i). " % (len(stamps), len(images)))
         return 
@@ -0,0 +1,125 @@
+import os
+import time
+import argparse
+import functools
+from io import BytesIO
+import numpy as np
+import cv2
+
+import rosbag
+from rospy import rostime
+from sensor_msgs.msg import Image
+from cv_bridge import CvBridge
+
+import slam_perturbation
+from slam_perturbation import profiling
+import utils_and_methods as utils
+import pipeline
+from PIL import Image as PILImage
+
+
+class RGBDFrames:
+    """(seq, stamp, rgb, depth) of frame i, decoded lazily by the two FrameReaders."""
+
+    def __init__(self, images, depths, stamps):
+        self.images = images
+        self.depths = depths
+        self.stamps = stamps
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def __getitem__(self, i):
+        return i, self.stamps[i], self.images[i], self.depths[i]
+
+
+def serialize(msg):
+    buff = BytesIO()
+    msg.serialize(buff)
+    return buff.getvalue()
+
+
+def perturb_and_serialize(frame, lv, perturb, stage):
+    """Both messages of a frame, perturbed and serialized; runs in the worker processes."""
+    seq, stamp, img, depth = frame
+    bridge = CvBridge()
+    if stage in (slam_perturbation.RGB, slam_perturbation.CLEAN):
+        img = PILImage.fromarray(img)
+        img = perturb(img, lv)
+        img = np.array(img).astype(np.uint8)
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        msg = bridge.cv2_to_imgmsg(img, encoding="mono8")
+    else:
+        depth = perturb(depth, lv).astype(np.uint16)
+        msg = bridge.cv2_to_imgmsg(img, encoding="passthrough")
+    msg_depth = bridge.cv2_to_imgmsg(depth.astype(np.uint16), encoding="16UC1")
+
+    t = rostime.Time.from_sec(stamp)
+    for m in (msg, msg_depth):
+        m.header.seq = seq
+        m.header.stamp = t
+    return stamp, serialize(msg), serialize(msg_depth)
+
+
+def perturb_to_rosbag(dir_image: str, dir_depth: str, stamp_file: str, method: str, lv: int, bag_name: str, topic_image: str, topic_depth: str, opts):
+    perturbation = slam_perturbation.find(method)
+    if perturbation is None or perturbation.stage == slam_perturbation.SYNC:
+        # sensor misalignment shifts whole streams, see perturb_sensor_misalign.py
+        print("Invalid perturbation method %s, expected an RGB or depth method. \n" % method)
+        return
+    print("Processing input files...")
+    with profiling.span('data load'):
+        images = utils.load_images_from_folder(dir_image)
+        depths = utils.load_depth_from_folder(dir_depth)
+        stamps = utils.load_timestamps_from_file(stamp_file)
+    if len(images) < len(stamps) or len(depths) < len(stamps):
+        print("Number of timestamps (%i) does not match number of images (%i) / depths (%i). " % (len(stamps), len(images), len(depths)))
+        return
+
+    # utils_and_methods holds the ORB-SLAM3 variants under the plain names
+    # (raw unit depth_range, own mask counts and erosion patches)
+    perturb = getattr(utils, perturbation.name, perturbation.method)
+    fn = functools.partial(perturb_and_serialize, perturb=perturb, stage=perturbation.stage)
+    # raw writes skip re-serializing the messages the workers already packed
+    raw = lambda data: (Image._type, data, Image._md5sum, Image)
+
+    start = time.time()
+    with rosbag.Bag(bag_name, 'w', chunk_threshold=opts.chunk_size * 1024 * 1024) as bag:
+        for i, (stamp, msg, msg_depth) in pipeline.perturbed_stream(RGBDFrames(images, depths, stamps), fn, lv, opts):
+            profiling.frame(i)
+            t = rostime.Time.from_sec(stamp)
+            with profiling.span('write'):
+                bag.write(topic_image, raw(msg), t, raw=True)
+                bag.write(topic_depth, raw(msg_depth), t, raw=True)
+            if (i % 200 == 0):
+                print("Wrote %i / %i (%.1f s)" % (i, len(stamps), time.time() - start))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read RGB-D frames from file, apply a perturbation and write them to a ROS bag")
+    parser.add_argument("folder_path",      help = "Input folder containing images.")
+    parser.add_argument("timestamp_file",   help = "File containing corresponding timestamps [sec].")
+    parser.add_argument("--depth_path",     help = "Input folder containing depths.")
+    parser.add_argument("--bag",            help = "Output bag (<folder>_<method>_<severity>.bag if empty).", nargs = '?', default = "")
+    parser.add_argument("--image_topic",    help = "Image topic.",             nargs = '?', default = "/camera/rgb/image_raw")
+    parser.add_argument("--depth_topic",    help = "Depth topic.",             nargs = '?', default = '/camera/depth_registered/image_raw')
+    parser.add_argument("--method",         help = "RGB or depth method name, see slam_perturbation", nargs = '?', default = "gaussian_blur")
+    parser.add_argument("--severity",       help = "severity [1,5], 99 draws one per frame", nargs = '?', type = int, default = 1)
+    parser.add_argument("--workers",        help = "perturbation processes", nargs = '?', type = int, default = os.cpu_count())
+    parser.add_argument("--read_ahead",     help = "frames in flight",       nargs = '?', type = int, default = 64)
+    parser.add_argument("--seed",           help = "seed of the perturbations (random if unset)", nargs = '?', type = int, default = None)
+    parser.add_argument("--chunk_size",     help = "bag chunk size [MB]",    nargs = '?', type = int, default = 64)
+    parser.add_argument("--profile",        help = "folder for the span trace and summary of the run, see slam_perturbation.profiling", nargs = '?', default = None)
+
+    args = parser.parse_args()
+    profiling.configure(args.profile)
+    # the bag is written straight from the worker results, never from a precomputed folder
+    args.precompute_dir = ""
+    bag_name = args.bag
+    if bag_name == "":
+        bag_name = "%s_%s_%i.bag" % (os.path.normpath(args.folder_path), args.method, args.severity)
+
+    print ("Images: %s \nPerturbation: %s %d \nWrite to %s" %
+           (args.folder_path, args.method, args.severity, bag_name))
+
+    perturb_to_rosbag(args.folder_path, args.depth_path, args.timestamp_file, args.method, args.severity, bag_name, args.image_topic, args.depth_topic, args)
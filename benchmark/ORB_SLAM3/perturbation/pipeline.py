@@ -0,0 +1,123 @@
+"""
+Perturb-and-publish pipeline of the ROS publishers.
+
+perturbed_frames() perturbs frames ahead of the publisher on a process pool
+and hands them back in frame order; RateKeeper holds the publish rate and
+counts the frames that went out late. precompute() writes all perturbed
+frames to disk first, for a replay whose timing does not depend on the
+perturbation cost at all.
+"""
+
+import os
+import time
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from slam_perturbation import profiling
+
+import utils_and_methods as utils
+
+
+def severities(lv, n, seed=None):
+    """Per-frame severities: lv for every frame, or uniform in [1, 5] per frame for lv 99."""
+    if lv == 99:
+        return np.random.default_rng(seed).integers(1, 5, size=n, endpoint=True).tolist()
+    return [lv] * n
+
+
+def run_seeded(fn, frame, severity, seed):
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    with profiling.span('perturb'):
+        return fn(frame, severity)
+
+
+def perturbed_frames(frames, fn, levels, workers=4, read_ahead=16, seed=None):
+    """
+    Yield (i, fn(frames[i], levels[i])) in frame order. Up to read_ahead
+    frames are in flight on `workers` processes (0 runs fn inline); results
+    wait in the reorder queue until all earlier frames are out. With a seed,
+    frame i is perturbed with np.random seeded to seed + i, whatever worker
+    runs it.
+    """
+    n = min(len(frames), len(levels))
+    frame_seed = (lambda i: None) if seed is None else (lambda i: seed + i)
+    if workers == 0:
+        for i in range(n):
+            yield i, run_seeded(fn, frames[i], levels[i], frame_seed(i))
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        in_flight = deque()
+        for i in range(n):
+            in_flight.append((i, pool.submit(run_seeded, fn, frames[i], levels[i], frame_seed(i))))
+            if len(in_flight) > read_ahead:
+                j, future = in_flight.popleft()
+                yield j, future.result()
+        while in_flight:
+            j, future = in_flight.popleft()
+            yield j, future.result()
+
+
+def precompute(frames, fn, levels, out_dir, **kwargs):
+    """Write every perturbed frame to out_dir as npy and return a FrameReader replaying them."""
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.time()
+    for i, frame in perturbed_frames(frames, fn, levels, **kwargs):
+        np.save(os.path.join(out_dir, "%06i.npy" % i), frame)
+        if i % 200 == 0:
+            print("Precomputed %i / %i (%.1f s)" % (i, len(levels), time.time() - start))
+    return utils.FrameReader(out_dir)
+
+
+def perturbed_stream(frames, fn, lv, opts):
+    """
+    (i, perturbed frame) in order for a publisher: perturbed ahead by the
+    worker pool, or replayed from opts.precompute_dir once all are written.
+    opts carries the --seed / --workers / --read_ahead / --precompute_dir arguments.
+    """
+    levels = severities(lv, len(frames), opts.seed)
+    kwargs = dict(workers=opts.workers, read_ahead=opts.read_ahead, seed=opts.seed)
+    if opts.precompute_dir != "":
+        return profiling.iterate(enumerate(precompute(frames, fn, levels, opts.precompute_dir, **kwargs)), 'data load')
+    # time the publisher waits for the workers
+    return profiling.iterate(perturbed_frames(frames, fn, levels, **kwargs), 'perturb wait')
+
+
+class RateKeeper:
+    """
+    Paces a loop at `hz` on absolute deadlines. A frame is a deadline miss
+    when it is ready more than tolerance periods after its slot; the
+    schedule then restarts from now instead of bursting to catch up.
+    """
+
+    def __init__(self, hz, tolerance=0.1):
+        self.period = 1. / hz
+        self.tolerance = tolerance
+        self.deadline = None
+        self.frames = 0
+        self.misses = 0
+        self.max_lateness = 0.
+
+    def wait(self):
+        """Block until the slot of the next frame."""
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+        lateness = now - self.deadline
+        if lateness > self.tolerance * self.period:
+            self.misses += 1
+            profiling.count('deadline misses')
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.deadline = now
+        elif lateness < 0:
+            time.sleep(-lateness)
+        self.frames += 1
+        self.deadline += self.period
+
+    def report(self):
+        return "%i / %i frames missed their %.1f Hz slot (max %.1f ms late)" % (
+            self.misses, self.frames, 1. / self.period, self.max_lateness * 1000)
@@ -23,10 +23,9 @@ from natsort import natsorted
 
 from .geometryutils import relative_transformation
 from . import datautils
-from .robustness import brightness,contrast,spatter,zoom_blur,motion_blur,defocus_blur,gaussian_noise,shot_noise,impulse_noise,speckle_noise,gaussian_blur,glass_blur,fog,frost,snow,jpeg_compression,pixelate,gaussian_noise_strong
-from .robustness_depth import depth_add_random_mask, depth_add_fixed_mask, depth_add_edge_erosion, depth_add_gaussian_noise, depth_range
+from slam_perturbation import FramePerturbation
+from slam_perturbation.packed import PackedSequence
 from PIL import Image
-import random
 
 
 def to_scalar(inp: Union[np.ndarray, torch.Tensor, float]) -> Union[int, float]:
@@ -150,14 +149,11 @@ class GradSLAMDataset(torch.utils.data.Dataset):
         self.embedding_dir = embedding_dir
         self.embedding_dim = embedding_dim
         self.relative_pose = relative_pose
-        if 'perturb_type' in config_dict.keys():
-            self.perturb_type = config_dict['perturb_type'] #17
-            self.perturb_severity=config_dict['perturb_severity']
-            self.perturb_dynamic=config_dict['perturb_dynamic']
-
-        #if 'robustness' in config_dict.keys():
-        #    self.perturb_type = cfg['robustness']['perturb_type']
-        #    self.perturb_severity = cfg['robustness']['perturb_severity']
+        self.packed = PackedSequence.from_config(config_dict)
+        self.perturbation = FramePerturbation.from_config(config_dict)
+        self.perturb_type = self.perturbation.perturb_type
+        self.perturb_severity = self.perturbation.severity
+        self.perturb_dynamic = self.perturbation.dynamic
 
 
 
@@ -309,69 +305,29 @@ class GradSLAMDataset(torch.utils.data.Dataset):
 
     def __getitem__(self, index):
         color_path = self.color_paths[index]
-        depth_path = self.depth_paths[index]
-        color = np.asarray(imageio.imread(color_path), dtype=float)
+        depth_path = self.depth_paths[self.perturbation.depth_index(index, self.num_imgs)]
+        if self.packed is not None:
+            # the packed arrays hold every frame, before start/end/stride
+            color = np.asarray(self.packed.rgb[self.retained_inds[index]], dtype=float)
+        else:
+            color = np.asarray(imageio.imread(color_path), dtype=float)
         
 
         # robustness evaluation
         color = Image.fromarray(color.astype(np.uint8))
 
-        if self.perturb_dynamic > 0:
-            rnd_severity = random.choice([0, 1, 2, 3, 4, 5])
-            if rnd_severity > 0:
-                perturb_type = self.perturb_type
-                perturb_severity = rnd_severity
-            else:
-                perturb_type = 17 # no perturbation
-                perturb_severity = self.perturb_severity
-            print("dyn_perturb: "+ str(perturb_type) + "_" + str(perturb_severity))
-        else:
-            perturb_type = self.perturb_type
-            perturb_severity = self.perturb_severity
-
-        if perturb_type == 0:
-            color = brightness(color,perturb_severity)
-        elif perturb_type == 1:
-            color = contrast(color,perturb_severity)
-        elif perturb_type == 2:
-            color = spatter(color,perturb_severity)
-        elif perturb_type == 3:
-            color = zoom_blur(color,perturb_severity)
-        elif perturb_type == 4:
-            color = motion_blur(color,perturb_severity)
-        elif perturb_type == 5:
-            color = defocus_blur(color,perturb_severity)
-        elif perturb_type == 6:
-            color = gaussian_noise(color,perturb_severity)
-        elif perturb_type == 7:
-            color = shot_noise(color,perturb_severity)
-        elif perturb_type == 8:
-            color = impulse_noise(color,perturb_severity)
-        elif perturb_type == 9:
-            color = speckle_noise(color,perturb_severity)
-        elif perturb_type == 10:
-            color = gaussian_blur(color,perturb_severity)
-        elif perturb_type == 11:
-            color = glass_blur(color,perturb_severity)
-        elif perturb_type == 12:
-            color = fog(color,perturb_severity)
-        elif perturb_type == 13:
-            color = frost(color,perturb_severity)
-        elif perturb_type == 14:
-            color = snow(color,perturb_severity)
-        elif perturb_type == 15:
-            color = jpeg_compression(color,perturb_severity)
-        elif perturb_type == 16:
-            color = pixelate(color,perturb_severity)
-        elif perturb_type == 17:
-            pass
+        perturb_type, perturb_severity, perturb_seed = self.perturbation.sample(index, self.num_imgs)
+        color = self.perturbation.apply(color, 'rgb', perturb_type, perturb_severity, perturb_seed)
 
         color = np.array(color)+0.0
 
 
 
         color = self._preprocess_color(color)
-        if ".png" in depth_path:
+        if self.packed is not None:
+            depth_index = self.retained_inds[self.perturbation.depth_index(index, self.num_imgs)]
+            depth = np.asarray(self.packed.depth[depth_index], dtype=np.int64)
+        elif ".png" in depth_path:
             # depth_data = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
             depth = np.asarray(imageio.imread(depth_path), dtype=np.int64)
         elif ".exr" in depth_path:
@@ -385,20 +341,10 @@ class GradSLAMDataset(torch.utils.data.Dataset):
         color = torch.from_numpy(color)
         K = torch.from_numpy(K)
 
-        if perturb_type == 20:
-            depth = depth_add_gaussian_noise(depth, perturb_severity)
-        elif perturb_type == 21:
-            depth = depth_add_edge_erosion(depth, perturb_severity)
-        elif perturb_type == 22:
-            depth = depth_add_random_mask(depth, perturb_severity)
-        elif perturb_type == 23:
-            depth = depth_add_fixed_mask(depth, perturb_severity)
-        elif perturb_type >= 25:
-            pass
+        depth = self.perturbation.apply(depth, 'depth', perturb_type, perturb_severity, perturb_seed)
 
         depth = self._preprocess_depth(depth)
-        if perturb_type == 24:
-            depth = depth_range(depth,perturb_severity)
+        depth = self.perturbation.apply(depth, 'metric_depth', perturb_type, perturb_severity, perturb_seed)
         depth = torch.from_numpy(depth)
 
         K = datautils.scale_intrinsics(K, self.height_downsample_ratio, self.width_downsample_ratio)
@@ -42,8 +42,12 @@ class ReplicaDataset(GradSLAMDataset):
         )
 
     def get_filepaths(self):
-        color_paths = natsorted(glob.glob(f"{self.input_folder}/results/frame*.jpg"))
-        depth_paths = natsorted(glob.glob(f"{self.input_folder}/results/depth*.png"))
+        if self.packed is not None:
+            color_paths = [f"{self.input_folder}/results/{f}" for f in self.packed.rgb_files]
+            depth_paths = [f"{self.input_folder}/results/{f}" for f in self.packed.depth_files]
+        else:
+            color_paths = natsorted(glob.glob(f"{self.input_folder}/results/frame*.jpg"))
+            depth_paths = natsorted(glob.glob(f"{self.input_folder}/results/depth*.png"))
         embedding_paths = None
         if self.load_embeddings:
             embedding_paths = natsorted(glob.glob(f"{self.input_folder}/{self.embedding_dir}/*.pt"))
@@ -38,6 +38,7 @@ from datasets.gradslam_datasets import (
 from utils.common_utils import seed_everything, save_params_ckpt, save_params
 from utils.eval_helpers import report_loss, report_progress, eval
 from utils.keyframe_selection import keyframe_selection_overlap
+from slam_perturbation import profiling, results
 from utils.recon_helpers import setup_camera
 from utils.slam_helpers import (
     transformed_params2rendervar, transformed_params2depthplussilhouette,
@@ -458,6 +459,7 @@ def rgbd_slam(config: dict):
     if "visualize_tracking_loss" not in config['tracking']:
         config['tracking']['visualize_tracking_loss'] = False
     print(f"{config}")
+    start_time = time.time()
 
     # Create Output Directories
     output_dir = os.path.join(config["workdir"], config["run_name"])
@@ -515,6 +517,10 @@ def rgbd_slam(config: dict):
     gradslam_data_cfg['perturb_type']=config['perturb_type']
     gradslam_data_cfg['perturb_severity']=config['perturb_severity']
     gradslam_data_cfg['perturb_dynamic']=config['perturb_dynamic']
+    gradslam_data_cfg['perturb_cache']=config.get('perturb_cache')
+    gradslam_data_cfg['packed_dir']=config.get('packed_dir')
+    gradslam_data_cfg['perturb_seed']=config.get('perturb_seed', 0)
+    gradslam_data_cfg['perturb_schedule']=config.get('perturb_schedule')
     gradslam_data_cfg['frame_downsample']=config['frame_downsample']
 
     # Poses are relative to the first frame
@@ -643,8 +649,10 @@ def rgbd_slam(config: dict):
     
     # Iterate over Scan
     for time_idx in tqdm(range(checkpoint_time_idx, num_frames)):
+        profiling.frame(time_idx)
         # Load RGBD frames incrementally instead of all frames
-        color, depth, _, gt_pose = dataset[time_idx]
+        with profiling.span('data load'):
+            color, depth, _, gt_pose = dataset[time_idx]
         # Process poses
         gt_w2c = torch.linalg.inv(gt_pose)
         # Process RGB-D Data
@@ -677,6 +685,7 @@ def rgbd_slam(config: dict):
 
         # Tracking
         tracking_start_time = time.time()
+        tracking_span = profiling.begin('track')
         if time_idx > 0 and not config['tracking']['use_gt_poses']:
             # Reset Optimizer & Learning Rates for tracking
             optimizer = initialize_optimizer(params, config['tracking']['lrs'], tracking=True)
@@ -691,6 +700,7 @@ def rgbd_slam(config: dict):
             progress_bar = tqdm(range(num_iters_tracking), desc=f"Tracking Time Step: {time_idx}")
             while True:
                 iter_start_time = time.time()
+                iter_span = profiling.begin('track iter')
                 # Loss for current frame
                 loss, variables, losses = get_loss(config, params, tracking_curr_data, variables, iter_time_idx, config['tracking']['loss_weights'],
                                                    config['tracking']['use_sil_for_loss'], config['tracking']['sil_thres'],
@@ -722,6 +732,7 @@ def rgbd_slam(config: dict):
                         progress_bar.update(1)
                 # Update the runtime numbers
                 iter_end_time = time.time()
+                profiling.end('track iter', iter_span)
                 tracking_iter_time_sum += iter_end_time - iter_start_time
                 tracking_iter_time_count += 1
                 # Check if we should stop tracking
@@ -756,6 +767,7 @@ def rgbd_slam(config: dict):
                 params['cam_trans'][..., time_idx] = rel_w2c_tran
         # Update the runtime numbers
         tracking_end_time = time.time()
+        profiling.end('track', tracking_span)
         tracking_frame_time_sum += tracking_end_time - tracking_start_time
         tracking_frame_time_count += 1
 
@@ -791,9 +803,10 @@ def rgbd_slam(config: dict):
                     densify_curr_data = curr_data
 
                 # Add new Gaussians to the scene based on the Silhouette
-                params, variables = add_new_gaussians(config, params, variables, densify_curr_data, 
-                                                      config['mapping']['sil_thres'], time_idx,
-                                                      config['mean_sq_dist_method'])
+                with profiling.span('densify'):
+                    params, variables = add_new_gaussians(config, params, variables, densify_curr_data, 
+                                                          config['mapping']['sil_thres'], time_idx,
+                                                          config['mean_sq_dist_method'])
                 post_num_pts = params['means3D'].shape[0]
                 if config['use_wandb']:
                     wandb_run.log({"Mapping/Number of Gaussians": post_num_pts,
@@ -825,10 +838,12 @@ def rgbd_slam(config: dict):
 
             # Mapping
             mapping_start_time = time.time()
+            mapping_span = profiling.begin('map')
             if num_iters_mapping > 0:
                 progress_bar = tqdm(range(num_iters_mapping), desc=f"Mapping Time Step: {time_idx}")
             for iter in range(num_iters_mapping):
                 iter_start_time = time.time()
+                iter_span = profiling.begin('map iter')
                 # Randomly select a frame until current time step amongst keyframes
                 rand_idx = np.random.randint(0, len(selected_keyframes))
                 selected_rand_keyframe_idx = selected_keyframes[rand_idx]
@@ -883,12 +898,14 @@ def rgbd_slam(config: dict):
                         progress_bar.update(1)
                 # Update the runtime numbers
                 iter_end_time = time.time()
+                profiling.end('map iter', iter_span)
                 mapping_iter_time_sum += iter_end_time - iter_start_time
                 mapping_iter_time_count += 1
             if num_iters_mapping > 0:
                 progress_bar.close()
             # Update the runtime numbers
             mapping_end_time = time.time()
+            profiling.end('map', mapping_span)
             mapping_frame_time_sum += mapping_end_time - mapping_start_time
             mapping_frame_time_count += 1
 
@@ -925,6 +942,7 @@ def rgbd_slam(config: dict):
                 # Add to keyframe list
                 keyframe_list.append(curr_keyframe)
                 keyframe_time_indices.append(time_idx)
+                profiling.count('keyframes')
         
         # Checkpoint every iteration
         if time_idx % config["checkpoint_interval"] == 0 and config['save_checkpoints']:
@@ -961,14 +979,14 @@ def rgbd_slam(config: dict):
                        "Final Stats/step": 1})
     
     # Evaluate Final Parameters
-    with torch.no_grad():
+    with torch.no_grad(), profiling.span('eval'):
         if config['use_wandb']:
-            eval(config, dataset, params, num_frames, eval_dir, sil_thres=config['mapping']['sil_thres'],
+            eval_metrics = eval(config, dataset, params, num_frames, eval_dir, sil_thres=config['mapping']['sil_thres'],
                  wandb_run=wandb_run, wandb_save_qual=config['wandb']['eval_save_qual'],
                  mapping_iters=config['mapping']['num_iters'], add_new_gaussians=config['mapping']['add_new_gaussians'],
                  eval_every=config['eval_every'])
         else:
-            eval(config, dataset, params, num_frames, eval_dir, sil_thres=config['mapping']['sil_thres'],
+            eval_metrics = eval(config, dataset, params, num_frames, eval_dir, sil_thres=config['mapping']['sil_thres'],
                  mapping_iters=config['mapping']['num_iters'], add_new_gaussians=config['mapping']['add_new_gaussians'],
                  eval_every=config['eval_every'])
 
@@ -987,6 +1005,22 @@ def rgbd_slam(config: dict):
     # Save Parameters
     save_params(params, output_dir)
 
+    # Structured record of the run, poses as camera-to-world
+    with torch.no_grad():
+        est_w2c = torch.eye(4).cuda().float().repeat(num_frames, 1, 1)
+        est_w2c[:, :3, :3] = build_rotation(F.normalize(params['cam_unnorm_rots'][0].T.detach()))
+        est_w2c[:, :3, 3] = params['cam_trans'][0].T.detach()
+    gt_w2c = params['gt_w2c_all_frames']
+    valid = np.isfinite(gt_w2c).all((1, 2))
+    gt_c2w = np.linalg.inv(np.where(valid[:, None, None], gt_w2c, np.eye(4)))
+    est_c2w = np.linalg.inv(est_w2c.cpu().numpy())
+    results.record_run('splatam', config['data']['sequence'], config, gt_c2w, est_c2w, valid,
+                       downsample=config['frame_downsample'], variant='seed%i' % config['seed'], metrics=eval_metrics,
+                       timings={'wall': time.time() - start_time, 'frames': num_frames,
+                                'tracking_iter': tracking_iter_time_avg, 'tracking_frame': tracking_frame_time_avg,
+                                'mapping_iter': mapping_iter_time_avg, 'mapping_frame': mapping_frame_time_avg},
+                       config=config, output_dir=output_dir, db=config.get('results_db'))
+
     # Close WandB Run
     if config['use_wandb']:
         wandb.finish()
@@ -1007,14 +1041,27 @@ if __name__ == "__main__":
                         help='')
     parser.add_argument('--perturb_dynamic', type=int, default=0,
                         help='')
+    parser.add_argument('--packed_dir', type=str, default=None,
+                        help='frames packed by slam_perturbation.packed')
+    parser.add_argument('--perturb_cache', type=str, default=None,
+                        help='perturbed frames written by slam_perturbation.materialize')
+    parser.add_argument('--perturb_seed', type=int, default=0,
+                        help='seed of the materialized frames')
     parser.add_argument('--perturb_traj', type=int, default=0,
                         help='')
     parser.add_argument('--frame_downsample', type=int, default=1,
                         help='')
     parser.add_argument('--seed', type=int, default=0,
                         help='')
+    parser.add_argument('--results_db', type=str, default=None,
+                        help='results store the run record is appended to, see slam_perturbation.results')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='folder for the span trace and summary of the run, see slam_perturbation.profiling')
+    parser.add_argument('--profile_torch', type=str, default=None,
+                        help='frames start:end to record with the torch profiler, needs --profile')
 
     args = parser.parse_args()
+    profiling.configure(args.profile, torch_window=args.profile_torch)
 
     experiment = SourceFileLoader(
         os.path.basename(args.experiment), args.experiment
@@ -1031,9 +1078,15 @@ if __name__ == "__main__":
     experiment.config['perturb_type']=args.perturb_type
     experiment.config['perturb_severity']=args.perturb_severity
     experiment.config['perturb_dynamic']=args.perturb_dynamic
+    experiment.config['perturb_cache']=args.perturb_cache
+    experiment.config['perturb_seed']=args.perturb_seed
+    experiment.config['packed_dir']=args.packed_dir
     experiment.config['frame_downsample']=args.frame_downsample
+    experiment.config['results_db']=args.results_db
     if args.perturb_traj == 0:
         experiment.config['run_name'] = f"{args.scene_name}_{args.perturb_type}_{args.perturb_severity}_{args.perturb_dynamic}_{args.frame_downsample}_{args.seed}"
+        if args.perturb_seed != 0:
+            experiment.config['run_name'] += f"_pseed_{args.perturb_seed}"
     elif args.perturb_traj == 2:
         experiment.config['run_name'] =  args.input_folder.split(os.sep)[-1]
         experiment.config['wandb']['group'] = 'Replica_s_p_traj'
@@ -1048,6 +1101,7 @@ if __name__ == "__main__":
     results_dir = os.path.join(
         experiment.config["workdir"], experiment.config["run_name"]
     )
+    experiment.config['perturb_schedule'] = os.path.join(results_dir, 'perturb_schedule.npz')
     if not experiment.config['load_checkpoint']:
         os.makedirs(results_dir, exist_ok=True)
         shutil.copy(args.experiment, os.path.join(results_dir, "config.py"))
@@ -9,6 +9,7 @@ import matplotlib.pyplot as plt
 from datasets.gradslam_datasets.geometryutils import relative_transformation
 from utils.recon_helpers import setup_camera
 from utils.slam_external import build_rotation,calc_psnr
+from slam_perturbation import trajectory
 from utils.slam_helpers import transform_to_frame, transformed_params2rendervar, transformed_params2depthplussilhouette
 
 from diff_gaussian_rasterization import GaussianRasterizer as Renderer
@@ -31,27 +32,8 @@ def align(model, data):
 
     """
     np.set_printoptions(precision=3, suppress=True)
-    model_zerocentered = model - model.mean(1).reshape((3,-1))
-    data_zerocentered = data - data.mean(1).reshape((3,-1))
-
-    W = np.zeros((3, 3))
-    for column in range(model.shape[1]):
-        W += np.outer(model_zerocentered[:,
-                         column], data_zerocentered[:, column])
-    U, d, Vh = np.linalg.linalg.svd(W.transpose())
-    S = np.matrix(np.identity(3))
-    if (np.linalg.det(U) * np.linalg.det(Vh) < 0):
-        S[2, 2] = -1
-    rot = U*S*Vh
-    trans = data.mean(1).reshape((3,-1)) - rot * model.mean(1).reshape((3,-1))
-
-    model_aligned = rot * model + trans
-    alignment_error = model_aligned - data
-
-    trans_error = np.sqrt(np.sum(np.multiply(
-        alignment_error, alignment_error), 0)).A[0]
-
-    return rot, trans, trans_error
+    rot, trans, trans_error, _ = trajectory.align(model, data)
+    return np.matrix(rot), np.matrix(trans), trans_error
 
 
 def evaluate_ate(gt_traj, est_traj):
@@ -752,6 +734,9 @@ def eval(config, dataset, final_params, num_frames, eval_dir, sil_thres,
         wandb_run.log({"Eval/Metrics": fig})
     plt.close()
 
+    return {"ate_rmse": float(ate_rmse), "psnr": float(avg_psnr), "depth_rmse": float(avg_rmse),
+            "depth_l1": float(avg_l1), "ms_ssim": float(avg_ssim), "lpips": float(avg_lpips)}
+
 
 def eval_nvs(dataset, final_params, num_frames, eval_dir, sil_thres, 
          mapping_iters, add_new_gaussians, wandb_run=None, wandb_save_qual=False, eval_every=1, save_frames=False):
@@ -8,6 +8,7 @@ from tqdm import tqdm
 
 from utils.recon_helpers import setup_camera
 from utils.slam_external import build_rotation,calc_psnr
+from slam_perturbation import trajectory
 
 from diff_gaussian_rasterization import GaussianRasterizer as Renderer
 
@@ -45,27 +46,8 @@ def align(model, data):
 
     """
     np.set_printoptions(precision=3, suppress=True)
-    model_zerocentered = model - model.mean(1).reshape((3,-1))
-    data_zerocentered = data - data.mean(1).reshape((3,-1))
-
-    W = np.zeros((3, 3))
-    for column in range(model.shape[1]):
-        W += np.outer(model_zerocentered[:,
-                         column], data_zerocentered[:, column])
-    U, d, Vh = np.linalg.linalg.svd(W.transpose())
-    S = np.matrix(np.identity(3))
-    if (np.linalg.det(U) * np.linalg.det(Vh) < 0):
-        S[2, 2] = -1
-    rot = U*S*Vh
-    trans = data.mean(1).reshape((3,-1)) - rot * model.mean(1).reshape((3,-1))
-
-    model_aligned = rot * model + trans
-    alignment_error = model_aligned - data
-
-    trans_error = np.sqrt(np.sum(np.multiply(
-        alignment_error, alignment_error), 0)).A[0]
-
-    return rot, trans, trans_error
+    rot, trans, trans_error, _ = trajectory.align(model, data)
+    return np.matrix(rot), np.matrix(trans), trans_error
 
 
 def evaluate_ate(gt_traj, est_traj):
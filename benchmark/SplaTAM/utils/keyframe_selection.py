@@ -6,6 +6,8 @@ the current frame to the keyframes.
 import torch
 import numpy as np
 
+from slam_perturbation.keyframes import overlap_fractions, select_overlapping
+
 
 def get_pointcloud(config, depth, intrinsics, w2c, sampled_indices):
     CX = intrinsics[0][2]
@@ -61,36 +63,15 @@ def keyframe_selection_overlap(config, gt_depth, w2c, intrinsics, keyframe_list,
         # Back Project the selected pixels to 3D Pointcloud
         pts = get_pointcloud(config, gt_depth, intrinsics, w2c, sampled_indices)
 
-        list_keyframe = []
-        for keyframeid, keyframe in enumerate(keyframe_list):
-            # Get the estimated world2cam of the keyframe
-            est_w2c = keyframe['est_w2c']
-            # Transform the 3D pointcloud to the keyframe's camera space
-            pts4 = torch.cat([pts, torch.ones_like(pts[:, :1])], dim=1)
-            transformed_pts = (est_w2c @ pts4.T).T[:, :3]
-            # Project the 3D pointcloud to the keyframe's image space
-            points_2d = torch.matmul(intrinsics, transformed_pts.transpose(0, 1))
-            points_2d = points_2d.transpose(0, 1)
-            points_z = points_2d[:, 2:] + 1e-5
-            points_2d = points_2d / points_z
-            projected_pts = points_2d[:, :2]
-            # Filter out the points that are outside the image
-            edge = 20
-            mask = (projected_pts[:, 0] < width-edge)*(projected_pts[:, 0] > edge) * \
-                (projected_pts[:, 1] < height-edge)*(projected_pts[:, 1] > edge)
-            mask = mask & (points_z[:, 0] > 0)
-            # Compute the percentage of points that are inside the image
-            percent_inside = mask.sum()/projected_pts.shape[0]
-            list_keyframe.append(
-                {'id': keyframeid, 'percent_inside': percent_inside})
-
-        # Sort the keyframes based on the percentage of points that are inside the image
-        list_keyframe = sorted(
-            list_keyframe, key=lambda i: i['percent_inside'], reverse=True)
+        if len(keyframe_list) == 0:
+            return []
+
+        # Project the 3D pointcloud into the image space of all the keyframes at once
+        # and compute the percentage of points that are inside each image
+        est_w2c = torch.stack([keyframe['est_w2c'] for keyframe in keyframe_list])
+        percent_inside = overlap_fractions(pts, est_w2c, intrinsics, height, width)
+
         # Select the keyframes with percentage of points inside the image > 0
-        selected_keyframe_list = [keyframe_dict['id']
-                                  for keyframe_dict in list_keyframe if keyframe_dict['percent_inside'] > 0.0]
-        selected_keyframe_list = list(np.random.permutation(
-            np.array(selected_keyframe_list))[:k])
+        selected_keyframe_list = select_overlapping(percent_inside, k)
 
         return selected_keyframe_list
@@ -3,35 +3,36 @@ import csv
 import os
 import json
 
+perturb_mapping = {
+    0: "brightness",
+    1: "contrast",
+    2: "spatter",
+    3: "zoomBlur",
+    4: "motionBlur",
+    5: "defocusBlur",
+    6: "gaussianNoise",
+    7: "shotNoise",
+    8: "impulseNoise",
+    9: "speckleNoise",
+    10: "gaussianBlur",
+    11: "glassBlur",
+    12: "fog",
+    13: "frost",
+    14: "snow",
+    15: "jpegCompression",
+    16: "pixelate",
+    17: "noPerturb",
+    18: "gaussianNoiseStrong",
+    19: "removeImage"
+}
+severity_mapping = {1: "low", 3: "mid", 5: "high", 0: "no"}
+dynamic_mapping = {0: "staticPerturbation", 1: "dynamicPerturbation"}
+
+
 def main(root_folder, csv_file_path):
     # Initialize a list to store the results
     results = []
 
-    perturb_mapping = {
-        0: "brightness",
-        1: "contrast",
-        2: "spatter",
-        3: "zoomBlur",
-        4: "motionBlur",
-        5: "defocusBlur",
-        6: "gaussianNoise",
-        7: "shotNoise",
-        8: "impulseNoise",
-        9: "speckleNoise",
-        10: "gaussianBlur",
-        11: "glassBlur",
-        12: "fog",
-        13: "frost",
-        14: "snow",
-        15: "jpegCompression",
-        16: "pixelate",
-        17: "noPerturb",
-        18: "gaussianNoiseStrong",
-        19: "removeImage"
-    }
-    severity_mapping = {1: "low", 3: "mid", 5: "high", 0: "no"}
-    dynamic_mapping = {0: "staticPerturbation", 1: "dynamicPerturbation"}
-
     # Iterate over subfolders in the root folder
     for foldername in os.listdir(root_folder):
         subfolder_path = os.path.join(root_folder, foldername)
@@ -50,6 +51,11 @@ def main(root_folder, csv_file_path):
                         data = file.read()
                     error_mean = float(data.split(' ')[5][:-1])
                     perturb_config = subsubfoldername.split('_')
+                    # runs with a perturb_seed other than 0 end in _pseed_<seed>
+                    pseed = ""
+                    if len(perturb_config) > 2 and perturb_config[-2] == 'pseed':
+                        pseed = "_pseed" + perturb_config[-1]
+                        perturb_config = perturb_config[:-2]
                     print("perturb_config", perturb_config)
                     # Append the results to the list
                     if len(perturb_config) <= 4:
@@ -57,12 +63,12 @@ def main(root_folder, csv_file_path):
                         results.append(
                             (subfolder_path.split(os.sep)[-1],
                              perturb_mapping[int(perturb_config[1])] + "_" + severity_mapping[int(perturb_config[2])] + "_" +
-                             dynamic_mapping[int(perturb_config[3])], error_mean))
+                             dynamic_mapping[int(perturb_config[3])] + pseed, error_mean))
                     elif len(perturb_config) == 5:
                         results.append(
                             (subfolder_path.split(os.sep)[-1],
                              perturb_mapping[int(perturb_config[1])] + "_" + severity_mapping[int(perturb_config[2])] + "_" +
-                             dynamic_mapping[int(perturb_config[3])] + str(perturb_config[4]), error_mean))
+                             dynamic_mapping[int(perturb_config[3])] + str(perturb_config[4]) + pseed, error_mean))
 
     # Sort the results based on the subsubfolder name
     results.sort(key=lambda x: (x[0], x[1]))  # Sorting by scene first, then by perturbation_type_severity
@@ -75,11 +81,38 @@ def main(root_folder, csv_file_path):
 
     print("Results saved to", csv_file_path)
 
+
+def main_db(db, csv_file_path, system=None):
+    # Same table from the results store (slam_perturbation.results) in one query, no folder crawl
+    from slam_perturbation.results import ResultStore
+    filters = {} if system is None else {'system': system}
+    with ResultStore(db) as store:
+        runs = store.query(['scene', 'perturb_type', 'severity', 'dynamic', 'downsample', 'ate_mean'],
+                           order_by=['scene', 'perturb_type', 'severity', 'dynamic'], status='ok', **filters)
+    results = []
+    for scene, perturb_type, severity, dynamic, downsample, ate_mean in zip(*runs.values()):
+        name = perturb_mapping.get(perturb_type, str(perturb_type)) + "_" + severity_mapping.get(severity, str(severity)) + "_" + \
+            dynamic_mapping[dynamic] + (str(downsample) if downsample != 1 else "")
+        results.append((scene, name, ate_mean))
+    results.sort(key=lambda x: (x[0], x[1]))
+
+    with open(csv_file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['scene', 'perturbation_type_severity', 'ATE Mean'])
+        writer.writerows(results)
+
+    print("Results saved to", csv_file_path)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Process replica output and save to CSV.')
     parser.add_argument('--root_folder', default='../coslam_output/Replica/', help='The root folder path')
     parser.add_argument('--csv_file_path', default='./replica_output.csv', help='The path to the output CSV file')
+    parser.add_argument('--db', default=None, help='results store of the runs, read instead of the output.txt files')
+    parser.add_argument('--system', default=None, help='only the runs of this system in the results store')
 
     args = parser.parse_args()
-    main(args.root_folder, args.csv_file_path)
+    if args.db is not None:
+        main_db(args.db, args.csv_file_path, args.system)
+    else:
+        main(args.root_folder, args.csv_file_path)
 
@@ -1,3 +1,5 @@
+import os
+import time
 import argparse
 import random
 
@@ -6,6 +8,7 @@ import torch
 
 from src import config
 from src.NICE_SLAM import NICE_SLAM
+from slam_perturbation import profiling, results
 
 
 def setup_seed(seed):
@@ -40,11 +43,24 @@ def main():
                         help='')
     parser.add_argument('--perturb_dynamic', type=int, default=0,
                         help='')
+    parser.add_argument('--packed_dir', type=str, default=None,
+                        help='frames packed by slam_perturbation.packed')
+    parser.add_argument('--perturb_cache', type=str, default=None,
+                        help='perturbed frames written by slam_perturbation.materialize')
+    parser.add_argument('--perturb_seed', type=int, default=0,
+                        help='seed of the materialized frames')
     parser.add_argument('--frame_downsample', type=int, default=1,
                         help='')
+    parser.add_argument('--results_db', type=str, default=None,
+                        help='results store the run record is appended to, see slam_perturbation.results')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='folder for the span traces and summaries of the run, one per process, see slam_perturbation.profiling')
+    parser.add_argument('--profile_torch', type=str, default=None,
+                        help='frames start:end the tracker and mappers record with the torch profiler, needs --profile')
 
     parser.set_defaults(nice=True)
     args = parser.parse_args()
+    profiling.configure(args.profile, torch_window=args.profile_torch)
     
     if args.sanity == 0: 
         cfg = config.load_config(
@@ -64,16 +80,35 @@ def main():
     cfg['robustness']['perturb_type'] = args.perturb_type
     cfg['robustness']['perturb_severity'] = args.perturb_severity
     cfg['robustness']['perturb_dynamic'] = args.perturb_dynamic
+    cfg['robustness']['perturb_cache'] = args.perturb_cache
+    cfg['robustness']['perturb_seed'] = args.perturb_seed
+    cfg['data']['packed_dir'] = args.packed_dir
     cfg['robustness']['trainskip']=args.frame_downsample
     if args.output is not None:
         cfg['data']['output'] = args.output
     else:
         cfg['data']['output'] = cfg['data']['output'] + "_" + str(args.perturb_type) + "_" +str(args.perturb_severity) + "_" +str(args.perturb_dynamic)+"_"+str(args.frame_downsample)
+        if args.perturb_seed != 0:
+            cfg['data']['output'] = cfg['data']['output'] + "_pseed_" + str(args.perturb_seed)
+    cfg['robustness']['perturb_schedule'] = os.path.join(cfg['data']['output'], 'perturb_schedule.npz')
     print(cfg)
+    start_time = time.time()
     slam = NICE_SLAM(cfg, args)
 
     slam.run()
 
+    # structured record of the run, the poses are the ones eval_ate reads from the last checkpoint
+    N = int(slam.idx[0]) + 1
+    gt = slam.gt_c2w_list[:N].clone().numpy()
+    est = slam.estimate_c2w_list[:N].clone().numpy()
+    gt[:, :3, 3] /= cfg['scale']
+    est[:, :3, 3] /= cfg['scale']
+    with profiling.span('eval'):
+        results.record_run('nice-slam', os.path.basename(os.path.normpath(cfg['data']['input_folder'])), cfg['robustness'],
+                           gt, est, valid=np.isfinite(gt).all((1, 2)), downsample=args.frame_downsample,
+                           variant='' if args.nice else 'imap', timings={'wall': time.time() - start_time, 'frames': N},
+                           config=cfg, output_dir=slam.output, db=args.results_db)
+
 
 if __name__ == '__main__':
     main()
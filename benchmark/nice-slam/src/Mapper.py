@@ -11,6 +11,8 @@ from src.common import (get_camera_from_tensor, get_samples,
                         get_tensor_from_camera, random_select)
 from src.utils.datasets import get_dataset
 from src.utils.Visualizer import Visualizer
+from slam_perturbation import profiling
+from slam_perturbation.keyframes import overlap_fractions, select_overlapping
 
 
 class Mapper(object):
@@ -197,42 +199,17 @@ class Mapper(object):
         z_vals = near * (1.-t_vals) + far * (t_vals)
         pts = rays_o[..., None, :] + rays_d[..., None, :] * \
             z_vals[..., :, None]  # [N_rays, N_samples, 3]
-        vertices = pts.reshape(-1, 3).cpu().numpy()
-
-        list_keyframe = []
-        for keyframeid, keyframe in enumerate(keyframe_dict):
-
-            # project the 3d points to each key frame to calculate the
-            #  percent_inside ratio for keyframe selection
-            c2w = keyframe['est_c2w'].cpu().numpy()
-            w2c = np.linalg.inv(c2w)
-            ones = np.ones_like(vertices[:, 0]).reshape(-1, 1)
-            homo_vertices = np.concatenate(
-                [vertices, ones], axis=1).reshape(-1, 4, 1)  # (N, 4)
-            cam_cord_homo = w2c@homo_vertices  # (N, 4, 1)=(4,4)*(N, 4, 1)
-            cam_cord = cam_cord_homo[:, :3]  # (N, 3, 1)
-            K = np.array([[fx, .0, cx], [.0, fy, cy],
-                         [.0, .0, 1.0]]).reshape(3, 3)
-            cam_cord[:, 0] *= -1
-            uv = K@cam_cord
-            z = uv[:, -1:]+1e-5
-            uv = uv[:, :2]/z
-            uv = uv.astype(np.float32)
-            edge = 20
-            mask = (uv[:, 0] < W-edge)*(uv[:, 0] > edge) * \
-                (uv[:, 1] < H-edge)*(uv[:, 1] > edge)
-            mask = mask & (z[:, :, 0] < 0)
-            mask = mask.reshape(-1)
-            percent_inside = mask.sum()/uv.shape[0]
-            list_keyframe.append(
-                {'id': keyframeid, 'percent_inside': percent_inside})
-
-        list_keyframe = sorted(
-            list_keyframe, key=lambda i: i['percent_inside'], reverse=True)
-        selected_keyframe_list = [dic['id']
-                                  for dic in list_keyframe if dic['percent_inside'] > 0.00]
-        selected_keyframe_list = list(np.random.permutation(
-            np.array(selected_keyframe_list))[:k])
+        vertices = pts.reshape(-1, 3)
+
+        if len(keyframe_dict) == 0:
+            return []
+
+        # project the 3d points to all the key frames at once to calculate
+        #  the percent_inside ratio for keyframe selection
+        w2c = torch.linalg.inv(torch.stack([keyframe['est_c2w'] for keyframe in keyframe_dict]).to(vertices))
+        K = [[fx, .0, cx], [.0, fy, cy], [.0, .0, 1.0]]
+        percent_inside = overlap_fractions(vertices, w2c, K, H, W, opengl=True)
+        selected_keyframe_list = select_overlapping(percent_inside, k)
         return selected_keyframe_list
 
     def optimize_map(self, num_joint_iters, lr_factor, idx, cur_gt_color, cur_gt_depth, gt_cur_c2w, keyframe_dict, keyframe_list, cur_c2w):
@@ -400,7 +377,7 @@ class Mapper(object):
             from torch.optim.lr_scheduler import StepLR
             scheduler = StepLR(optimizer, step_size=200, gamma=0.8)
 
-        for joint_iter in range(num_joint_iters):
+        for joint_iter in profiling.iterations(range(num_joint_iters), 'map iter'):
             if self.nice:
                 if self.frustum_feature_selection:
                     for key, val in c.items():
@@ -581,7 +558,9 @@ class Mapper(object):
                 print(prefix+"Mapping Frame ", idx.item())
                 print(Style.RESET_ALL)
 
-            _, gt_color, gt_depth, gt_c2w = self.frame_reader[idx]
+            profiling.frame(int(idx))
+            with profiling.span('data load'):
+                _, gt_color, gt_depth, gt_c2w = self.frame_reader[idx]
 
             if not init:
                 lr_factor = cfg['mapping']['lr_factor']
@@ -614,8 +593,10 @@ class Mapper(object):
                 self.BA = (len(self.keyframe_list) > 4) and cfg['mapping']['BA'] and (
                     not self.coarse_mapper)
 
-                _ = self.optimize_map(num_joint_iters, lr_factor, idx, gt_color, gt_depth,
-                                      gt_c2w, self.keyframe_dict, self.keyframe_list, cur_c2w=cur_c2w)
+                # BA optimizes the keyframe poses together with the map
+                with profiling.span('BA' if self.BA else 'map'):
+                    _ = self.optimize_map(num_joint_iters, lr_factor, idx, gt_color, gt_depth,
+                                          gt_c2w, self.keyframe_dict, self.keyframe_list, cur_c2w=cur_c2w)
                 if self.BA:
                     cur_c2w = _
                     self.estimate_c2w_list[idx] = cur_c2w
@@ -625,6 +606,7 @@ class Mapper(object):
                     if (idx % self.keyframe_every == 0 or (idx == self.n_img-2)) \
                             and (idx not in self.keyframe_list):
                         self.keyframe_list.append(idx)
+                        profiling.count('keyframes')
                         self.keyframe_dict.append({'gt_c2w': gt_c2w.cpu(), 'idx': idx, 'color': gt_color.cpu(
                         ), 'depth': gt_depth.cpu(), 'est_c2w': cur_c2w.clone()})
 
@@ -647,22 +629,25 @@ class Mapper(object):
 
                 if (idx % self.mesh_freq == 0) and (not (idx == 0 and self.no_mesh_on_first_frame)):
                     mesh_out_file = f'{self.output}/mesh/{idx:05d}_mesh.ply'
-                    self.mesher.get_mesh(mesh_out_file, self.c, self.decoders, self.keyframe_dict, self.estimate_c2w_list,
-                                         idx,  self.device, show_forecast=self.mesh_coarse_level,
-                                         clean_mesh=self.clean_mesh, get_mask_use_all_frames=False)
+                    with profiling.span('mesh'):
+                        self.mesher.get_mesh(mesh_out_file, self.c, self.decoders, self.keyframe_dict, self.estimate_c2w_list,
+                                             idx,  self.device, show_forecast=self.mesh_coarse_level,
+                                             clean_mesh=self.clean_mesh, get_mask_use_all_frames=False)
 
                 if idx == self.n_img-1:
                     mesh_out_file = f'{self.output}/mesh/final_mesh.ply'
-                    self.mesher.get_mesh(mesh_out_file, self.c, self.decoders, self.keyframe_dict, self.estimate_c2w_list,
-                                         idx,  self.device, show_forecast=self.mesh_coarse_level,
-                                         clean_mesh=self.clean_mesh, get_mask_use_all_frames=False)
+                    with profiling.span('mesh'):
+                        self.mesher.get_mesh(mesh_out_file, self.c, self.decoders, self.keyframe_dict, self.estimate_c2w_list,
+                                             idx,  self.device, show_forecast=self.mesh_coarse_level,
+                                             clean_mesh=self.clean_mesh, get_mask_use_all_frames=False)
                     os.system(
                         f"cp {mesh_out_file} {self.output}/mesh/{idx:05d}_mesh.ply")
                     if self.eval_rec:
                         mesh_out_file = f'{self.output}/mesh/final_mesh_eval_rec.ply'
-                        self.mesher.get_mesh(mesh_out_file, self.c, self.decoders, self.keyframe_dict,
-                                             self.estimate_c2w_list, idx, self.device, show_forecast=False,
-                                             clean_mesh=self.clean_mesh, get_mask_use_all_frames=True)
+                        with profiling.span('mesh'):
+                            self.mesher.get_mesh(mesh_out_file, self.c, self.decoders, self.keyframe_dict,
+                                                 self.estimate_c2w_list, idx, self.device, show_forecast=False,
+                                                 clean_mesh=self.clean_mesh, get_mask_use_all_frames=True)
                     break
 
             if idx == self.n_img-1:
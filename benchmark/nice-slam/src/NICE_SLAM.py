@@ -293,12 +293,12 @@ class NICE_SLAM():
         processes = []
         for rank in range(3):
             if rank == 0:
-                p = mp.Process(target=self.tracking, args=(rank, ))
+                p = mp.Process(target=self.tracking, args=(rank, ), name='tracker')
             elif rank == 1:
-                p = mp.Process(target=self.mapping, args=(rank, ))
+                p = mp.Process(target=self.mapping, args=(rank, ), name='mapper')
             elif rank == 2:
                 if self.coarse:
-                    p = mp.Process(target=self.coarse_mapping, args=(rank, ))
+                    p = mp.Process(target=self.coarse_mapping, args=(rank, ), name='coarse_mapper')
                 else:
                     continue
             p.start()
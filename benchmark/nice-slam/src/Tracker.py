@@ -13,6 +13,7 @@ from src.common import (get_camera_from_tensor, get_samples,
                         get_tensor_from_camera)
 from src.utils.datasets import get_dataset
 from src.utils.Visualizer import Visualizer
+from slam_perturbation import profiling
 
 
 class Tracker(object):
@@ -149,11 +150,12 @@ class Tracker(object):
         else:
             pbar = tqdm(self.frame_loader)
 
-        for idx, gt_color, gt_depth, gt_c2w in pbar:
+        for idx, gt_color, gt_depth, gt_c2w in profiling.iterate(pbar):
             if not self.verbose:
                 pbar.set_description(f"Tracking Frame {idx[0]}")
 
             idx = idx[0]
+            profiling.frame(int(idx))
             gt_depth = gt_depth[0]
             gt_color = gt_color[0]
             gt_c2w = gt_c2w[0]
@@ -181,6 +183,7 @@ class Tracker(object):
                 print("Tracking Frame ",  idx.item())
                 print(Style.RESET_ALL)
 
+            track_start = profiling.begin('track')
             if idx == 0 or self.gt_camera:
                 c2w = gt_c2w
                 if not self.no_vis_on_first_frame:
@@ -222,7 +225,7 @@ class Tracker(object):
                     gt_camera_tensor.to(device)-camera_tensor).mean().item()
                 candidate_cam_tensor = None
                 current_min_loss = 10000000000.
-                for cam_iter in range(self.num_cam_iters):
+                for cam_iter in profiling.iterations(range(self.num_cam_iters), 'track iter'):
                     if self.seperate_LR:
                         camera_tensor = torch.cat([quad, T], 0).to(self.device)
 
@@ -250,6 +253,7 @@ class Tracker(object):
                 c2w = get_camera_from_tensor(
                     candidate_cam_tensor.clone().detach())
                 c2w = torch.cat([c2w, bottom], dim=0)
+            profiling.end('track', track_start)
             self.estimate_c2w_list[idx] = c2w.clone().cpu()
             self.gt_c2w_list[idx] = gt_c2w.clone().cpu()
             pre_c2w = c2w.clone()
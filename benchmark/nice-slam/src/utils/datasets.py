@@ -7,10 +7,9 @@ import torch
 import torch.nn.functional as F
 from src.common import as_intrinsics_matrix
 from torch.utils.data import Dataset
-from .robustness import brightness,contrast,spatter,zoom_blur,motion_blur,defocus_blur,gaussian_noise,shot_noise,impulse_noise,speckle_noise,gaussian_blur,glass_blur,fog,frost,snow,jpeg_compression,pixelate,gaussian_noise_strong
-from .robustness_depth import depth_add_random_mask, depth_add_fixed_mask, depth_add_edge_erosion, depth_add_gaussian_noise, depth_range
+from slam_perturbation import FramePerturbation
+from slam_perturbation.packed import PackedSequence
 from PIL import Image
-import random
 
 
 def readEXR_onlydepth(filename):
@@ -75,14 +74,14 @@ class BaseDataset(Dataset):
 
         self.crop_edge = cfg['cam']['crop_edge']
 
-        self.perturb_type = 17
-        self.perturb_severity=0
-        self.perturb_dynamic = 0
+        self.packed = PackedSequence.from_config(cfg['data'])
+        self._packed_rows = {}
+        self.perturbation = FramePerturbation.from_config(cfg.get('robustness'))
+        self.perturb_type = self.perturbation.perturb_type
+        self.perturb_severity = self.perturbation.severity
+        self.perturb_dynamic = self.perturbation.dynamic
         self.trainskip = 1
         if 'robustness' in cfg.keys():
-            self.perturb_type = cfg['robustness']['perturb_type']
-            self.perturb_severity = cfg['robustness']['perturb_severity']
-            self.perturb_dynamic = cfg['robustness']['perturb_dynamic']
             print("#############################################################")
             print("self.perturb_type",self.perturb_type)
             print("self.perturb_severity",self.perturb_severity)
@@ -95,41 +94,44 @@ class BaseDataset(Dataset):
     def __len__(self):
         return self.n_img
 
+    def packed_rows(self, kind):
+        '''
+        Row of the packed store holding each frame of color_paths (kind 'rgb') or
+        depth_paths ('depth'). The store holds every frame of the folder, the loaders
+        may keep a subset (stride, max_frames, timestamp association).
+        '''
+        if kind not in self._packed_rows:
+            paths, files = ((self.color_paths, self.packed.rgb_files) if kind == 'rgb'
+                            else (self.depth_paths, self.packed.depth_files))
+            row = {name: i for i, name in enumerate(files)}
+            missing = [path for path in paths if os.path.basename(path) not in row]
+            if missing:
+                raise ValueError('{} is not in the packed store {}'.format(missing[0], self.packed.root))
+            self._packed_rows[kind] = [row[os.path.basename(path)] for path in paths]
+        return self._packed_rows[kind]
+
     def __getitem__(self, index):
-        color_path = self.color_paths[index * self.trainskip]
-
-        if self.perturb_type == 18:
-            if self.perturb_dynamic > 0:
-                # If dynamic perturbation is enabled, select a random delay within a range
-                min_delay = self.perturb_severity - self.perturb_dynamic
-                max_delay = self.perturb_severity + self.perturb_dynamic
-                # Make sure the min_delay is not negative
-                min_delay = max(0, min_delay)
-                delay = random.randint(min_delay, max_delay)
-            else:
-                # Static delay
-                delay = self.perturb_severity
+        depth_index = self.perturbation.depth_index(index, self.n_img)
 
-            depth_index = max(0, min(index - delay, self.n_img - 1))  # Ensure depth_index is within valid range
+        if self.packed is not None:
+            # zero-copy views, RGB already
+            color_data = self.packed.rgb[self.packed_rows('rgb')[index * self.trainskip]]
+            depth_data = self.packed.depth[self.packed_rows('depth')[depth_index * self.trainskip]]
         else:
-            depth_index = index
-
-        depth_path = self.depth_paths[depth_index * self.trainskip]  # Apply offset to depth index
-        #depth_path = self.depth_paths[index*self.trainskip]
-
-        color_data = cv2.imread(color_path)
-        if '.png' in depth_path:
-            depth_data = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
-        elif '.exr' in depth_path:
-            depth_data = readEXR_onlydepth(depth_path)
+            color_path = self.color_paths[index * self.trainskip]
+            depth_path = self.depth_paths[depth_index * self.trainskip]  # Apply offset to depth index
+            #depth_path = self.depth_paths[index*self.trainskip]
+
+            color_data = cv2.cvtColor(cv2.imread(color_path), cv2.COLOR_BGR2RGB)
+            if '.png' in depth_path:
+                depth_data = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
+            elif '.exr' in depth_path:
+                depth_data = readEXR_onlydepth(depth_path)
         if self.distortion is not None:
             K = as_intrinsics_matrix([self.fx, self.fy, self.cx, self.cy])
             # undistortion is only applied on color image, not depth!
             color_data = cv2.undistort(color_data, K, self.distortion)
 
-        
-        color_data = cv2.cvtColor(color_data, cv2.COLOR_BGR2RGB)
-
         # robustness evaluation
         color_data = Image.fromarray(color_data)
         #print("self.perturb_type",self.perturb_type)
@@ -137,74 +139,16 @@ class BaseDataset(Dataset):
         #print("self.perturb_type",type(self.perturb_type))
         #print("self.perturb_severity",type(self.perturb_severity))
 
-        if self.perturb_dynamic > 0:
-            print("dynamic perturbation")
-            rnd_severity = random.choice([0, 1, 2, 3, 4, 5])
-            if rnd_severity > 0:
-                perturb_type = self.perturb_type
-                perturb_severity = rnd_severity
-            else:
-                perturb_type = 17 # no perturbation
-                perturb_severity = self.perturb_severity
-            print("dyn_perturb: "+ str(perturb_type) + "_" + str(perturb_severity))
-        else:
-            perturb_type = self.perturb_type
-            perturb_severity = self.perturb_severity
-
-        if perturb_type == 0:
-            color_data = brightness(color_data,perturb_severity)
-        elif perturb_type == 1:
-            color_data = contrast(color_data,perturb_severity)
-        elif perturb_type == 2:
-            color_data = spatter(color_data,perturb_severity)
-        elif perturb_type == 3:
-            color_data = zoom_blur(color_data,perturb_severity)
-        elif perturb_type == 4:
-            color_data = motion_blur(color_data,perturb_severity)
-        elif perturb_type == 5:
-            color_data = defocus_blur(color_data,perturb_severity)
-        elif perturb_type == 6:
-            color_data = gaussian_noise(color_data,perturb_severity)
-        elif perturb_type == 7:
-            color_data = shot_noise(color_data,perturb_severity)
-        elif perturb_type == 8:
-            color_data = impulse_noise(color_data,perturb_severity)
-        elif perturb_type == 9:
-            color_data = speckle_noise(color_data,perturb_severity)
-        elif perturb_type == 10:
-            color_data = gaussian_blur(color_data,perturb_severity)
-        elif perturb_type == 11:
-            color_data = glass_blur(color_data,perturb_severity)
-        elif perturb_type == 12:
-            color_data = fog(color_data,perturb_severity)
-        elif perturb_type == 13:
-            color_data = frost(color_data,perturb_severity)
-        elif perturb_type == 14:
-            color_data = snow(color_data,perturb_severity)
-        elif perturb_type == 15:
-            color_data = jpeg_compression(color_data,perturb_severity)
-        elif perturb_type == 16:
-            color_data = pixelate(color_data,perturb_severity)
-        elif perturb_type == 17:
-            pass
-        elif perturb_type == 20:
-            depth_data = depth_add_gaussian_noise(depth_data, perturb_severity)
-        elif perturb_type == 21:
-            depth_data = depth_add_edge_erosion(depth_data, perturb_severity)
-        elif perturb_type == 22:
-            depth_data = depth_add_random_mask(depth_data, perturb_severity)
-        elif perturb_type == 23:
-            depth_data = depth_add_fixed_mask(depth_data, perturb_severity)
-        elif perturb_type >= 25:
-            pass
+        perturb_type, perturb_severity, perturb_seed = self.perturbation.sample(index, self.n_img)
+        color_data = self.perturbation.apply(color_data, 'rgb', perturb_type, perturb_severity, perturb_seed)
+        depth_data = self.perturbation.apply(depth_data, 'depth', perturb_type, perturb_severity, perturb_seed)
 
         color_data = np.array(color_data)
         color_data = color_data[:, :, ::-1]
 
         color_data = color_data / 255.
         depth_data = depth_data.astype(np.float32) / self.png_depth_scale
-        if perturb_type == 24:
-            depth_data = depth_range(depth_data,perturb_severity)
+        depth_data = self.perturbation.apply(depth_data, 'metric_depth', perturb_type, perturb_severity, perturb_seed)
         H, W = depth_data.shape
 
         color_data = cv2.resize(color_data, (W, H))
@@ -235,10 +179,13 @@ class Replica(BaseDataset):
     def __init__(self, cfg, args, scale, device='cuda:0'
                  ):
         super(Replica, self).__init__(cfg, args, scale, device)
-        self.color_paths = sorted(
-            glob.glob(f'{self.input_folder}/results/frame*.jpg'))
-        self.depth_paths = sorted(
-            glob.glob(f'{self.input_folder}/results/depth*.png'))
+        if self.packed is not None:
+            self.color_paths, self.depth_paths = self.packed.rgb_files, self.packed.depth_files
+        else:
+            self.color_paths = sorted(
+                glob.glob(f'{self.input_folder}/results/frame*.jpg'))
+            self.depth_paths = sorted(
+                glob.glob(f'{self.input_folder}/results/depth*.png'))
         #self.n_img = len(self.color_paths)
         self.frame_ids = range(0, len(self.color_paths), self.trainskip)
         self.n_img = len(self.frame_ids)
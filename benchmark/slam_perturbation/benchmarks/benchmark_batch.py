@@ -0,0 +1,53 @@
+import time
+import argparse
+import numpy as np
+import torch
+
+import slam_perturbation as sp
+from slam_perturbation.batch import perturb_batch
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the per-frame numpy perturbations against the batched torch backend")
+    parser.add_argument("--height",    help = "random frame height",   type = int, default = 340)
+    parser.add_argument("--width",     help = "random frame width",    type = int, default = 600)
+    parser.add_argument("--batch",     help = "frames per batch",      type = int, default = 8)
+    parser.add_argument("--severity",  help = "severity level",        type = int, default = 3)
+    parser.add_argument("--repeat",    help = "timed runs per method", type = int, default = 3)
+    parser.add_argument("--device",    help = "torch device", nargs = '?', default = "cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--seed",      help = "seed for the frames", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    # smooth frames, so blurs and edges behave like on real images
+    rgb = np.stack([sp.image.cv2.resize(rng.randint(0, 256, size=(args.height // 8, args.width // 8, 3)).astype(np.uint8),
+                                        (args.width, args.height)) for _ in range(args.batch)])
+    depth = np.stack([sp.image.cv2.resize(rng.randint(500, 20000, size=(args.height // 8, args.width // 8)).astype(np.uint16),
+                                          (args.width, args.height)) for _ in range(args.batch)])
+    metric = depth.astype(np.float32) / 6553.5
+
+    # the random methods draw from different generators, so compare output statistics, not pixels
+    print("batch %i x %ix%i, severity %i, device %s" % (args.batch, args.width, args.height, args.severity, args.device))
+    print("%-26s %12s %12s %9s %11s %11s" % ("perturbation", "numpy [s]", "torch [s]", "speedup", "numpy mean", "torch mean"))
+    for p in sp.PERTURBATIONS:
+        if p.id is None or p.stage in (sp.SYNC, sp.CLEAN):
+            continue
+        frames = {sp.RGB: rgb, sp.DEPTH: depth, sp.METRIC_DEPTH: metric}[p.stage]
+        batch = torch.from_numpy(frames.astype(np.float32)).to(args.device)
+
+        out_np, t_np = time_call(lambda: [p(frame, args.severity) for frame in frames], args.repeat)
+        out_t, t_t = time_call(lambda: perturb_batch(batch, p.name, args.severity, seed=args.seed), args.repeat)
+        mean_np = np.mean([np.asarray(o, dtype=np.float64).mean() for o in out_np])
+        mean_t = out_t.double().mean().item()
+        print("%-26s %12.4f %12.4f %8.1fx %11.2f %11.2f" % (p.name, t_np, t_t, t_np / t_t, mean_np, mean_t))
@@ -0,0 +1,81 @@
+import time
+import argparse
+import numpy as np
+import cv2
+
+from slam_perturbation import depth, params
+
+
+def edge_erosion_loop(x, severity=1):
+    # the former per-patch depth_add_edge_erosion, kept here as the reference
+    c = params.DEPTH_EDGE_EROSION[severity - 1]
+    scaled_x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    edges = cv2.Canny(scaled_x, 20, 50)
+    edge_indices = np.column_stack(np.where(edges > 0))
+    np.random.shuffle(edge_indices)
+    erosion_edge_indices = edge_indices[:int(len(edge_indices) * c.rate)]
+    erosion_mask = edges.astype(bool)
+    for pixel in erosion_edge_indices:
+        x_range = slice(max(pixel[0] - c.patch_len, 0), min(pixel[0] + c.patch_len + 1, edges.shape[0]))
+        y_range = slice(max(pixel[1] - c.patch_len, 0), min(pixel[1] + c.patch_len + 1, edges.shape[1]))
+        erosion_mask[x_range, y_range] = True
+    noisy_image = np.copy(x)
+    noisy_image[erosion_mask] = 0
+    return noisy_image
+
+
+def random_mask_loop(x, severity=1):
+    # the former depth_add_random_mask, whose overlap test never rejected a rectangle
+    c = params.DEPTH_RANDOM_MASK[severity - 1]
+    patch_w = int(x.shape[0] * c.scale)
+    patch_h = int(x.shape[1] * c.scale)
+    mask = np.zeros_like(x, dtype=bool)
+    for _ in range(c.count):
+        x1, y1 = np.random.randint(0, x.shape[0] - patch_w), np.random.randint(0, x.shape[1] - patch_h)
+        mask[x1:x1 + patch_w, y1:y1 + patch_h] = True
+    noisy_image = np.copy(x)
+    noisy_image[mask] = 0
+    return noisy_image
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the vectorized depth edge erosion / random mask against the loops")
+    parser.add_argument("--height",    help = "depth map height",            type = int, default = 680)
+    parser.add_argument("--width",     help = "depth map width",             type = int, default = 1200)
+    parser.add_argument("--repeat",    help = "timed runs per method",       type = int, default = 5)
+    parser.add_argument("--seeds",     help = "seeds checked per severity",  type = int, default = 20)
+    args = parser.parse_args()
+
+    # piecewise smooth depth with plenty of Canny edges
+    rng = np.random.RandomState(0)
+    coarse = rng.randint(500, 20000, size=(args.height // 20, args.width // 20)).astype(np.uint16)
+    frame = cv2.resize(coarse, (args.width, args.height), interpolation=cv2.INTER_NEAREST)
+
+    methods = [('depth_add_edge_erosion', edge_erosion_loop, depth.depth_add_edge_erosion),
+               ('depth_add_random_mask', random_mask_loop, depth.depth_add_random_mask)]
+    print("depth %ix%i, %i seeds per severity" % (args.width, args.height, args.seeds))
+    print("%-24s %-9s %12s %12s %9s %12s %12s" % ("method", "severity", "loop [s]", "vector [s]", "speedup", "mismatches", "masked [%]"))
+    for name, loop, vector in methods:
+        for severity in range(1, 6):
+            def seeded(fn, seed):
+                np.random.seed(seed)
+                return fn(frame, severity)
+            _, t_loop = time_call(lambda: seeded(loop, 0), args.repeat)
+            _, t_vec = time_call(lambda: seeded(vector, 0), args.repeat)
+
+            # same seed, same draws: the masks must agree pixel for pixel
+            mismatches, masked = 0, []
+            for seed in range(args.seeds):
+                ref, out = seeded(loop, seed), seeded(vector, seed)
+                mismatches += int(np.count_nonzero(ref != out))
+                masked.append(np.mean(out == 0) * 100)
+            print("%-24s %-9i %12.4f %12.4f %8.1fx %12i %12.2f" % (name, severity, t_loop, t_vec, t_loop / t_vec, mismatches, np.mean(masked)))
@@ -0,0 +1,60 @@
+import time
+import argparse
+import numpy as np
+
+from slam_perturbation import image
+
+
+def shuffle_pixels_loop(x, max_delta, iterations, height, width):
+    # the original per-pixel glass_blur loop, kept here as the reference
+    x = x.copy()
+    for i in range(iterations):
+        for h in range(height - max_delta, max_delta, -1):
+            for w in range(width - max_delta, max_delta, -1):
+                dx, dy = np.random.randint(-max_delta, max_delta, size=(2,))
+                h_prime, w_prime = h + dy, w + dx
+                # swap
+                x[h, w], x[h_prime, w_prime] = x[h_prime, w_prime], x[h, w]
+    return x
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the vectorized glass_blur shuffle against the per-pixel loop")
+    parser.add_argument("--height",    help = "frame height",               type = int, default = 680)
+    parser.add_argument("--width",     help = "frame width",                type = int, default = 1200)
+    parser.add_argument("--repeat",    help = "timed runs per method",      type = int, default = 3)
+    parser.add_argument("--seed",      help = "seed shared by both methods", type = int, default = 0)
+    parser.add_argument("--skip_loop", help = "only time the vectorized path", action = "store_true")
+    args = parser.parse_args()
+
+    frame = np.random.RandomState(args.seed).randint(0, 256, size=(args.height, args.width, 3)).astype(np.uint8)
+    # (sigma, max_delta, iterations) as in glass_blur
+    levels = [(0.7, 1, 2), (0.9, 2, 1), (1, 2, 3), (1.1, 3, 2), (1.5, 4, 2)]
+
+    print("frame %ix%i" % (args.width, args.height))
+    print("%-9s %12s %12s %9s %9s" % ("severity", "loop [s]", "vector [s]", "speedup", "max diff"))
+    for severity, (_, max_delta, iterations) in enumerate(levels, start=1):
+        def run_vector():
+            np.random.seed(args.seed)
+            return image.shuffle_pixels(frame, max_delta, iterations)
+        out_vec, t_vec = time_call(run_vector, args.repeat)
+
+        if args.skip_loop:
+            print("%-9i %12s %12.4f %9s %9s" % (severity, "-", t_vec, "-", "-"))
+            continue
+
+        def run_loop():
+            np.random.seed(args.seed)
+            return shuffle_pixels_loop(frame, max_delta, iterations, args.height, args.width)
+        out_loop, t_loop = time_call(run_loop, 1)
+        diff = np.abs(out_loop.astype(np.int16) - out_vec.astype(np.int16)).max()
+        print("%-9i %12.4f %12.4f %8.1fx %9i" % (severity, t_loop, t_vec, t_loop / t_vec, diff))
@@ -0,0 +1,53 @@
+import time
+import argparse
+import numpy as np
+
+from slam_perturbation import image
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the opencv motion blur kernel against the wand/ImageMagick backend")
+    parser.add_argument("--image",     help = "RGB frame to blur (random frame if empty)", nargs = '?', default = "")
+    parser.add_argument("--height",    help = "random frame height",   type = int, default = 680)
+    parser.add_argument("--width",     help = "random frame width",    type = int, default = 1200)
+    parser.add_argument("--repeat",    help = "timed runs per method", type = int, default = 5)
+    parser.add_argument("--seed",      help = "seed for frame and angles", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    if args.image == "":
+        frame = rng.randint(0, 256, size=(args.height, args.width, 3)).astype(np.uint8)
+    else:
+        frame = image.cv2.cvtColor(image.cv2.imread(args.image), image.cv2.COLOR_BGR2RGB)
+
+    try:
+        image.wand_motion_image()
+        has_wand = True
+    except (ImportError, OSError) as e:
+        print("wand backend unavailable (%s), timing opencv only" % e)
+        has_wand = False
+
+    # (radius, sigma) of motion_blur and snow
+    levels = [(10, 3), (15, 5), (15, 8), (15, 12), (20, 15), (10, 4), (12, 4), (12, 8), (12, 12)]
+    print("frame %ix%i" % (frame.shape[1], frame.shape[0]))
+    print("%-8s %-7s %8s %12s %12s %9s %10s %9s" % ("radius", "sigma", "angle", "wand [s]", "opencv [s]", "speedup", "mean diff", "max diff"))
+    for radius, sigma in levels:
+        # snap to the kernel grid so both backends see the same angle
+        angle = round(rng.uniform(-135, 45) / image.MOTION_BLUR_ANGLE_STEP) * image.MOTION_BLUR_ANGLE_STEP
+        out_cv, t_cv = time_call(lambda: image.apply_motion_blur(frame, radius, sigma, angle, backend='opencv'), args.repeat)
+        if not has_wand:
+            print("%-8i %-7i %8.2f %12s %12.4f %9s %10s %9s" % (radius, sigma, angle, "-", t_cv, "-", "-", "-"))
+            continue
+
+        out_wand, t_wand = time_call(lambda: image.apply_motion_blur(frame, radius, sigma, angle, backend='wand'), args.repeat)
+        diff = np.abs(out_wand.astype(np.int16) - out_cv.astype(np.int16))
+        print("%-8i %-7i %8.2f %12.4f %12.4f %8.1fx %10.3f %9i" % (radius, sigma, angle, t_wand, t_cv, t_wand / t_cv, diff.mean(), diff.max()))
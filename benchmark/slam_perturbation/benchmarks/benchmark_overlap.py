@@ -0,0 +1,76 @@
+import time
+import argparse
+import numpy as np
+import torch
+
+from slam_perturbation.keyframes import overlap_fractions
+
+
+def overlap_loop(pts, c2w_list, K, H, W, edge=20):
+    # the former per-keyframe selection of Co-SLAM / nice-slam, kept here as the reference
+    fractions = []
+    for c2w in c2w_list:
+        w2c = np.linalg.inv(c2w)
+        ones = np.ones_like(pts[:, 0]).reshape(-1, 1)
+        homo = np.concatenate([pts, ones], axis=1).reshape(-1, 4, 1)
+        cam_cord = (w2c @ homo)[:, :3]
+        cam_cord[:, 0] *= -1
+        uv = K @ cam_cord
+        z = uv[:, -1:] + 1e-5
+        uv = (uv[:, :2] / z).astype(np.float32)
+        mask = (uv[:, 0] < W - edge) * (uv[:, 0] > edge) * (uv[:, 1] < H - edge) * (uv[:, 1] > edge)
+        mask = (mask & (z[:, :, 0] < 0)).reshape(-1)
+        fractions.append(mask.sum() / uv.shape[0])
+    return np.array(fractions)
+
+
+def random_poses(rng, num):
+    # cameras around the origin looking at it, OpenGL convention (looking down -z)
+    poses = np.zeros((num, 4, 4), dtype=np.float32)
+    for i in range(num):
+        eye = rng.uniform(-2, 2, 3) + np.array([0, 0, 3])
+        back = eye / np.linalg.norm(eye)
+        right = np.cross([0, 1, 0], back)
+        right /= np.linalg.norm(right)
+        up = np.cross(back, right)
+        poses[i, :3, :3] = np.stack([right, up, back], axis=1)
+        poses[i, :3, 3] = eye
+        poses[i, 3, 3] = 1
+    return poses
+
+
+def time_call(fn, repeat, sync):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        sync()
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the batched overlap keyframe selection against the per-keyframe loop")
+    parser.add_argument("--keyframes", help = "keyframe counts",              type = int, nargs = '+', default = [100, 500, 2000])
+    parser.add_argument("--points",    help = "sampled points (pixels x 16)", type = int, default = 1600)
+    parser.add_argument("--device",    help = "torch device",                 default = "cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--repeat",    help = "timed runs per method",        type = int, default = 3)
+    args = parser.parse_args()
+
+    H, W = 680, 1200
+    K = np.array([[600., 0, 599.5], [0, 600., 339.5], [0, 0, 1]])
+    sync = torch.cuda.synchronize if args.device.startswith('cuda') else (lambda: None)
+    rng = np.random.RandomState(0)
+    pts = rng.uniform(-1, 1, (args.points, 3)).astype(np.float32)
+
+    for num in args.keyframes:
+        poses = random_poses(rng, num)
+        ref, t_loop = time_call(lambda: overlap_loop(pts, poses, K, H, W), args.repeat, lambda: None)
+
+        pts_t = torch.from_numpy(pts).to(args.device)
+        poses_t = torch.from_numpy(poses).to(args.device)
+        out, t_batch = time_call(lambda: overlap_fractions(pts_t, torch.linalg.inv(poses_t), K, H, W, opengl=True),
+                                 args.repeat, sync)
+        diff = np.abs(out.cpu().numpy() - ref).max()
+        print("%5i keyframes: loop %8.2f ms, batched (%s) %7.2f ms, x%.0f, max fraction diff %.4f"
+              % (num, t_loop * 1e3, args.device, t_batch * 1e3, t_loop / t_batch, diff))
@@ -0,0 +1,56 @@
+import time
+import shutil
+import argparse
+import tempfile
+
+from slam_perturbation import profiling
+
+
+def loop(n):
+    # the instrumentation of a tracking loop, around no work
+    for i in profiling.iterate(range(n)):
+        profiling.frame(i)
+        with profiling.span('track'):
+            for _ in profiling.iterations(range(10), 'track iter'):
+                pass
+        profiling.count('keyframes')
+
+
+def bare(n):
+    for i in range(n):
+        for _ in range(10):
+            pass
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the profiling instrumentation of a frame loop, off and on")
+    parser.add_argument("--frames",   help = "frames of the loop",     type = int, default = 100000)
+    parser.add_argument("--repeat",   help = "timed runs per setting", type = int, default = 5)
+    args = parser.parse_args()
+
+    spans = args.frames * 12
+    t_bare = time_call(lambda: bare(args.frames), args.repeat)
+    t_off = time_call(lambda: loop(args.frames), args.repeat)
+    print("off: %.1f ns per span over the bare loop" % ((t_off - t_bare) / spans * 1e9))
+
+    out_dir = tempfile.mkdtemp()
+    try:
+        profiler = profiling.configure(out_dir)
+        # max_events would drop the trace of the later runs
+        t_on = time_call(lambda: (profiler.reset(), loop(args.frames)), args.repeat)
+        print("on:  %.2f us per span over the bare loop" % ((t_on - t_bare) / spans * 1e6))
+        start = time.perf_counter()
+        profiler.save()
+        print("save of %i spans: %.2f s" % (len(profiler.event_starts), time.perf_counter() - start))
+        print(profiling.format_summary(profiler.summary()))
+    finally:
+        shutil.rmtree(out_dir)
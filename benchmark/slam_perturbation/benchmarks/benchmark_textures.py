@@ -0,0 +1,55 @@
+import time
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image as PILImage
+
+from slam_perturbation import image
+
+
+def per_frame(fn, frame, severity, frames):
+    start = time.perf_counter()
+    outs = [fn(frame, severity) for _ in range(frames)]
+    return outs, (time.perf_counter() - start) / frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-frame cost of fog/frost with and without the texture banks")
+    parser.add_argument("--height",   help = "frame height",                 type = int, default = 680)
+    parser.add_argument("--width",    help = "frame width",                  type = int, default = 1200)
+    parser.add_argument("--frames",   help = "frames per measurement",       type = int, default = 20)
+    parser.add_argument("--severity", help = "severity [1,5]",               type = int, default = 3)
+    parser.add_argument("--seed",     help = "seed for frame and sampling", type = int, default = 0)
+    args = parser.parse_args()
+
+    # build into a scratch directory so the first-call cost is measured
+    image.TEXTURE_CACHE_DIR = tempfile.mkdtemp(prefix="perturb_textures_")
+    rng = np.random.RandomState(args.seed)
+    frame = PILImage.fromarray(rng.randint(0, 256, size=(args.height, args.width, 3)).astype(np.uint8))
+    bank_size = image.TEXTURE_BANK_SIZE
+
+    print("frame %ix%i, severity %i, bank size %i, cache %s" %
+          (args.width, args.height, args.severity, bank_size, image.TEXTURE_CACHE_DIR))
+    print("%-7s %-8s %12s %14s %10s %10s" % ("method", "mode", "build [s]", "per frame [s]", "mean", "std"))
+    for name, fn in [('fog', image.fog), ('frost', image.frost)]:
+        image.TEXTURE_BANK_SIZE = 0
+        np.random.seed(args.seed)
+        if name == 'fog':
+            outs, t_fresh = per_frame(fn, frame, args.severity, args.frames)
+            outs = np.stack(outs)
+            print("%-7s %-8s %12s %14.4f %10.3f %10.3f" % (name, "fresh", "-", t_fresh, outs.mean(), outs.std()))
+        else:
+            # frost always goes through the bank; the old path decoded and resized per frame
+            start = time.perf_counter()
+            for _ in range(args.frames):
+                image.cv2.resize(image.cv2.imread(image.FROST_FILES[np.random.randint(5)]), (args.width, args.height))
+            print("%-7s %-8s %12s %14.4f %10s %10s" % (name, "decode", "-", (time.perf_counter() - start) / args.frames, "-", "-"))
+
+        image.TEXTURE_BANK_SIZE = bank_size
+        np.random.seed(args.seed)
+        start = time.perf_counter()
+        fn(frame, args.severity)
+        t_build = time.perf_counter() - start
+        outs, t_bank = per_frame(fn, frame, args.severity, args.frames)
+        outs = np.stack(outs)
+        print("%-7s %-8s %12.4f %14.4f %10.3f %10.3f" % (name, "bank", t_build, t_bank, outs.mean(), outs.std()))
@@ -0,0 +1,122 @@
+import time
+import argparse
+import numpy
+import numpy as np
+
+from slam_perturbation import trajectory
+
+
+def associate_reference(first_list, second_list, offset=0.0, max_difference=0.02):
+    # the former associate() of the evaluation scripts, kept here as the reference
+    first_keys = list(first_list.keys())
+    second_keys = list(second_list.keys())
+    potential_matches = [(abs(a - (b + offset)), a, b)
+                         for a in first_keys
+                         for b in second_keys
+                         if abs(a - (b + offset)) < max_difference]
+    potential_matches.sort()
+    matches = []
+    for diff, a, b in potential_matches:
+        if a in first_keys and b in second_keys:
+            first_keys.remove(a)
+            second_keys.remove(b)
+            matches.append((a, b))
+
+    matches.sort()
+    return matches
+
+
+def align_reference(model, data, with_scale=False):
+    # the former align() of the evaluation scripts (ORB_SLAM3 evaluate_ate_scale for the scale)
+    model_zerocentered = model - model.mean(1)
+    data_zerocentered = data - data.mean(1)
+
+    W = numpy.zeros((3, 3))
+    for column in range(model.shape[1]):
+        W += numpy.outer(model_zerocentered[:, column], data_zerocentered[:, column])
+    U, d, Vh = numpy.linalg.svd(W.transpose())
+    S = numpy.matrix(numpy.identity(3))
+    if numpy.linalg.det(U) * numpy.linalg.det(Vh) < 0:
+        S[2, 2] = -1
+    rot = U * S * Vh
+
+    s = 1.0
+    if with_scale:
+        rotmodel = rot * model_zerocentered
+        dots = 0.0
+        norms = 0.0
+        for column in range(data_zerocentered.shape[1]):
+            dots += numpy.dot(data_zerocentered[:, column].transpose(), rotmodel[:, column])
+            normi = numpy.linalg.norm(model_zerocentered[:, column])
+            norms += normi * normi
+        s = (dots / norms).item()
+
+    trans = data.mean(1) - s * rot * model.mean(1)
+    alignment_error = s * rot * model + trans - data
+    trans_error = numpy.sqrt(numpy.sum(numpy.multiply(alignment_error, alignment_error), 0)).A[0]
+    return rot, trans, trans_error, s
+
+
+def random_trajectory(rng, n):
+    # smooth walk with a random rigid transform and scale between estimate and ground truth
+    gt = np.cumsum(rng.normal(0, 0.01, (n, 3)), 0)
+    angle = rng.uniform(0, np.pi)
+    rot = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+    est = rng.uniform(0.5, 2) * gt @ rot.T + rng.normal(0, 1, 3) + rng.normal(0, 0.005, (n, 3))
+    return gt, est
+
+
+def random_stamps(rng, n, rate):
+    # jittered sensor stamps with a few drops, as in TUM sequences
+    stamps = 1305031102.0 + np.arange(n) / rate + rng.normal(0, 0.002, n)
+    return stamps[rng.uniform(size=n) > 0.02]
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the shared trajectory metrics against the former evaluation code and time both")
+    parser.add_argument("--lengths",      help = "trajectory lengths",               type = int, nargs = '+', default = [500, 2000, 5000])
+    parser.add_argument("--trajectories", help = "trajectories in the batched ATE",  type = int, default = 200)
+    parser.add_argument("--repeat",       help = "timed runs per method",            type = int, default = 3)
+    parser.add_argument("--seed",         help = "random seed",                      type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    for n in args.lengths:
+        first = dict((s, None) for s in random_stamps(rng, n, 30.0))
+        second = dict((s, None) for s in random_stamps(rng, n, 30.0) + 0.01)
+        ref, t_ref = time_call(lambda: associate_reference(first, second, -0.01, 0.02), 1)
+        out, t_new = time_call(lambda: trajectory.associate(first, second, -0.01, 0.02), args.repeat)
+        assert out == ref, "associate differs from the reference"
+        print("associate %5i stamps: reference %9.2f ms, sorted %7.2f ms, x%.0f, %i matches, identical"
+              % (n, t_ref * 1e3, t_new * 1e3, t_ref / t_new, len(out)))
+
+        gt, est = random_trajectory(rng, n)
+        for with_scale in (False, True):
+            ref, t_ref = time_call(lambda: align_reference(numpy.matrix(est.T), numpy.matrix(gt.T), with_scale), args.repeat)
+            out, t_new = time_call(lambda: trajectory.align(est.T, gt.T, with_scale), args.repeat)
+            diff = max(np.abs(np.asarray(ref[0]) - out[0]).max(), np.abs(np.asarray(ref[1]) - out[1]).max(),
+                       np.abs(ref[2] - out[2]).max(), abs(ref[3] - out[3]))
+            assert diff < 1e-9, "align differs from the reference"
+            print("align %s %5i points: reference %7.2f ms, vectorized %5.2f ms, x%.0f, max diff %.1e"
+                  % ('Sim3' if with_scale else 'SE3 ', n, t_ref * 1e3, t_new * 1e3, t_ref / t_new, diff))
+
+    n = args.lengths[0]
+    pairs = [random_trajectory(rng, n) for _ in range(args.trajectories)]
+    gts = np.stack([gt for gt, _ in pairs])
+    ests = np.stack([est for _, est in pairs])
+    ref, t_ref = time_call(lambda: [align_reference(numpy.matrix(est.T), numpy.matrix(gt.T))[2] for gt, est in pairs], args.repeat)
+    out, t_new = time_call(lambda: trajectory.ate(gts, ests), args.repeat)
+    rmse_ref = np.array([np.sqrt(np.dot(e, e) / len(e)) for e in ref])
+    diff = np.abs(out["absolute_translational_error.rmse"] - rmse_ref).max()
+    assert diff < 1e-9, "batched ATE differs from the reference"
+    print("ATE of %i trajectories x %i: reference loop %7.2f ms, batched %5.2f ms, x%.0f, max rmse diff %.1e"
+          % (args.trajectories, n, t_ref * 1e3, t_new * 1e3, t_ref / t_new, diff))
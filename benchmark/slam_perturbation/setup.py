@@ -0,0 +1,24 @@
+from setuptools import setup, find_packages
+
+setup(
+    name='slam_perturbation',
+    version='0.1.0',
+    description='Image and depth perturbations for benchmarking SLAM robustness',
+    packages=find_packages(exclude=['benchmarks']),
+    package_data={'slam_perturbation': ['frost/*']},
+    python_requires='>=3.7',
+    # opencv is not listed: the SLAM environments ship either opencv-python or
+    # opencv-contrib-python, and installing the other one next to it breaks cv2
+    install_requires=[
+        'numpy',
+        'Pillow',
+        'scikit-image>=0.19',
+        'scipy',
+    ],
+    extras_require={
+        # ImageMagick motion blur backend, needs libmagickwand
+        'wand': ['Wand'],
+        # yaml sweep files
+        'sweep': ['PyYAML'],
+    },
+)
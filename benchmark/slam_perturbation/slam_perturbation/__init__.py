@@ -0,0 +1,17 @@
+"""
+Image and depth perturbations shared by the SLAM robustness benchmarks.
+
+    import slam_perturbation as sp
+    out = sp.perturb(frame, 'fog', 3)        # or sp.perturb(frame, 12, 3)
+    sp.get('fog').params(3)                  # FogParams(intensity=2.5, wibbledecay=1.7)
+
+Dataset loaders use FramePerturbation, see loader.py; materialize.py fills the
+PerturbationCache they can read perturbed frames from.
+"""
+
+from .registry import (Perturbation, PERTURBATIONS, STAGES, RGB, DEPTH, METRIC_DEPTH, SYNC, CLEAN,
+                       CLEAN_ID, SENSOR_MISALIGNMENT_ID, find, get, names, perturb)
+from .cache import PerturbationCache
+from .loader import FramePerturbation
+
+__version__ = '0.1.0'
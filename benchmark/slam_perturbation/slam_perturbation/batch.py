@@ -0,0 +1,466 @@
+"""
+Batched torch implementation of the perturbations.
+
+perturb_batch() corrupts a [B, H, W, C] batch of RGB frames (uint8, or float
+in [0, 255]) or a [B, H, W] batch of depth maps in one call, with a severity
+and an optional seed per sample, on whatever device the batch lives on. All
+arithmetic is float32, so on CPU tensors this is also the vectorized float32
+path that avoids the float64 upcasts of image.py.
+
+Results follow image.py / depth.py up to interpolation details and the
+random number generator. The OpenCV / PIL parts of spatter (water),
+depth_add_edge_erosion(_orb) and jpeg_compression still run per frame on the CPU.
+"""
+
+from io import BytesIO
+
+import numpy as np
+import cv2
+import torch
+import torch.nn.functional as F
+from PIL import Image as PILImage
+
+from . import image, registry
+
+
+class _Random:
+    """Random draws for the samples of a group, from per-sample generators when seeded."""
+
+    def __init__(self, n, device, generators=None):
+        self.n = n
+        self.device = device
+        self.generators = generators
+
+    def _draw(self, fn, shape, **kwargs):
+        if self.generators is None:
+            return fn((self.n,) + tuple(shape), device=self.device, **kwargs)
+        return torch.stack([fn(tuple(shape), device=self.device, generator=g, **kwargs) for g in self.generators])
+
+    def rand(self, *shape):
+        return self._draw(torch.rand, shape)
+
+    def randn(self, *shape):
+        return self._draw(torch.randn, shape)
+
+    def uniform(self, low, high, *shape):
+        return low + (high - low) * self.rand(*shape)
+
+    def randint(self, low, high, *shape):
+        if self.generators is None:
+            return torch.randint(low, high, (self.n,) + tuple(shape), device=self.device)
+        return torch.stack([torch.randint(low, high, tuple(shape), device=self.device, generator=g)
+                            for g in self.generators])
+
+    def poisson(self, rates):
+        if self.generators is None:
+            return torch.poisson(rates)
+        return torch.stack([torch.poisson(r, generator=g) for r, g in zip(rates, self.generators)])
+
+    def randperm(self, n):
+        if self.generators is None:
+            return [torch.randperm(n, device=self.device) for _ in range(self.n)]
+        return [torch.randperm(n, device=self.device, generator=g) for g in self.generators]
+
+    def subset(self, idx):
+        generators = None if self.generators is None else [self.generators[i] for i in idx]
+        return _Random(len(idx), self.device, generators)
+
+
+# /////////////// Helpers ///////////////
+
+def nchw(x):
+    return x.permute(0, 3, 1, 2)
+
+
+def nhwc(x):
+    return x.permute(0, 2, 3, 1)
+
+
+def depthwise(x, kernel, padding_mode):
+    """Correlate every channel of NCHW x with kernel [k, k] or per-sample kernels [N, k, k]."""
+    N, C, H, W = x.shape
+    if kernel.dim() == 2:
+        kernel = kernel.expand(N, -1, -1)
+    kh, kw = kernel.shape[-2:]
+    x = F.pad(x, (kw // 2, kw // 2, kh // 2, kh // 2), mode=padding_mode)
+    weight = kernel.repeat_interleave(C, dim=0)[:, None]
+    out = F.conv2d(x.reshape(1, N * C, x.shape[2], x.shape[3]), weight, groups=N * C)
+    return out.reshape(N, C, H, W)
+
+
+def gaussian(x, sigma, truncate=4.0):
+    """skimage.filters.gaussian (mode 'nearest') over the last two dims of NCHW x."""
+    radius = int(truncate * sigma + 0.5)
+    taps = torch.arange(-radius, radius + 1, dtype=torch.float32, device=x.device)
+    taps = torch.exp(-0.5 * (taps / sigma) ** 2)
+    taps /= taps.sum()
+    x = depthwise(x, taps[None, :], 'replicate')
+    return depthwise(x, taps[:, None], 'replicate')
+
+
+def rgb2hsv(x):
+    r, g, b = x.unbind(-1)
+    v, _ = x.max(-1)
+    delta = v - x.min(-1)[0]
+    s = torch.where(v > 0, delta / v.clamp_min(1e-12), torch.zeros_like(v))
+    safe = delta.clamp_min(1e-12)
+    h = torch.where(v == r, (g - b) / safe, torch.where(v == g, 2. + (b - r) / safe, 4. + (r - g) / safe))
+    h = torch.where(delta > 0, (h / 6.) % 1., torch.zeros_like(h))
+    return torch.stack([h, s, v], -1)
+
+
+def hsv2rgb(x):
+    h, s, v = x.unbind(-1)
+    i = torch.floor(h * 6.)
+    f = h * 6. - i
+    i = i.long() % 6
+    p, q, t = v * (1 - s), v * (1 - f * s), v * (1 - (1 - f) * s)
+    choices = [(v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q)]
+    out = torch.zeros_like(x)
+    for k, (r, g, b) in enumerate(choices):
+        out = torch.where((i == k)[..., None], torch.stack([r, g, b], -1), out)
+    return out
+
+
+def clipped_zoom(x, zoom_factor):
+    """image.clipped_zoom for NCHW x: zoom the centred h x h crop, bilinear like scipy's order=1."""
+    h = x.shape[2]
+    ch = int(np.ceil(h / zoom_factor))
+    top = (h - ch) // 2
+    size = int(round(ch * zoom_factor))
+    x = F.interpolate(x[:, :, top:top + ch, top:top + ch], size=(size, size), mode='bilinear', align_corners=True)
+    trim_top = (size - h) // 2
+    return x[:, :, trim_top:trim_top + h, trim_top:trim_top + h]
+
+
+def resize(x, h, w):
+    return F.interpolate(x, size=(h, w), mode='bilinear', align_corners=False)
+
+
+def motion_blur_uint8(x, radius, sigma, angles):
+    """apply_motion_blur for NCHW x holding uint8 values, one angle per sample."""
+    kernels = torch.stack([torch.from_numpy(np.array(image.motion_blur_kernel(
+        float(radius), float(sigma), round(float(a) / image.MOTION_BLUR_ANGLE_STEP) * image.MOTION_BLUR_ANGLE_STEP)))
+        for a in angles]).to(x.device)
+    return torch.round(depthwise(x, kernels, 'replicate')).clamp(0, 255)
+
+
+def shuffle_pixels(x, max_delta, iterations, rnd):
+    """image.shuffle_pixels for NHWC x with per-sample offsets."""
+    N, H, W, C = x.shape
+    device = x.device
+    hs = torch.arange(H - max_delta, max_delta, -1, device=device)
+    ws = torch.arange(W - max_delta, max_delta, -1, device=device)
+    if hs.numel() == 0 or ws.numel() == 0:
+        return x
+
+    flat = x.reshape(N, H * W, C)
+    dst = (hs[:, None] * W + ws[None, :]).reshape(-1)
+    # position of every pixel in the walk, -1 for pixels the walk never visits
+    order = torch.full((H * W,), -1, dtype=torch.long, device=device)
+    order[dst] = torch.arange(dst.numel(), device=device)
+    for _ in range(iterations):
+        d = rnd.randint(-max_delta, max_delta, hs.numel(), ws.numel(), 2)
+        src = ((hs[None, :, None] + d[..., 1]) * W + (ws[None, None, :] + d[..., 0])).reshape(N, -1)
+        ptr = torch.arange(H * W, device=device).repeat(N, 1)
+        ptr[:, dst] = src
+        # sources overwritten earlier in the walk pass on their own source
+        linked = torch.zeros(N, H * W, dtype=torch.bool, device=device)
+        linked[:, dst] = (order[src] >= 0) & (order[src] < order[dst])
+        while linked.any():
+            ptr, linked = torch.where(linked, ptr.gather(1, ptr), ptr), linked & linked.gather(1, ptr)
+        flat = flat.gather(1, ptr[..., None].expand(-1, -1, C))
+
+    return flat.reshape(N, H, W, C)
+
+
+_textures = {}
+
+
+def texture(name, bank, device):
+    """A texture bank of image.py as a float32 tensor, kept per device under the bank's name."""
+    key = (name, str(device))
+    if key not in _textures:
+        _textures[key] = torch.from_numpy(np.ascontiguousarray(bank, dtype=np.float32)).to(device)
+    return _textures[key]
+
+
+# /////////////// RGB, x is NHWC float in [0, 1] ///////////////
+
+def gaussian_noise(x, c, rnd):
+    return (x + rnd.randn(*x.shape[1:]) * c.scale).clamp(0, 1)
+
+
+gaussian_noise_strong = gaussian_noise
+
+
+def shot_noise(x, c, rnd):
+    return (rnd.poisson(x * c.photons) / c.photons).clamp(0, 1)
+
+
+def impulse_noise(x, c, rnd):
+    flipped = rnd.rand(*x.shape[1:]) < c.amount
+    salted = rnd.rand(*x.shape[1:]) < 0.5
+    x = torch.where(flipped & salted, torch.ones_like(x), x)
+    return torch.where(flipped & ~salted, torch.zeros_like(x), x)
+
+
+def speckle_noise(x, c, rnd):
+    return (x + x * rnd.randn(*x.shape[1:]) * c.scale).clamp(0, 1)
+
+
+def gaussian_blur(x, c, rnd):
+    return nhwc(gaussian(nchw(x), c.sigma)).clamp(0, 1)
+
+
+def glass_blur(x, c, rnd):
+    x = torch.floor(nhwc(gaussian(nchw(x), c.sigma)) * 255)
+    x = shuffle_pixels(x, c.max_delta, c.iterations, rnd)
+    return nhwc(gaussian(nchw(x / 255.), c.sigma)).clamp(0, 1)
+
+
+def defocus_blur(x, c, rnd):
+    kernel = torch.from_numpy(image.disk(radius=c.radius, alias_blur=c.alias_blur)).to(x.device)
+    return nhwc(depthwise(nchw(x), kernel, 'reflect')).clamp(0, 1)
+
+
+def motion_blur(x, c, rnd):
+    angles = rnd.uniform(-45, 45)
+    return nhwc(motion_blur_uint8(nchw(x * 255), c.radius, c.sigma, angles.tolist())) / 255.
+
+
+def zoom_blur(x, c, rnd):
+    h, w = x.shape[1:3]
+    x = nchw(x)
+    out = torch.zeros_like(x)
+    zooms = np.arange(1, c.max_zoom, c.step)
+    for zoom_factor in zooms:
+        out += resize(clipped_zoom(x, zoom_factor), h, w)
+    return nhwc((x + out) / (len(zooms) + 1)).clamp(0, 1)
+
+
+def fog(x, c, rnd):
+    h, w = x.shape[1:3]
+    max_val = x.amax(dim=(1, 2, 3), keepdim=True)
+    if image.TEXTURE_BANK_SIZE > 0:
+        bank = texture(image.fog_bank_name(c.wibbledecay, h, w), image.fog_bank(c.wibbledecay, h, w), x.device)
+        fog_layer = bank[rnd.randint(0, len(bank))]
+    else:
+        fog_layer = torch.stack([torch.from_numpy(cv2.resize(image.plasma_fractal(mapsize=1024, wibbledecay=c.wibbledecay),
+                                                             (w, h))).float() for _ in range(len(x))]).to(x.device)
+    x = x + c.intensity * fog_layer[..., None]
+    return (x * max_val / (max_val + c.intensity)).clamp(0, 1)
+
+
+def frost(x, c, rnd):
+    h, w = x.shape[1:3]
+    bank = texture(image.frost_bank_name(h, w), image.frost_bank(h, w), x.device)
+    frost_layer = bank[rnd.randint(0, 5)]
+    return (c.image_weight * x * 255 + c.frost_weight * frost_layer).clamp(0, 255) / 255.
+
+
+def snow(x, c, rnd):
+    h, w = x.shape[1:3]
+    snow_layer = rnd.randn(1, h, w) * c.scale + c.loc
+    snow_layer = clipped_zoom(snow_layer, c.zoom)
+    snow_layer = torch.where(snow_layer < c.threshold, torch.zeros_like(snow_layer), snow_layer)
+    snow_layer = torch.floor(snow_layer.clamp(0, 1) * 255)
+    snow_layer = motion_blur_uint8(snow_layer, c.blur_radius, c.blur_sigma, rnd.uniform(-135, -45).tolist()) / 255.
+    snow_layer = nhwc(resize(snow_layer, h, w))
+
+    gray = (x * torch.tensor([0.299, 0.587, 0.114], device=x.device)).sum(-1, keepdim=True)
+    x = c.blend * x + (1 - c.blend) * torch.maximum(x, gray * 1.5 + 0.5)
+    return (x + snow_layer + torch.flip(snow_layer, dims=(1, 2))).clamp(0, 1)
+
+
+def spatter(x, c, rnd):
+    h, w = x.shape[1:3]
+    liquid_layer = gaussian(rnd.randn(1, h, w) * c.scale + c.loc, c.sigma)[:, 0]
+    liquid_layer = torch.where(liquid_layer < c.threshold, torch.zeros_like(liquid_layer), liquid_layer)
+    if c.mud == 0:
+        # the distance transform of the liquid edges stays on OpenCV
+        m = []
+        for layer in (liquid_layer * 255).to(torch.uint8).cpu().numpy():
+            dist = 255 - cv2.Canny(layer, 50, 150)
+            dist = cv2.distanceTransform(dist, cv2.DIST_L2, 5)
+            _, dist = cv2.threshold(dist, 20, 20, cv2.THRESH_TRUNC)
+            dist = cv2.blur(dist, (3, 3)).astype(np.uint8)
+            dist = cv2.equalizeHist(dist)
+            ker = np.array([[-2, -1, 0], [-1, 1, 1], [0, 1, 2]])
+            dist = cv2.filter2D(dist, cv2.CV_8U, ker)
+            dist = cv2.blur(dist, (3, 3)).astype(np.float32)
+            m.append(layer * dist)
+        m = torch.from_numpy(np.stack(m)).to(x.device)
+        m = m / m.amax(dim=(1, 2), keepdim=True) * c.intensity
+
+        # water is pale turqouise
+        color = torch.tensor([175 / 255., 238 / 255., 238 / 255.], device=x.device)
+        return (x + m[..., None] * color).clamp(0, 1)
+    else:
+        m = gaussian((liquid_layer > c.threshold).float()[:, None], c.intensity)[:, 0]
+        m = torch.where(m < 0.8, torch.zeros_like(m), m)[..., None]
+
+        # mud brown
+        color = torch.tensor([63 / 255., 42 / 255., 20 / 255.], device=x.device)
+        return (x * (1 - m) + color * m).clamp(0, 1)
+
+
+def contrast(x, c, rnd):
+    means = x.mean(dim=(1, 2), keepdim=True)
+    return ((x - means) * c.factor + means).clamp(0, 1)
+
+
+def brightness(x, c, rnd):
+    x = rgb2hsv(x)
+    x = torch.cat([x[..., :2], (x[..., 2:] + c.shift).clamp(0, 1)], -1)
+    return hsv2rgb(x).clamp(0, 1)
+
+
+def saturate(x, c, rnd):
+    x = rgb2hsv(x)
+    x = torch.cat([x[..., :1], (x[..., 1:2] * c.scale + c.shift).clamp(0, 1), x[..., 2:]], -1)
+    return hsv2rgb(x).clamp(0, 1)
+
+
+def jpeg_compression(x, c, rnd):
+    out = []
+    for frame in torch.round(x * 255).to(torch.uint8).cpu().numpy():
+        output = BytesIO()
+        PILImage.fromarray(frame).save(output, 'JPEG', quality=c.quality)
+        out.append(np.array(PILImage.open(output)))
+    return torch.from_numpy(np.stack(out)).to(x.device).float() / 255.
+
+
+def pixelate(x, c, rnd):
+    h, w = x.shape[1:3]
+    small = F.interpolate(nchw(x), size=(int(h * c.scale), int(w * c.scale)), mode='area')
+    return nhwc(F.interpolate(small, size=(h, w), mode='nearest'))
+
+
+# /////////////// Depth, x is NHW float ///////////////
+
+def depth_add_gaussian_noise(x, c, rnd):
+    mean = x.mean(dim=(1, 2), keepdim=True) * c.factor
+    std = x.std(dim=(1, 2), unbiased=False, keepdim=True) * c.factor
+    # astype('uint16') in depth.py truncates and wraps negative noise
+    noise = torch.remainder(torch.trunc(rnd.randn(*x.shape[1:]) * std + mean), 65536)
+    return x + noise
+
+
+def _erosion_seeds(x, c, rnd):
+    edges = []
+    for frame in x.cpu().numpy():
+        scaled_x = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        edges.append(cv2.Canny(scaled_x, 20, 50) > 0)
+    edges = torch.from_numpy(np.stack(edges)).to(x.device)
+
+    seeds = torch.zeros_like(edges)
+    for i, edge in enumerate(edges):
+        edge_indices = torch.nonzero(edge.reshape(-1))[:, 0]
+        order = rnd.subset([i]).randperm(len(edge_indices))[0]
+        chosen = edge_indices[order[:int(len(edge_indices) * c.rate)]]
+        seeds[i].view(-1)[chosen] = True
+    return edges, seeds
+
+
+def depth_add_edge_erosion(x, c, rnd):
+    edges, seeds = _erosion_seeds(x, c, rnd)
+    # square patches of half size patch_len around every seed
+    size = 2 * c.patch_len + 1
+    patches = F.max_pool2d(seeds[:, None].float(), size, stride=1, padding=c.patch_len)[:, 0] > 0
+    return torch.where(edges | patches, torch.zeros_like(x), x)
+
+
+def depth_add_edge_erosion_orb(x, c, rnd):
+    edges, seeds = _erosion_seeds(x, c, rnd)
+    # patches span [p - patch_len, p + patch_len), none for seeds near the top / left border
+    seeds[:, :c.patch_len] = False
+    seeds[:, :, :c.patch_len] = False
+    padded = F.pad(seeds[:, None].float(), (c.patch_len - 1, c.patch_len, c.patch_len - 1, c.patch_len))
+    patches = F.max_pool2d(padded, 2 * c.patch_len, stride=1)[:, 0] > 0
+    return torch.where(edges | patches, torch.zeros_like(x), x)
+
+
+def depth_add_random_mask(x, c, rnd):
+    N, H, W = x.shape
+    patch_w, patch_h = int(H * c.scale), int(W * c.scale)
+    x1 = rnd.randint(0, H - patch_w, c.count)
+    y1 = rnd.randint(0, W - patch_h, c.count)
+    rows = torch.arange(H, device=x.device)[None, None, :]
+    cols = torch.arange(W, device=x.device)[None, None, :]
+    in_rows = (rows >= x1[..., None]) & (rows < x1[..., None] + patch_w)
+    in_cols = (cols >= y1[..., None]) & (cols < y1[..., None] + patch_h)
+    mask = (in_rows[..., :, None] & in_cols[..., None, :]).any(1)
+    return torch.where(mask, torch.zeros_like(x), x)
+
+
+def depth_add_fixed_mask(x, c, rnd):
+    N, H, W = x.shape
+    patch_w, patch_h = int(H * c.scale), int(W * c.scale)
+    mask = torch.zeros(H, W, dtype=torch.bool, device=x.device)
+    start_point = [(1, 1), (3, 1), (5, 1), (7, 1), (1, 3), (1, 5), (1, 7), (3, 3), (5, 5), (9, 9), (9, 1), (1, 9),
+                   (7, 7)][:c.count]
+    for px, py in start_point:
+        x1, y1 = (px - 1) * patch_w, (py - 1) * patch_h
+        mask[x1:x1 + patch_w, y1:y1 + patch_h] = True
+    return torch.where(mask, torch.zeros_like(x), x)
+
+
+def depth_range(x, c, rnd):
+    mask = (x > c.far) | (x < c.near)
+    return torch.where(mask, torch.zeros_like(x), x)
+
+
+# these ORB-SLAM3 variants differ in their tables only
+depth_add_random_mask_orb = depth_add_random_mask
+depth_range_orb = depth_range
+
+
+# /////////////// Entry point ///////////////
+
+def generators(seed, n, device):
+    """None, or one torch.Generator per sample; an int seed s gives the samples seeds s, s+1, ..."""
+    if seed is None:
+        return None
+    seeds = np.atleast_1d(np.asarray(seed.cpu() if torch.is_tensor(seed) else seed, dtype=np.int64))
+    if seeds.size == 1:
+        seeds = seeds[0] + np.arange(n)
+    if seeds.size != n:
+        raise ValueError("Expected %i seeds, got %i" % (n, seeds.size))
+    return [torch.Generator(device=device).manual_seed(int(s)) for s in seeds]
+
+
+def perturb_batch(x, perturbation, severity, seed=None):
+    """
+    Apply `perturbation` (name or ID) to a batch.
+
+    x         [B, H, W, 3] RGB frames in [0, 255] (uint8 or float), or [B, H, W]
+              depth maps (raw units, metric for depth_range)
+    severity  int or [B] ints in [1, 5]
+    seed      None (torch's global generator), int, or [B] ints
+    Returns float32 on x's device, RGB in [0, 255].
+    """
+    p = registry.get(perturbation)
+    x = x.float()
+    if p.stage in (registry.SYNC, registry.CLEAN):
+        return x
+    if p.stage == registry.RGB:
+        if x.dim() != 4 or x.shape[-1] != 3:
+            raise ValueError("Expected RGB frames of shape [B, H, W, 3], got %s" % (tuple(x.shape),))
+        x = x / 255.
+    elif x.dim() != 3:
+        raise ValueError("Expected depth maps of shape [B, H, W], got %s" % (tuple(x.shape),))
+
+    n = x.shape[0]
+    severity = np.asarray(severity.cpu() if torch.is_tensor(severity) else severity, dtype=np.int64)
+    severity = np.broadcast_to(severity, (n,))
+    rnd = _Random(n, x.device, generators(seed, n, x.device))
+    fn = globals()[p.name]
+
+    out = torch.empty_like(x)
+    for level in np.unique(severity):
+        idx = np.nonzero(severity == level)[0]
+        sel = torch.from_numpy(idx).to(x.device)
+        out[sel] = fn(x[sel], p.params(int(level)), rnd.subset(idx))
+
+    return out * 255. if p.stage == registry.RGB else out
@@ -0,0 +1,83 @@
+"""
+Content-addressed store of perturbed frames.
+
+Entries are keyed on the hash of the source frame as the loader decoded it,
+the perturbation, the severity and the seed, so every loader that decodes the
+same frame finds what materialize.py wrote, whatever the sequence layout.
+Only the 'rgb' and 'depth' stages are cached; depth_range on metric depth is
+cheaper to recompute than to read.
+"""
+
+import os
+import random
+import hashlib
+
+import numpy as np
+
+from . import registry
+
+CACHED_STAGES = (registry.RGB, registry.DEPTH)
+
+
+def frame_digest(x):
+    """sha1 of a decoded frame (ndarray or PIL image), its shape and dtype."""
+    a = np.ascontiguousarray(np.asarray(x))
+    # SplaTAM reads depth pngs as int64, the other loaders as uint16
+    if a.dtype.kind in 'iu' and a.dtype.itemsize > 2 and a.size and a.min() >= 0 and a.max() <= 65535:
+        a = a.astype(np.uint16)
+    h = hashlib.sha1(('%s%s' % (a.dtype.str, a.shape)).encode())
+    h.update(a.data)
+    return h.hexdigest()
+
+
+def encode(x, stage):
+    """Storage form of a perturbed frame: RGB rounded to uint8, depth as computed."""
+    x = np.asarray(x)
+    if stage == registry.RGB:
+        return np.clip(np.rint(x), 0, 255).astype(np.uint8)
+    return x
+
+
+def seed_all(key):
+    """Seed `random` and `np.random` from an entry key, so a materialized entry is reproducible."""
+    seed = int(key[:8], 16)
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+class PerturbationCache:
+    """Perturbed frames under root/<key[:2]>/<key>.npy."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def __repr__(self):
+        return 'PerturbationCache(%r)' % self.root
+
+    @staticmethod
+    def key(digest, perturbation, severity, seed):
+        """Entry key of `perturbation` (name or ID) at `severity` and `seed` applied to the frame `digest`."""
+        name = registry.get(perturbation).name
+        return hashlib.sha1(('%s_%s_%i_%i' % (digest, name, severity, seed)).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + '.npy')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """The stored frame, or None on a miss."""
+        try:
+            return np.load(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, x):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so concurrent workers and readers never see a partial file
+        tmp = '%s.%i.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, x)
+        os.replace(tmp, path)
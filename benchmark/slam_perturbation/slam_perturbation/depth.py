@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Depth perturbations. All methods but depth_range take the raw depth map as
+read from disk (uint16); depth_range takes metric depth.
+"""
+
+import random
+import numpy as np
+import cv2
+import warnings
+
+from . import params
+
+__all__ = ['depth_add_gaussian_noise', 'depth_add_edge_erosion', 'depth_add_edge_erosion_orb', 'rect_mask',
+           'depth_add_random_mask', 'depth_add_random_mask_orb', 'depth_add_fixed_mask', 'depth_range',
+           'depth_range_orb']
+
+warnings.simplefilter("ignore", UserWarning)
+
+
+def depth_add_gaussian_noise(x, severity=1):
+    c = params.DEPTH_GAUSSIAN_NOISE[severity - 1]
+    mean, std = np.mean(x) * c.factor, np.std(x) * c.factor
+    noise = np.random.normal(mean, std, x.shape).astype('uint16')
+    noisy_image = x + noise
+    return noisy_image
+
+
+def depth_add_edge_erosion(x, severity=1):
+    c = params.DEPTH_EDGE_EROSION[severity - 1]
+    scaled_x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    edges = cv2.Canny(scaled_x, 20, 50)
+    # shuffling the flat indices draws the same permutation as shuffling (row, col) pairs
+    edge_indices = np.flatnonzero(edges)
+    np.random.shuffle(edge_indices)
+    erosion_edge_count = int(len(edge_indices) * c.rate)
+    seeds = np.zeros(edges.shape, dtype=np.uint8)
+    seeds.flat[edge_indices[:erosion_edge_count]] = 1
+    # a square patch of half size patch_len around every seed, clipped at the border
+    patch = np.ones((2 * c.patch_len + 1, 2 * c.patch_len + 1), dtype=np.uint8)
+    erosion_mask = (edges > 0) | (cv2.dilate(seeds, patch) > 0)
+
+    noisy_image = np.copy(x)
+    noisy_image[erosion_mask] = 0
+
+    return noisy_image
+
+
+def depth_add_edge_erosion_orb(x, severity=1):
+    """
+    depth_add_edge_erosion as in the ORB-SLAM3 runs: random.sample draws the
+    seeds, and each patch spans [p - patch_len, p + patch_len), so it is one
+    pixel shorter at the bottom/right and empty for seeds closer than patch_len
+    to the top or left border, where the slice start wrapped around.
+    """
+    c = params.DEPTH_EDGE_EROSION[severity - 1]
+    scaled_x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    edges = cv2.Canny(scaled_x, 20, 50)
+    # row-major, the order of the former edge pixel list
+    edge_indices = np.flatnonzero(edges)
+    chosen = edge_indices[random.sample(range(len(edge_indices)), int(len(edge_indices) * c.rate))]
+    rows, cols = np.unravel_index(chosen, edges.shape)
+    keep = (rows >= c.patch_len) & (cols >= c.patch_len)
+    seeds = np.zeros(edges.shape, dtype=np.uint8)
+    seeds[rows[keep], cols[keep]] = 1
+    patch = np.ones((2 * c.patch_len, 2 * c.patch_len), dtype=np.uint8)
+    erosion_mask = (edges > 0) | (cv2.dilate(seeds, patch, anchor=(c.patch_len - 1, c.patch_len - 1)) > 0)
+
+    noisy_image = np.copy(x)
+    noisy_image[erosion_mask] = 0
+
+    return noisy_image
+
+
+def rect_mask(shape, corners, patch_w, patch_h):
+    """Union of the patch_w x patch_h rectangles with top-left corners `corners`."""
+    mask = np.zeros(shape[:2], dtype=bool)
+    # a dozen slice assignments beat any broadcast over the whole frame
+    for x1, y1 in corners:
+        mask[x1:x1 + patch_w, y1:y1 + patch_h] = True
+    return mask
+
+
+def depth_add_random_mask(x, severity=1, table=params.DEPTH_RANDOM_MASK):
+    c = table[severity - 1]
+    patch_w = int(x.shape[0] * c.scale)
+    patch_h = int(x.shape[1] * c.scale)
+    # rectangles may overlap, as in the runs of the paper; the draws match
+    # the former per-rectangle (x1, y1) randint calls one for one
+    corners = np.random.randint(0, [x.shape[0] - patch_w, x.shape[1] - patch_h], size=(c.count, 2))
+    mask = rect_mask(x.shape, corners, patch_w, patch_h)
+    noisy_image = np.copy(x)
+    noisy_image[mask] = 0
+    return noisy_image
+
+
+def depth_add_random_mask_orb(x, severity=1):
+    """depth_add_random_mask with the rectangle counts of the ORB-SLAM3 runs."""
+    return depth_add_random_mask(x, severity, params.DEPTH_RANDOM_MASK_ORB)
+
+
+def depth_add_fixed_mask(x, severity=1):
+    c = params.DEPTH_FIXED_MASK[severity - 1]
+    patch_w = int(x.shape[0] * c.scale)
+    patch_h = int(x.shape[1] * c.scale)
+    start_point = np.array([(1, 1), (3, 1), (5, 1), (7, 1), (1, 3), (1, 5), (1, 7), (3, 3), (5, 5), (9, 9), (9, 1),
+                            (1, 9), (7, 7)][:c.count])
+    corners = (start_point - 1) * [patch_w, patch_h]
+    mask = rect_mask(x.shape, corners, patch_w, patch_h)
+    noisy_image = np.copy(x)
+    noisy_image[mask] = 0
+    return noisy_image
+
+
+def depth_range(x, severity=1, scale=1., table=params.DEPTH_RANGE):
+    """Drop depth outside the sensor range; `scale` converts x to metres (x / scale)."""
+    c = table[severity - 1]
+    mask = (x > c.far * scale) | (x < c.near * scale)
+    filtered_image = np.where(mask, 0, x)
+    return filtered_image
+
+
+def depth_range_orb(x, severity=1, scale=1.):
+    """depth_range with the sensor ranges of the ORB-SLAM3 runs."""
+    return depth_range(x, severity, scale, params.DEPTH_RANGE_ORB)
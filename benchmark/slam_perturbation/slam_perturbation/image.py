@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+"""
+RGB perturbations. Every method takes an RGB frame (PIL image or HxWx3 uint8
+array) and a severity in [1, 5] and works at the frame's own resolution.
+
+skimage, scipy and wand are imported inside the methods that need them, so
+importing this module for a single perturbation stays cheap.
+"""
+
+import os
+import ctypes
+import warnings
+from io import BytesIO
+from functools import lru_cache
+
+import numpy as np
+import cv2
+from PIL import Image as PILImage
+
+from . import params
+
+# the methods and helpers, not the modules imported above, for `from .image import *`
+__all__ = ['gaussian', 'to_pil', 'disk', 'wand_motion_image', 'motion_blur_kernel', 'apply_motion_blur',
+           'plasma_fractal', 'load_texture_bank', 'fog_bank_name', 'fog_bank', 'frost_bank_name', 'frost_bank',
+           'clipped_zoom', 'shuffle_pixels',
+           'gaussian_noise_strong', 'gaussian_noise', 'shot_noise', 'impulse_noise', 'speckle_noise',
+           'gaussian_blur', 'glass_blur', 'defocus_blur', 'motion_blur', 'zoom_blur', 'fog', 'frost', 'snow',
+           'spatter', 'contrast', 'brightness', 'saturate', 'jpeg_compression', 'pixelate', 'elastic_transform',
+           'none']
+
+warnings.simplefilter("ignore", UserWarning)
+
+
+# /////////////// Distortion Helpers ///////////////
+
+def gaussian(x, sigma, **kwargs):
+    from skimage.filters import gaussian as sk_gaussian
+    return sk_gaussian(x, sigma=sigma, **kwargs)
+
+
+def to_pil(x):
+    return x if isinstance(x, PILImage.Image) else PILImage.fromarray(np.uint8(x))
+
+
+def disk(radius, alias_blur=0.1, dtype=np.float32):
+    if radius <= 8:
+        L = np.arange(-8, 8 + 1)
+        ksize = (3, 3)
+    else:
+        L = np.arange(-radius, radius + 1)
+        ksize = (5, 5)
+    X, Y = np.meshgrid(L, L)
+    aliased_disk = np.array((X ** 2 + Y ** 2) <= radius ** 2, dtype=dtype)
+    aliased_disk /= np.sum(aliased_disk)
+
+    # supersample disk to antialias
+    return cv2.GaussianBlur(aliased_disk, ksize=ksize, sigmaX=alias_blur)
+
+
+# backend used by motion_blur and snow: 'opencv' (in-process line kernel) or
+# 'wand' (ImageMagick through ctypes, needs the native library)
+MOTION_BLUR_BACKEND = 'opencv'
+# angles are snapped to this step so that kernels can be reused across frames
+MOTION_BLUR_ANGLE_STEP = 0.25
+
+_MotionImage = None
+
+
+def wand_motion_image():
+    """Build the wand MotionImage class on first use so wand stays optional."""
+    global _MotionImage
+    if _MotionImage is None:
+        from wand.image import Image as WandImage
+        from wand.api import library as wandlibrary
+
+        # Tell Python about the C method
+        wandlibrary.MagickMotionBlurImage.argtypes = (ctypes.c_void_p,  # wand
+                                                      ctypes.c_double,  # radius
+                                                      ctypes.c_double,  # sigma
+                                                      ctypes.c_double)  # angle
+
+        # Extend wand.image.Image class to include method signature
+        class MotionImage(WandImage):
+            def motion_blur(self, radius=0.0, sigma=0.0, angle=0.0):
+                wandlibrary.MagickMotionBlurImage(self.wand, radius, sigma, angle)
+
+        _MotionImage = MotionImage
+    return _MotionImage
+
+
+@lru_cache(maxsize=None)
+def motion_blur_kernel(radius, sigma, angle):
+    """
+    2D correlation kernel equivalent to ImageMagick's MotionBlurImage.
+    ImageMagick uses width = 2*ceil(radius)+1 one-sided gaussian taps
+    exp(-i^2 / 2 sigma^2), normalized, and reads tap i at
+    (x + ceil(i*cos(angle) - 0.5), y + ceil(i*sin(angle) - 0.5)).
+    """
+    width = int(2 * np.ceil(radius) + 1)
+    taps = np.exp(-np.arange(width) ** 2 / (2.0 * sigma ** 2))
+    taps /= taps.sum()
+    theta = np.deg2rad(angle)
+    off_x = np.ceil(np.arange(width) * np.cos(theta) - 0.5).astype(np.int64)
+    off_y = np.ceil(np.arange(width) * np.sin(theta) - 0.5).astype(np.int64)
+
+    kernel = np.zeros((2 * width - 1, 2 * width - 1), dtype=np.float32)
+    np.add.at(kernel, (off_y + width - 1, off_x + width - 1), taps)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def apply_motion_blur(x, radius, sigma, angle, backend=None):
+    """
+    Motion blur a uint8 HxW or HxWxC array, keeping its channel order.
+    The opencv backend clamps to the border like ImageMagick's edge virtual pixels.
+    """
+    backend = MOTION_BLUR_BACKEND if backend is None else backend
+    if backend == 'opencv':
+        angle = round(angle / MOTION_BLUR_ANGLE_STEP) * MOTION_BLUR_ANGLE_STEP
+        kernel = motion_blur_kernel(float(radius), float(sigma), angle)
+        return cv2.filter2D(x, -1, kernel, borderType=cv2.BORDER_REPLICATE)
+    elif backend == 'wand':
+        output = BytesIO()
+        PILImage.fromarray(x).save(output, format='PNG')
+        image = wand_motion_image()(blob=output.getvalue())
+        image.motion_blur(radius=radius, sigma=sigma, angle=angle)
+        x = cv2.imdecode(np.frombuffer(image.make_blob(), np.uint8), cv2.IMREAD_UNCHANGED)
+        if x.ndim == 3:
+            x = x[..., [2, 1, 0]]  # BGR to RGB
+        return x
+    raise ValueError("Unknown motion blur backend: %s" % backend)
+
+
+# modification of https://github.com/FLHerne/mapgen/blob/master/diamondsquare.py
+def plasma_fractal(mapsize=32, wibbledecay=3, rng=np.random):
+    """
+    Generate a heightmap using diamond-square algorithm.
+    Return square 2d array, side length 'mapsize', of floats in range 0-255.
+    'mapsize' must be a power of two.
+    """
+    assert (mapsize & (mapsize - 1) == 0)
+    maparray = np.empty((mapsize, mapsize), dtype=np.float64)
+    maparray[0, 0] = 0
+    stepsize = mapsize
+    wibble = 100
+
+    def wibbledmean(array):
+        return array / 4 + wibble * rng.uniform(-wibble, wibble, array.shape)
+
+    def fillsquares():
+        """For each square of points stepsize apart,
+           calculate middle value as mean of points + wibble"""
+        cornerref = maparray[0:mapsize:stepsize, 0:mapsize:stepsize]
+        squareaccum = cornerref + np.roll(cornerref, shift=-1, axis=0)
+        squareaccum += np.roll(squareaccum, shift=-1, axis=1)
+        maparray[stepsize // 2:mapsize:stepsize,
+        stepsize // 2:mapsize:stepsize] = wibbledmean(squareaccum)
+
+    def filldiamonds():
+        """For each diamond of points stepsize apart,
+           calculate middle value as mean of points + wibble"""
+        mapsize = maparray.shape[0]
+        drgrid = maparray[stepsize // 2:mapsize:stepsize, stepsize // 2:mapsize:stepsize]
+        ulgrid = maparray[0:mapsize:stepsize, 0:mapsize:stepsize]
+        ldrsum = drgrid + np.roll(drgrid, 1, axis=0)
+        lulsum = ulgrid + np.roll(ulgrid, -1, axis=1)
+        ltsum = ldrsum + lulsum
+        maparray[0:mapsize:stepsize, stepsize // 2:mapsize:stepsize] = wibbledmean(ltsum)
+        tdrsum = drgrid + np.roll(drgrid, 1, axis=1)
+        tulsum = ulgrid + np.roll(ulgrid, -1, axis=0)
+        ttsum = tdrsum + tulsum
+        maparray[stepsize // 2:mapsize:stepsize, 0:mapsize:stepsize] = wibbledmean(ttsum)
+
+    while stepsize >= 2:
+        fillsquares()
+        filldiamonds()
+        stepsize //= 2
+        wibble /= wibbledecay
+
+    maparray -= maparray.min()
+    return maparray / maparray.max()
+
+
+# fog and frost layers are drawn from banks of pre-rendered textures that are
+# built once per resolution, stored as .npy in TEXTURE_CACHE_DIR and memory-mapped;
+# set TEXTURE_BANK_SIZE = 0 to render a fresh fog fractal for every frame
+TEXTURE_BANK_SIZE = 16
+TEXTURE_BANK_SEED = 0
+TEXTURE_CACHE_DIR = os.environ.get('PERTURB_TEXTURE_CACHE',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'perturb_textures'))
+FROST_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frost', name)
+               for name in ['frost1.png', 'frost2.png', 'frost3.png', 'frost4.jpg', 'frost5.jpg', 'frost6.jpg']]
+
+_texture_banks = {}
+
+
+def load_texture_bank(name, build):
+    """
+    Return the texture bank `name` memory-mapped from TEXTURE_CACHE_DIR.
+    The first caller builds it with `build()`; the file is written under a
+    temporary name and renamed, so concurrent workers never read a partial bank.
+    """
+    if name not in _texture_banks:
+        path = os.path.join(TEXTURE_CACHE_DIR, name + '.npy')
+        if not os.path.exists(path):
+            os.makedirs(TEXTURE_CACHE_DIR, exist_ok=True)
+            tmp_path = '%s.%d.tmp.npy' % (path[:-4], os.getpid())
+            np.save(tmp_path, build())
+            os.replace(tmp_path, path)
+        _texture_banks[name] = np.load(path, mmap_mode='r')
+    return _texture_banks[name]
+
+
+def fog_bank_name(wibbledecay, h, w):
+    """Name of the fog bank, with everything its textures depend on."""
+    return 'fog_%ix%i_decay%g_n%i_seed%i' % (h, w, wibbledecay, TEXTURE_BANK_SIZE, TEXTURE_BANK_SEED)
+
+
+def fog_bank(wibbledecay, h, w):
+    """TEXTURE_BANK_SIZE x h x w float32 plasma fractals, seeded by TEXTURE_BANK_SEED."""
+    def build():
+        rng = np.random.RandomState(TEXTURE_BANK_SEED)
+        return np.stack([cv2.resize(plasma_fractal(mapsize=1024, wibbledecay=wibbledecay, rng=rng), (w, h))
+                         for _ in range(TEXTURE_BANK_SIZE)]).astype(np.float32)
+    return load_texture_bank(fog_bank_name(wibbledecay, h, w), build)
+
+
+def frost_bank_name(h, w):
+    """Name of the frost bank; it always holds the FROST_FILES, whatever the bank size and seed."""
+    return 'frost_%ix%i' % (h, w)
+
+
+def frost_bank(h, w):
+    """The frost images (BGR, uint8) resized to h x w."""
+    def build():
+        return np.stack([cv2.resize(cv2.imread(filename), (w, h)) for filename in FROST_FILES])
+    return load_texture_bank(frost_bank_name(h, w), build)
+
+
+def clipped_zoom(img, zoom_factor):
+    from scipy.ndimage import zoom as scizoom
+
+    h = img.shape[0]
+    # ceil crop height(= crop width)
+    ch = int(np.ceil(h / zoom_factor))
+
+    top = (h - ch) // 2
+    img = scizoom(img[top:top + ch, top:top + ch], (zoom_factor, zoom_factor, 1), order=1)
+    # trim off any extra pixels
+    trim_top = (img.shape[0] - h) // 2
+
+    return img[trim_top:trim_top + h, trim_top:trim_top + h]
+
+
+def shuffle_pixels(x, max_delta, iterations, height=None, width=None, rng=np.random):
+    """
+    Vectorized version of the glass_blur local pixel shuffle.
+    The reference loop walks h = height-max_delta .. max_delta+1 and
+    w = width-max_delta .. max_delta+1 (both descending) and runs
+    `x[h, w], x[h', w'] = x[h', w'], x[h, w]` with an offset drawn from
+    [-max_delta, max_delta). For HxWxC frames the right-hand side holds views,
+    so each step is really `x[h, w] = x[h', w']` as seen at that point of the
+    walk. A pixel thus ends up with the original value of the first pixel on
+    its chain of sources that was not visited before it; the chains are
+    resolved by pointer jumping. Offsets are drawn from `rng` in the same
+    order as the loop, so a seeded run reproduces the loop output.
+    """
+    H, W = x.shape[:2]
+    height = H if height is None else height
+    width = W if width is None else width
+    hs = np.arange(height - max_delta, max_delta, -1)
+    ws = np.arange(width - max_delta, max_delta, -1)
+    if hs.size == 0 or ws.size == 0:
+        return x
+
+    flat = x.reshape(H * W, -1)
+    dst = (hs[:, None] * W + ws[None, :]).ravel()
+    # position of every pixel in the walk, -1 for pixels the walk never visits
+    order = np.full(H * W, -1, dtype=np.int64)
+    order[dst] = np.arange(dst.size)
+    for _ in range(iterations):
+        dx, dy = np.moveaxis(rng.randint(-max_delta, max_delta, size=(hs.size, ws.size, 2)), -1, 0)
+        src = ((hs[:, None] + dy) * W + (ws[None, :] + dx)).ravel()
+        ptr = np.arange(H * W)
+        ptr[dst] = src
+        # sources overwritten earlier in the walk pass on their own source
+        linked = np.zeros(H * W, dtype=bool)
+        linked[dst] = (order[src] >= 0) & (order[src] < order[dst])
+        while linked.any():
+            ptr, linked = np.where(linked, ptr[ptr], ptr), linked & linked[ptr]
+        flat = flat[ptr]
+
+    return flat.reshape(x.shape)
+
+# /////////////// End Distortion Helpers ///////////////
+
+
+# /////////////// Distortions ///////////////
+
+def gaussian_noise_strong(x, severity=1):
+    c = params.GAUSSIAN_NOISE_STRONG[severity - 1]
+
+    x = np.array(x) / 255.
+    return np.clip(x + np.random.normal(size=x.shape, scale=c.scale), 0, 1) * 255
+
+
+def gaussian_noise(x, severity=1):
+    c = params.GAUSSIAN_NOISE[severity - 1]
+
+    x = np.array(x) / 255.
+    return np.clip(x + np.random.normal(size=x.shape, scale=c.scale), 0, 1) * 255
+
+
+def shot_noise(x, severity=1):
+    c = params.SHOT_NOISE[severity - 1]
+
+    x = np.array(x) / 255.
+    return np.clip(np.random.poisson(x * c.photons) / c.photons, 0, 1) * 255
+
+
+def impulse_noise(x, severity=1):
+    from skimage.util import random_noise
+
+    c = params.IMPULSE_NOISE[severity - 1]
+
+    x = random_noise(np.array(x) / 255., mode='s&p', amount=c.amount)
+    return np.clip(x, 0, 1) * 255
+
+
+def speckle_noise(x, severity=1):
+    c = params.SPECKLE_NOISE[severity - 1]
+
+    x = np.array(x) / 255.
+    return np.clip(x + x * np.random.normal(size=x.shape, scale=c.scale), 0, 1) * 255
+
+
+def gaussian_blur(x, severity=1):
+    c = params.GAUSSIAN_BLUR[severity - 1]
+
+    x = gaussian(np.array(x) / 255., sigma=c.sigma, channel_axis=-1)
+    return np.clip(x, 0, 1) * 255
+
+
+def glass_blur(x, severity=1, seed=None):
+    c = params.GLASS_BLUR[severity - 1]
+    rng = np.random if seed is None else np.random.RandomState(seed)
+
+    x = np.uint8(gaussian(np.array(x) / 255., sigma=c.sigma, channel_axis=-1) * 255)
+
+    # locally shuffle pixels
+    x = shuffle_pixels(x, c.max_delta, c.iterations, rng=rng)
+
+    return np.clip(gaussian(x / 255., sigma=c.sigma, channel_axis=-1), 0, 1) * 255
+
+
+def defocus_blur(x, severity=1):
+    c = params.DEFOCUS_BLUR[severity - 1]
+
+    x = np.array(x) / 255.
+    kernel = disk(radius=c.radius, alias_blur=c.alias_blur)
+
+    channels = []
+    for d in range(3):
+        channels.append(cv2.filter2D(x[:, :, d], -1, kernel))
+    channels = np.array(channels).transpose((1, 2, 0))  # 3xHxW -> HxWx3
+
+    return np.clip(channels, 0, 1) * 255
+
+
+def motion_blur(x, severity=1):
+    c = params.MOTION_BLUR[severity - 1]
+
+    x = apply_motion_blur(np.array(x), radius=c.radius, sigma=c.sigma, angle=np.random.uniform(-45, 45))
+
+    if x.ndim == 3:
+        return np.clip(x, 0, 255)
+    else:  # greyscale to RGB
+        return np.clip(np.array([x, x, x]).transpose((1, 2, 0)), 0, 255)
+
+
+def zoom_blur(x, severity=1):
+    c = params.ZOOM_BLUR[severity - 1]
+
+    x = (np.array(x) / 255.).astype(np.float32)
+    h, w, _ = x.shape
+    out = np.zeros_like(x)
+    zooms = np.arange(1, c.max_zoom, c.step)
+    for zoom_factor in zooms:
+        clipped_zoom_out = clipped_zoom(x, zoom_factor)
+        clipped_zoom_out = cv2.resize(clipped_zoom_out, (w, h))
+        out = out + clipped_zoom_out
+
+    x = (x + out) / (len(zooms) + 1)
+    return np.clip(x, 0, 1) * 255
+
+
+def fog(x, severity=1):
+    c = params.FOG[severity - 1]
+
+    x = np.array(x) / 255.
+    max_val = x.max()
+    h, w, _ = x.shape
+    if TEXTURE_BANK_SIZE > 0:
+        bank = fog_bank(c.wibbledecay, h, w)
+        fog_layer = bank[np.random.randint(len(bank))]
+    else:
+        fog_layer = cv2.resize(plasma_fractal(mapsize=1024, wibbledecay=c.wibbledecay), (w, h))
+    x += c.intensity * fog_layer[..., np.newaxis]
+    return np.clip(x * max_val / (max_val + c.intensity), 0, 1) * 255
+
+
+def frost(x, severity=1):
+    c = params.FROST[severity - 1]
+
+    x = np.array(x)
+    h, w, _ = x.shape
+    idx = np.random.randint(5)
+    frost = frost_bank(h, w)[idx]
+    return np.clip(c.image_weight * x + c.frost_weight * frost, 0, 255)
+
+
+def snow(x, severity=1):
+    c = params.SNOW[severity - 1]
+
+    x = np.array(x, dtype=np.float32) / 255.
+    h, w, _ = x.shape
+    snow_layer = np.random.normal(size=x.shape[:2], loc=c.loc, scale=c.scale)  # [:2] for monochrome
+    snow_layer = clipped_zoom(snow_layer[..., np.newaxis], c.zoom)
+    snow_layer[snow_layer < c.threshold] = 0
+
+    snow_layer = (np.clip(snow_layer.squeeze(), 0, 1) * 255).astype(np.uint8)
+    snow_layer = apply_motion_blur(snow_layer, radius=c.blur_radius, sigma=c.blur_sigma,
+                                   angle=np.random.uniform(-135, -45)) / 255.
+
+    snow_layer = cv2.resize(snow_layer, (w, h))
+    snow_layer = snow_layer[..., np.newaxis]
+    x = c.blend * x + (1 - c.blend) * np.maximum(x, cv2.cvtColor(x, cv2.COLOR_RGB2GRAY).reshape(h, w, 1) * 1.5 + 0.5)
+    return np.clip(x + snow_layer + np.rot90(snow_layer, k=2), 0, 1) * 255
+
+
+def spatter(x, severity=1):
+    c = params.SPATTER[severity - 1]
+
+    x = np.array(x, dtype=np.float32) / 255.
+
+    liquid_layer = np.random.normal(size=x.shape[:2], loc=c.loc, scale=c.scale)
+
+    liquid_layer = gaussian(liquid_layer, sigma=c.sigma)
+    liquid_layer[liquid_layer < c.threshold] = 0
+    if c.mud == 0:
+        liquid_layer = (liquid_layer * 255).astype(np.uint8)
+        dist = 255 - cv2.Canny(liquid_layer, 50, 150)
+        dist = cv2.distanceTransform(dist, cv2.DIST_L2, 5)
+        _, dist = cv2.threshold(dist, 20, 20, cv2.THRESH_TRUNC)
+        dist = cv2.blur(dist, (3, 3)).astype(np.uint8)
+        dist = cv2.equalizeHist(dist)
+        ker = np.array([[-2, -1, 0], [-1, 1, 1], [0, 1, 2]])
+        dist = cv2.filter2D(dist, cv2.CV_8U, ker)
+        dist = cv2.blur(dist, (3, 3)).astype(np.float32)
+
+        m = cv2.cvtColor(liquid_layer * dist, cv2.COLOR_GRAY2BGRA)
+        m /= np.max(m, axis=(0, 1))
+        m *= c.intensity
+
+        # water is pale turqouise
+        color = np.concatenate((175 / 255. * np.ones_like(m[..., :1]),
+                                238 / 255. * np.ones_like(m[..., :1]),
+                                238 / 255. * np.ones_like(m[..., :1])), axis=2)
+
+        color = cv2.cvtColor(color, cv2.COLOR_BGR2BGRA)
+        x = cv2.cvtColor(x, cv2.COLOR_BGR2BGRA)
+
+        return cv2.cvtColor(np.clip(x + m * color, 0, 1), cv2.COLOR_BGRA2BGR) * 255
+    else:
+        m = np.where(liquid_layer > c.threshold, 1, 0)
+        m = gaussian(m.astype(np.float32), sigma=c.intensity)
+        m[m < 0.8] = 0
+
+        # mud brown
+        color = np.concatenate((63 / 255. * np.ones_like(x[..., :1]),
+                                42 / 255. * np.ones_like(x[..., :1]),
+                                20 / 255. * np.ones_like(x[..., :1])), axis=2)
+
+        color *= m[..., np.newaxis]
+        x *= (1 - m[..., np.newaxis])
+
+        return np.clip(x + color, 0, 1) * 255
+
+
+def contrast(x, severity=1):
+    c = params.CONTRAST[severity - 1]
+
+    x = np.array(x) / 255.
+    means = np.mean(x, axis=(0, 1), keepdims=True)
+    return np.clip((x - means) * c.factor + means, 0, 1) * 255
+
+
+def brightness(x, severity=1):
+    from skimage.color import rgb2hsv, hsv2rgb
+
+    c = params.BRIGHTNESS[severity - 1]
+
+    x = np.array(x) / 255.
+    x = rgb2hsv(x)
+    x[:, :, 2] = np.clip(x[:, :, 2] + c.shift, 0, 1)
+    x = hsv2rgb(x)
+
+    return np.clip(x, 0, 1) * 255
+
+
+def saturate(x, severity=1):
+    from skimage.color import rgb2hsv, hsv2rgb
+
+    c = params.SATURATE[severity - 1]
+
+    x = np.array(x) / 255.
+    x = rgb2hsv(x)
+    x[:, :, 1] = np.clip(x[:, :, 1] * c.scale + c.shift, 0, 1)
+    x = hsv2rgb(x)
+
+    return np.clip(x, 0, 1) * 255
+
+
+def jpeg_compression(x, severity=1):
+    c = params.JPEG_COMPRESSION[severity - 1]
+
+    output = BytesIO()
+    to_pil(x).save(output, 'JPEG', quality=c.quality)
+    x = PILImage.open(output)
+
+    return x
+
+
+def pixelate(x, severity=1):
+    c = params.PIXELATE[severity - 1]
+
+    x = to_pil(x)
+    w, h = x.size
+    x = x.resize((int(w * c.scale), int(h * c.scale)), PILImage.BOX)
+    x = x.resize((w, h), PILImage.BOX)
+
+    return x
+
+
+# displacement parameters are given relative to this frame size
+ELASTIC_SIZE = 512
+
+
+# mod of https://gist.github.com/erniejunior/601cdf56d2b424757de5
+def elastic_transform(image, severity=1):
+    from scipy.ndimage import map_coordinates
+
+    c = params.ELASTIC_TRANSFORM[severity - 1]
+    alpha, sigma, affine = c.alpha * ELASTIC_SIZE, c.sigma * ELASTIC_SIZE, c.affine * ELASTIC_SIZE
+
+    image = np.array(image, dtype=np.float32) / 255.
+    shape = image.shape
+    shape_size = shape[:2]
+
+    # random affine
+    center_square = np.float32(shape_size) // 2
+    square_size = min(shape_size) // 3
+    pts1 = np.float32([center_square + square_size,
+                       [center_square[0] + square_size, center_square[1] - square_size],
+                       center_square - square_size])
+    pts2 = pts1 + np.random.uniform(-affine, affine, size=pts1.shape).astype(np.float32)
+    M = cv2.getAffineTransform(pts1, pts2)
+    image = cv2.warpAffine(image, M, shape_size[::-1], borderMode=cv2.BORDER_REFLECT_101)
+
+    dx = (gaussian(np.random.uniform(-1, 1, size=shape[:2]),
+                   sigma, mode='reflect', truncate=3) * alpha).astype(np.float32)
+    dy = (gaussian(np.random.uniform(-1, 1, size=shape[:2]),
+                   sigma, mode='reflect', truncate=3) * alpha).astype(np.float32)
+    dx, dy = dx[..., np.newaxis], dy[..., np.newaxis]
+
+    x, y, z = np.meshgrid(np.arange(shape[1]), np.arange(shape[0]), np.arange(shape[2]))
+    indices = np.reshape(y + dy, (-1, 1)), np.reshape(x + dx, (-1, 1)), np.reshape(z, (-1, 1))
+    return np.clip(map_coordinates(image, indices, order=1, mode='reflect').reshape(shape), 0, 1) * 255
+
+
+def none(image, severity=1):
+    return image
+
+# /////////////// End Distortions ///////////////
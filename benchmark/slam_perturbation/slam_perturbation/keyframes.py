@@ -0,0 +1,41 @@
+"""
+Overlap keyframe selection shared by Co-SLAM, nice-slam and SplaTAM (needs torch).
+
+Points sampled from the current frame are projected into all K keyframes at
+once, with one [K, 3, 4] x [N, 4] einsum on their device, instead of a
+Python loop that inverts and projects keyframe by keyframe.
+"""
+
+import numpy as np
+import torch
+
+
+def overlap_fractions(pts, w2c, intrinsics, H, W, edge=20, opengl=False):
+    """
+    Fraction of the points pts [N, 3] that land inside the image of each
+    keyframe, edge pixels excluded, as a [K] tensor.
+
+    w2c [K, 4, 4] are the world to camera poses of the keyframes and
+    intrinsics the 3x3 camera matrix. opengl cameras (Co-SLAM, nice-slam)
+    look down -z with y up, the others (SplaTAM) down +z.
+    """
+    pts = torch.as_tensor(pts, dtype=torch.float32)
+    w2c = torch.as_tensor(w2c, dtype=torch.float32, device=pts.device)
+    K = torch.as_tensor(intrinsics, dtype=torch.float32, device=pts.device)
+
+    pts4 = torch.cat([pts, torch.ones_like(pts[:, :1])], dim=-1)
+    cam = torch.einsum('kij,nj->kni', w2c[:, :3, :], pts4)  # [K, N, 3]
+    if opengl:
+        cam = cam * torch.tensor([-1., 1., 1.], device=pts.device)
+    uv = torch.einsum('ij,knj->kni', K, cam)
+    z = uv[..., 2] + 1e-5
+    u, v = uv[..., 0] / z, uv[..., 1] / z
+    inside = (u < W - edge) & (u > edge) & (v < H - edge) & (v > edge)
+    inside &= (z < 0) if opengl else (z > 0)
+    return inside.float().mean(dim=1)
+
+
+def select_overlapping(fractions, k):
+    """Up to k keyframe indices, in random order, among those with a positive overlap."""
+    fractions = torch.as_tensor(fractions).cpu().numpy()
+    return list(np.random.permutation(np.flatnonzero(fractions > 0))[:k])
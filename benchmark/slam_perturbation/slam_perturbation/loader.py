@@ -0,0 +1,112 @@
+"""
+Perturbation of a sequence as configured for a SLAM dataset loader.
+"""
+
+import os
+import random
+
+import numpy as np
+
+from . import registry
+from .cache import CACHED_STAGES, PerturbationCache, frame_digest, seed_all
+from .schedule import build_schedule, describe, load_schedule, save_schedule
+
+
+class FramePerturbation:
+    """
+    Holds the perturb_type / perturb_severity / perturb_dynamic setting of a
+    run. Loaders call sample() for every frame and pass the type, severity and
+    seed it returns to apply() at each stage of their pipeline: 'rgb' on the
+    decoded RGB frame, 'depth' on the raw depth map and 'metric_depth' once
+    depth is in metres. Stages a perturbation does not belong to return x
+    unchanged.
+
+    Per-frame settings come from a schedule drawn once from `seed` (see
+    schedule.py). With a schedule path it is read from there if the file
+    exists, so a run can be replayed, and written there otherwise. A saved
+    schedule of other settings raises.
+
+    With a cache (a PerturbationCache or its directory), 'rgb' and 'depth'
+    results are read from the entries materialize.py wrote for `seed`. A miss
+    is computed seeded from its entry key, as materialize.py does, so the
+    frame comes out the same whether or not it was materialized.
+    """
+
+    def __init__(self, perturb_type=registry.CLEAN_ID, severity=0, dynamic=0, cache=None, seed=0, schedule=None):
+        self.perturb_type = perturb_type
+        self.severity = severity
+        self.dynamic = dynamic
+        self.cache = PerturbationCache(cache) if isinstance(cache, str) else cache
+        self.seed = seed
+        self.schedule_path = schedule
+        self._schedule = None
+
+    @classmethod
+    def from_config(cls, cfg):
+        """
+        From a dict with perturb_type, perturb_severity and perturb_dynamic, and
+        optionally perturb_cache, perturb_seed and perturb_schedule; missing
+        keys mean clean.
+        """
+        cfg = {} if cfg is None else cfg
+        return cls(cfg.get('perturb_type', registry.CLEAN_ID),
+                   cfg.get('perturb_severity', 0),
+                   cfg.get('perturb_dynamic', 0),
+                   cfg.get('perturb_cache'),
+                   cfg.get('perturb_seed', 0),
+                   cfg.get('perturb_schedule'))
+
+    def __repr__(self):
+        return 'FramePerturbation(perturb_type=%r, severity=%r, dynamic=%r, cache=%r, seed=%r, schedule=%r)' % (
+            self.perturb_type, self.severity, self.dynamic, self.cache, self.seed, self.schedule_path)
+
+    def schedule(self, num_frames):
+        """The (type, severity, delay, seed) rows of a num_frames sequence, built or read on first use."""
+        if self._schedule is None:
+            if self.schedule_path is not None and os.path.exists(self.schedule_path):
+                schedule = load_schedule(self.schedule_path, self.perturb_type, self.severity, self.dynamic, self.seed)
+                if len(schedule) != num_frames:
+                    raise ValueError("%s schedules %i frames, the sequence has %i" % (
+                        self.schedule_path, len(schedule), num_frames))
+            else:
+                schedule = build_schedule(num_frames, self.perturb_type, self.severity, self.dynamic, self.seed)
+                if self.schedule_path is not None:
+                    save_schedule(self.schedule_path, schedule, self.perturb_type, self.severity, self.dynamic, self.seed)
+                if self.dynamic > 0:
+                    print("Perturbation schedule, " + describe(schedule))
+            self._schedule = schedule
+        return self._schedule
+
+    def sample(self, index, num_frames):
+        """(perturb_type, severity, seed) of frame `index`."""
+        row = self.schedule(num_frames)[index]
+        return int(row['type']), int(row['severity']), int(row['seed'])
+
+    def depth_index(self, index, num_frames):
+        """Frame whose depth is paired with RGB frame `index` (delayed under sensor misalignment)."""
+        delay = int(self.schedule(num_frames)[index]['delay'])
+        return max(0, min(index - delay, num_frames - 1))
+
+    def apply(self, x, stage, perturb_type, severity, seed=None):
+        """
+        Perturb x if the perturbation runs at `stage`; a seed makes the result
+        independent of call order. Cached stages seed from the cache key instead.
+        """
+        if stage not in registry.STAGES:
+            raise ValueError("Unknown perturbation stage: %s" % stage)
+        perturbation = registry.find(perturb_type)
+        if perturbation is None or perturbation.stage != stage:
+            return x
+        # imported here, so that python -m slam_perturbation.profiling does not import it twice
+        from . import profiling
+        with profiling.span('perturb'):
+            if self.cache is not None and stage in CACHED_STAGES:
+                key = self.cache.key(frame_digest(x), perturbation.name, severity, self.seed)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached if stage == registry.RGB else cached.astype(np.asarray(x).dtype, copy=False)
+                seed_all(key)
+            elif seed is not None:
+                random.seed(seed)
+                np.random.seed(seed)
+            return perturbation(x, severity)
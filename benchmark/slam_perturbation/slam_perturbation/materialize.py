@@ -0,0 +1,81 @@
+"""
+Write the perturbed RGB / depth streams of a perturbation matrix once into a
+PerturbationCache, for loaders configured with perturb_cache to read back.
+
+    python -m slam_perturbation.materialize --cache /data/perturb_cache \\
+        --rgb 'Replica/room0/results/frame*.jpg' --depth 'Replica/room0/results/depth*.png' \\
+        --perturb 0-16 20-23 --severity 1 3 5 --seed 0
+"""
+
+import os
+import glob
+import time
+import argparse
+from multiprocessing import Pool
+
+import cv2
+
+from . import registry
+from .registry import parse_perturbations
+from .cache import CACHED_STAGES, PerturbationCache, encode, frame_digest, seed_all
+
+
+def read_frame(path, stage):
+    """The frame as the dataset loaders decode it before perturbing."""
+    if stage == registry.RGB:
+        return cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+
+def materialize_frame(task):
+    """Compute the missing entries of one source frame; returns (written, skipped)."""
+    path, stage, jobs, root, seed = task
+    cache = PerturbationCache(root)
+    x = read_frame(path, stage)
+    digest = frame_digest(x)
+    written, skipped = 0, 0
+    for name, severity in jobs:
+        key = cache.key(digest, name, severity, seed)
+        if key in cache:
+            skipped += 1
+            continue
+        seed_all(key)
+        cache.put(key, encode(registry.get(name)(x, severity), stage))
+        written += 1
+    return written, skipped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Materialize perturbed frames into a content-addressed cache")
+    parser.add_argument("--cache",    help = "cache directory (perturb_cache of the loader configs)", required = True)
+    parser.add_argument("--rgb",      help = "glob patterns of RGB frames", nargs = '*', default = [])
+    parser.add_argument("--depth",    help = "glob patterns of raw depth maps", nargs = '*', default = [])
+    parser.add_argument("--perturb",  help = "perturbation names, IDs or ID ranges (0-16)", nargs = '+', default = ['0-16', '20-23'])
+    parser.add_argument("--severity", help = "severity levels", type = int, nargs = '+', default = [1, 2, 3, 4, 5])
+    parser.add_argument("--seed",     help = "seed (perturb_seed of the loader configs)", type = int, default = 0)
+    parser.add_argument("--workers",  help = "worker processes", type = int, default = os.cpu_count())
+    args = parser.parse_args()
+
+    perturbations = parse_perturbations(args.perturb)
+    for p in perturbations:
+        if p.stage not in CACHED_STAGES:
+            print("%s runs on the %s stage, which is not cached; skipped" % (p.name, p.stage))
+
+    tasks = []
+    for stage, patterns in ((registry.RGB, args.rgb), (registry.DEPTH, args.depth)):
+        jobs = [(p.name, severity) for p in perturbations if p.stage == stage for severity in args.severity]
+        if not jobs:
+            continue
+        paths = sorted(set(path for pattern in patterns for path in glob.glob(pattern)))
+        tasks += [(path, stage, jobs, args.cache, args.seed) for path in paths]
+        print("%s: %i frames x %i perturbation / severity pairs" % (stage, len(paths), len(jobs)))
+
+    start = time.time()
+    written, skipped = 0, 0
+    with Pool(args.workers) as pool:
+        for i, (w, s) in enumerate(pool.imap_unordered(materialize_frame, tasks), start=1):
+            written += w
+            skipped += s
+            if i % 100 == 0 or i == len(tasks):
+                print("%i/%i frames, %i entries written, %i already cached, %.1f s" % (
+                    i, len(tasks), written, skipped, time.time() - start))
@@ -0,0 +1,146 @@
+"""
+Memory-mapped packed frame store of a sequence.
+
+A packed sequence is a folder with
+
+    header.json   frame count and size, depth dtype and scale, intrinsics, source file names
+    rgb.npy       [N, H, W, 3] uint8, RGB order
+    depth.npy     [N, H, W] uint16 (png depth) or float16 (npy depth)
+    poses.npy     [N, 4, 4] float32, if a trajectory was given
+
+Loaders configured with packed_dir index the arrays through np.load(mmap_mode='r'),
+so a frame is a view into the page cache instead of a decode, and runs that
+read the same sequence on one node share the pages.
+
+    python -m slam_perturbation.packed --rgb 'room0/results/frame*.jpg' \\
+        --depth 'room0/results/depth*.png' --poses room0/traj.txt --depth_scale 6553.5 --out room0_packed
+"""
+
+import os
+import glob
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+HEADER = 'header.json'
+
+
+def read_rgb(path):
+    return cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+
+
+def read_depth(path):
+    if path.endswith('.npy'):
+        return np.load(path)
+    return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+
+def read_poses(path, num_frames):
+    """Row-major 4x4 camera-to-world matrices, one per line (Replica traj.txt)."""
+    poses = np.loadtxt(path, dtype=np.float64).reshape(-1, 4, 4)[:num_frames]
+    if len(poses) != num_frames:
+        raise ValueError("%s holds %i poses for %i frames" % (path, len(poses), num_frames))
+    return poses.astype(np.float32)
+
+
+def pack_sequence(rgb_files, depth_files, out_dir, poses=None, depth_scale=None, intrinsics=None, depth_dtype=None,
+                  workers=8):
+    """Decode the frames once into out_dir; returns the PackedSequence."""
+    if len(rgb_files) != len(depth_files):
+        raise ValueError("%i RGB frames but %i depth maps" % (len(rgb_files), len(depth_files)))
+    os.makedirs(out_dir, exist_ok=True)
+    first_rgb, first_depth = read_rgb(rgb_files[0]), read_depth(depth_files[0])
+    if depth_dtype is None:
+        depth_dtype = np.uint16 if first_depth.dtype.kind in 'iu' else np.float16
+    n = len(rgb_files)
+
+    rgb = np.lib.format.open_memmap(os.path.join(out_dir, 'rgb.npy'), 'w+', np.uint8, (n,) + first_rgb.shape)
+    depth = np.lib.format.open_memmap(os.path.join(out_dir, 'depth.npy'), 'w+', depth_dtype, (n,) + first_depth.shape)
+
+    def pack(i):
+        rgb[i] = read_rgb(rgb_files[i])
+        depth[i] = read_depth(depth_files[i])
+
+    # cv2 decodes outside the GIL
+    with ThreadPoolExecutor(workers) as pool:
+        for i, _ in enumerate(pool.map(pack, range(n))):
+            if i % 500 == 0:
+                print("Packed %i / %i" % (i, n))
+    rgb.flush()
+    depth.flush()
+    del rgb, depth
+
+    if poses is not None:
+        np.save(os.path.join(out_dir, 'poses.npy'), np.asarray(poses, dtype=np.float32))
+    header = {
+        'frames': n,
+        'height': int(first_rgb.shape[0]),
+        'width': int(first_rgb.shape[1]),
+        'depth_dtype': np.dtype(depth_dtype).name,
+        'depth_scale': depth_scale,
+        'intrinsics': intrinsics,
+        'rgb_files': [os.path.basename(f) for f in rgb_files],
+        'depth_files': [os.path.basename(f) for f in depth_files],
+    }
+    with open(os.path.join(out_dir, HEADER), 'w') as f:
+        json.dump(header, f, indent=1)
+    return PackedSequence(out_dir)
+
+
+class PackedSequence:
+    """Read-only, memory-mapped view of a packed sequence; rgb[i] and depth[i] are zero-copy."""
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, HEADER)) as f:
+            self.header = json.load(f)
+        self.rgb = np.load(os.path.join(root, 'rgb.npy'), mmap_mode='r')
+        self.depth = np.load(os.path.join(root, 'depth.npy'), mmap_mode='r')
+        poses = os.path.join(root, 'poses.npy')
+        self.poses = np.load(poses, mmap_mode='r') if os.path.exists(poses) else None
+
+    @classmethod
+    def from_config(cls, cfg):
+        """The sequence at cfg['packed_dir'], or None if it is unset."""
+        root = None if cfg is None else cfg.get('packed_dir')
+        return None if root is None else cls(root)
+
+    def __len__(self):
+        return self.header['frames']
+
+    def __repr__(self):
+        return 'PackedSequence(%r, frames=%i)' % (self.root, len(self))
+
+    @property
+    def rgb_files(self):
+        return self.header['rgb_files']
+
+    @property
+    def depth_files(self):
+        return self.header['depth_files']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack the RGB-D frames of a sequence into a memory-mapped store")
+    parser.add_argument("--rgb",         help = "glob pattern of the RGB frames", required = True)
+    parser.add_argument("--depth",       help = "glob pattern of the depth maps (png or npy)", required = True)
+    parser.add_argument("--out",         help = "output folder", required = True)
+    parser.add_argument("--poses",       help = "trajectory file with a row-major 4x4 pose per line", default = None)
+    parser.add_argument("--depth_scale", help = "depth units per metre (png_depth_scale)", type = float, default = None)
+    parser.add_argument("--intrinsics",  help = "H W fx fy cx cy", type = float, nargs = 6, default = None)
+    parser.add_argument("--float16",     help = "store depth as float16 even for integer maps", action = "store_true")
+    parser.add_argument("--workers",     help = "decoding threads", type = int, default = 8)
+    args = parser.parse_args()
+
+    rgb_files = sorted(glob.glob(args.rgb))
+    depth_files = sorted(glob.glob(args.depth))
+    poses = read_poses(args.poses, len(rgb_files)) if args.poses is not None else None
+    intrinsics = None
+    if args.intrinsics is not None:
+        intrinsics = dict(zip(['H', 'W', 'fx', 'fy', 'cx', 'cy'], args.intrinsics))
+    packed = pack_sequence(rgb_files, depth_files, args.out, poses, args.depth_scale, intrinsics,
+                           np.float16 if args.float16 else None, args.workers)
+    print(packed)
@@ -0,0 +1,169 @@
+"""
+Per-severity parameter tables of the perturbations.
+
+Every table holds one typed entry per severity level, so the parameters of
+level s are ``TABLE[s - 1]``.
+"""
+
+from typing import NamedTuple
+
+
+# /////////////// RGB ///////////////
+
+class NoiseParams(NamedTuple):
+    scale: float            # std of the additive / multiplicative gaussian
+
+
+class ShotNoiseParams(NamedTuple):
+    photons: float          # poisson rate at full intensity
+
+
+class ImpulseNoiseParams(NamedTuple):
+    amount: float           # fraction of salt & pepper pixels
+
+
+class GaussianBlurParams(NamedTuple):
+    sigma: float
+
+
+class GlassBlurParams(NamedTuple):
+    sigma: float
+    max_delta: int          # largest pixel displacement of the shuffle
+    iterations: int
+
+
+class DefocusBlurParams(NamedTuple):
+    radius: float
+    alias_blur: float
+
+
+class MotionBlurParams(NamedTuple):
+    radius: float
+    sigma: float
+
+
+class ZoomBlurParams(NamedTuple):
+    max_zoom: float         # zoom factors are arange(1, max_zoom, step)
+    step: float
+
+
+class FogParams(NamedTuple):
+    intensity: float
+    wibbledecay: float
+
+
+class FrostParams(NamedTuple):
+    image_weight: float
+    frost_weight: float
+
+
+class SnowParams(NamedTuple):
+    loc: float
+    scale: float
+    zoom: float
+    threshold: float
+    blur_radius: float
+    blur_sigma: float
+    blend: float
+
+
+class SpatterParams(NamedTuple):
+    loc: float
+    scale: float
+    sigma: float
+    threshold: float
+    intensity: float
+    mud: int                # 0: water, 1: mud
+
+
+class ContrastParams(NamedTuple):
+    factor: float
+
+
+class BrightnessParams(NamedTuple):
+    shift: float
+
+
+class SaturateParams(NamedTuple):
+    scale: float
+    shift: float
+
+
+class JpegParams(NamedTuple):
+    quality: int
+
+
+class PixelateParams(NamedTuple):
+    scale: float
+
+
+class ElasticParams(NamedTuple):
+    alpha: float            # in units of ELASTIC_SIZE
+    sigma: float
+    affine: float
+
+
+GAUSSIAN_NOISE_STRONG = tuple(NoiseParams(c) for c in [0.4, 0.6, .8, .9, 1.0])
+GAUSSIAN_NOISE = tuple(NoiseParams(c) for c in [.08, .12, 0.18, 0.26, 0.38])
+SHOT_NOISE = tuple(ShotNoiseParams(c) for c in [60, 25, 12, 5, 3])
+IMPULSE_NOISE = tuple(ImpulseNoiseParams(c) for c in [.03, .06, .09, 0.17, 0.27])
+SPECKLE_NOISE = tuple(NoiseParams(c) for c in [.15, .2, 0.35, 0.45, 0.6])
+GAUSSIAN_BLUR = tuple(GaussianBlurParams(c) for c in [1, 2, 3, 4, 6])
+GLASS_BLUR = tuple(GlassBlurParams(*c) for c in [(0.7, 1, 2), (0.9, 2, 1), (1, 2, 3), (1.1, 3, 2), (1.5, 4, 2)])
+DEFOCUS_BLUR = tuple(DefocusBlurParams(*c) for c in [(3, 0.1), (4, 0.5), (6, 0.5), (8, 0.5), (10, 0.5)])
+MOTION_BLUR = tuple(MotionBlurParams(*c) for c in [(10, 3), (15, 5), (15, 8), (15, 12), (20, 15)])
+ZOOM_BLUR = tuple(ZoomBlurParams(*c) for c in [(1.11, 0.01), (1.16, 0.01), (1.21, 0.02), (1.26, 0.02), (1.31, 0.03)])
+FOG = tuple(FogParams(*c) for c in [(1.5, 2), (2, 2), (2.5, 1.7), (2.5, 1.5), (3, 1.4)])
+FROST = tuple(FrostParams(*c) for c in [(1, 0.4), (0.8, 0.6), (0.7, 0.7), (0.65, 0.7), (0.6, 0.75)])
+SNOW = tuple(SnowParams(*c) for c in [(0.1, 0.3, 3, 0.5, 10, 4, 0.8),
+                                      (0.2, 0.3, 2, 0.5, 12, 4, 0.7),
+                                      (0.55, 0.3, 4, 0.9, 12, 8, 0.7),
+                                      (0.55, 0.3, 4.5, 0.85, 12, 8, 0.65),
+                                      (0.55, 0.3, 2.5, 0.85, 12, 12, 0.55)])
+SPATTER = tuple(SpatterParams(*c) for c in [(0.65, 0.3, 4, 0.69, 0.6, 0),
+                                            (0.65, 0.3, 3, 0.68, 0.6, 0),
+                                            (0.65, 0.3, 2, 0.68, 0.5, 0),
+                                            (0.65, 0.3, 1, 0.65, 1.5, 1),
+                                            (0.67, 0.4, 1, 0.65, 1.5, 1)])
+CONTRAST = tuple(ContrastParams(c) for c in [0.4, .3, .2, .1, .05])
+BRIGHTNESS = tuple(BrightnessParams(c) for c in [.1, .2, .3, .4, .5])
+SATURATE = tuple(SaturateParams(*c) for c in [(0.3, 0), (0.1, 0), (2, 0), (5, 0.1), (20, 0.2)])
+JPEG_COMPRESSION = tuple(JpegParams(c) for c in [25, 18, 15, 10, 7])
+PIXELATE = tuple(PixelateParams(c) for c in [0.6, 0.5, 0.4, 0.3, 0.25])
+ELASTIC_TRANSFORM = tuple(ElasticParams(*c) for c in [(2, 0.7, 0.1),
+                                                      (2, 0.08, 0.2),
+                                                      (0.05, 0.01, 0.02),
+                                                      (0.07, 0.01, 0.02),
+                                                      (0.12, 0.01, 0.02)])
+
+
+# /////////////// Depth ///////////////
+
+class DepthNoiseParams(NamedTuple):
+    factor: float           # noise mean and std relative to the frame's
+
+
+class EdgeErosionParams(NamedTuple):
+    rate: float             # fraction of edge pixels that seed a hole
+    patch_len: int          # half size of the hole around a seed
+
+
+class MaskParams(NamedTuple):
+    count: int              # number of rectangles
+    scale: float            # rectangle size relative to the frame
+
+
+class DepthRangeParams(NamedTuple):
+    near: float             # [m]
+    far: float              # [m]
+
+
+DEPTH_GAUSSIAN_NOISE = tuple(DepthNoiseParams(c) for c in [0.1, 0.2, 0.3, 0.4, 0.5])
+DEPTH_EDGE_EROSION = tuple(EdgeErosionParams(*c) for c in [(0.015, 3), (0.020, 3), (0.025, 3), (0.03, 3), (0.035, 3)])
+# the dataset loaders place 10 rectangles at every level
+DEPTH_RANDOM_MASK = tuple(MaskParams(10, 0.1) for _ in range(5))
+DEPTH_FIXED_MASK = tuple(MaskParams(c, 0.1) for c in [5, 7, 9, 11, 13])
+DEPTH_RANGE = tuple(DepthRangeParams(*c) for c in [(0.2, 4.4), (0.3, 4.2), (0.4, 4.0), (0.5, 3.8), (0.6, 3.6)])
+# the published ORB-SLAM3 depth runs: 5..13 rectangles, and a far limit growing with the severity
+DEPTH_RANDOM_MASK_ORB = tuple(MaskParams(c, 0.1) for c in [5, 7, 9, 11, 13])
+DEPTH_RANGE_ORB = tuple(DepthRangeParams(*c) for c in [(0.2, 3.0), (0.3, 3.2), (0.4, 3.4), (0.5, 3.6), (0.6, 3.8)])
@@ -0,0 +1,432 @@
+"""
+Run profiling shared by the SLAM entry points: named spans, counters and
+memory samples, and an optional torch profiler capture over a frame window.
+
+    from slam_perturbation import profiling
+    profiling.configure('out/profile', torch_window='100:110')   # --profile / --profile_torch
+    for idx, batch in enumerate(profiling.iterate(loader)):       # 'data load' spans
+        profiling.frame(idx)
+        with profiling.span('track'):
+            for it in profiling.iterations(range(iters), 'track iter'):
+                ...
+        profiling.count('keyframes')
+
+The span names the systems share are 'data load', 'perturb', 'track',
+'track iter', 'map', 'map iter', 'BA', 'BA iter', 'mesh' and 'eval'.
+
+Profiling is off unless configured. A disabled span is a shared no-op
+context, so the calls can stay in the hot loops. configure() also sets
+SLAM_PROFILE (and SLAM_PROFILE_TORCH, SLAM_PROFILE_SYNC), so the processes a
+run spawns profile themselves into the same folder. Each process writes, at
+exit:
+
+    trace_<process>_<pid>.json      Chrome trace events (chrome://tracing, Perfetto)
+    summary_<process>_<pid>.txt     time per span and its share of the wall clock, counters, peak memory
+    summary_<process>_<pid>.json
+    torch_<process>_<pid>.json      torch profiler trace of the frame window, if any
+
+`python -m slam_perturbation.profiling DIR` merges the traces of all
+processes into DIR/trace.json and prints the summary of every process.
+
+CUDA kernels run asynchronously, so a span times the launches unless
+cuda_sync synchronizes at its ends, which slows the run down.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import atexit
+import argparse
+import threading
+from array import array
+import multiprocessing
+from multiprocessing import util
+
+ENV = 'SLAM_PROFILE'
+ENV_TORCH = 'SLAM_PROFILE_TORCH'
+ENV_SYNC = 'SLAM_PROFILE_SYNC'
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start', 'record')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        if self.profiler.torch_profile is not None:
+            # shows the span in the torch trace too
+            import torch
+            self.record = torch.autograd.profiler.record_function(self.name)
+            self.record.__enter__()
+        self.start = self.profiler.begin(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.end(self.name, self.start)
+        if self.record is not None:
+            self.record.__exit__(*exc)
+        return False
+
+
+def _torch():
+    # torch is only asked if the run imported it
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        return torch
+    return None
+
+
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Profiler:
+    """
+    Spans, counters and memory samples of one process, kept in memory and
+    written to out_dir by save(). Disabled if out_dir is None.
+    """
+
+    def __init__(self, out_dir=None, name=None, torch_window=None, cuda_sync=False,
+                 memory_interval=1., max_events=2000000):
+        self.out_dir = out_dir
+        self.enabled = out_dir is not None
+        # None names the profile after the multiprocessing process at save time
+        self.name = name
+        self.torch_window = _parse_window(torch_window)
+        self.cuda_sync = cuda_sync
+        self.memory_interval = memory_interval
+        self.max_events = max_events
+        self.torch_profile = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    def __repr__(self):
+        return 'Profiler(%r, name=%r)' % (self.out_dir, self.process_name())
+
+    def process_name(self):
+        return self.name or multiprocessing.current_process().name
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        # the trace in flat arrays, a list of tuples would keep the garbage collector busy
+        self.names = {}                         # name: index in event_names
+        self.event_names = array('I')
+        self.event_starts = array('d')          # seconds from origin
+        self.event_durations = array('d')
+        self.event_threads = array('Q')
+        self.dropped = 0
+        self.stats = {}                         # name: [total, count, max]
+        self.counters = {}
+        self.memory = []            # (time, rss, cuda)
+        self.peak = {'rss': 0, 'cuda': 0}
+        self.last_sample = -self.memory_interval
+        self.frames = 0
+        self.saved = False
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def begin(self, name):
+        """Start time of a span ended by end(name, start); None if disabled."""
+        if not self.enabled:
+            return None
+        if self.cuda_sync:
+            torch = _torch()
+            if torch is not None:
+                torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def end(self, name, start):
+        if start is None:
+            return
+        torch = _torch() if self.cuda_sync else None
+        if torch is not None:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        duration = now - start
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = [0., 0, 0.]
+                self.names[name] = len(self.names)
+            stats[0] += duration
+            stats[1] += 1
+            if duration > stats[2]:
+                stats[2] = duration
+            if len(self.event_starts) < self.max_events:
+                self.event_names.append(self.names[name])
+                self.event_starts.append(start - self.origin)
+                self.event_durations.append(duration)
+                self.event_threads.append(threading.get_ident())
+            else:
+                self.dropped += 1
+        if now - self.origin - self.last_sample >= self.memory_interval:
+            self.sample_memory()
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def sample_memory(self):
+        if not self.enabled:
+            return
+        t = time.perf_counter() - self.origin
+        self.last_sample = t
+        rss = _rss()
+        torch = _torch()
+        cuda = torch.cuda.memory_allocated() if torch is not None else 0
+        self.memory.append((t, rss, cuda))
+        self.peak['rss'] = max(self.peak['rss'], rss)
+        if torch is not None:
+            self.peak['cuda'] = max(self.peak['cuda'], torch.cuda.max_memory_allocated())
+
+    def frame(self, idx):
+        """Mark the start of frame idx: counts frames and starts / stops the torch profiler window."""
+        if not self.enabled:
+            return
+        self.frames += 1
+        if self.torch_window is None:
+            return
+        start, end = self.torch_window
+        if start <= idx < end and self.torch_profile is None:
+            import torch.profiler
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.torch_profile = torch.profiler.profile(activities=activities, profile_memory=True)
+            self.torch_profile.__enter__()
+        elif idx >= end and self.torch_profile is not None:
+            self.stop_torch()
+
+    def stop_torch(self):
+        profile, self.torch_profile = self.torch_profile, None
+        # one window per process
+        self.torch_window = None
+        profile.__exit__(None, None, None)
+        os.makedirs(self.out_dir, exist_ok=True)
+        profile.export_chrome_trace(self.path('torch', 'json'))
+        sort_by = 'cuda_time_total' if _torch() is not None else 'cpu_time_total'
+        with open(self.path('torch', 'txt'), 'w') as f:
+            f.write(profile.key_averages().table(sort_by=sort_by, row_limit=50))
+
+    def path(self, kind, ext):
+        name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in self.process_name())
+        return os.path.join(self.out_dir, '%s_%s_%i.%s' % (kind, name, self.pid, ext))
+
+    def summary(self):
+        """Per span count, total, mean, max and share of the wall clock, the counters and the peak memory."""
+        wall = time.perf_counter() - self.origin
+        spans = dict((name, {'count': count, 'total': total, 'mean': total / count, 'max': maximum,
+                             'share': total / wall if wall > 0 else 0.})
+                     for name, (total, count, maximum) in sorted(self.stats.items(), key=lambda item: -item[1][0]))
+        return {'process': self.process_name(), 'pid': self.pid, 'wall': wall, 'frames': self.frames, 'spans': spans,
+                'counters': dict(self.counters), 'peak_memory': dict(self.peak), 'dropped_events': self.dropped}
+
+    def save(self):
+        if not self.enabled or self.saved or os.getpid() != self.pid:
+            return
+        self.saved = True
+        if self.torch_profile is not None:
+            self.stop_torch()
+        self.sample_memory()
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary = self.summary()
+        with open(self.path('summary', 'json'), 'w') as f:
+            json.dump(summary, f, indent=4)
+        with open(self.path('summary', 'txt'), 'w') as f:
+            f.write(format_summary(summary))
+        with open(self.path('trace', 'json'), 'w') as f:
+            f.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+            f.write(',\n'.join(self.trace_events()))
+            f.write('\n]}\n')
+
+    def trace_events(self):
+        """The Chrome trace events as JSON strings, formatted directly, json.dumps is slow for millions of spans."""
+        names = dict((i, json.dumps(name)) for name, i in self.names.items())
+        threads = {}
+        for thread in self.event_threads:
+            threads.setdefault(thread, len(threads))
+        events = [json.dumps({'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': self.process_name()}})]
+        span = '{"name": %%s, "ph": "X", "ts": %%.3f, "dur": %%.3f, "pid": %i, "tid": %%i}' % self.pid
+        # perf_counter is the monotonic clock of the machine, so the traces of the processes line up
+        events += [span % (names[name], (self.origin + start) * 1e6, duration * 1e6, threads[thread])
+                   for name, start, duration, thread in zip(self.event_names, self.event_starts,
+                                                            self.event_durations, self.event_threads)]
+        events += [json.dumps({'name': 'memory [MB]', 'ph': 'C', 'ts': (self.origin + t) * 1e6, 'pid': self.pid,
+                               'args': {'rss': rss / 2 ** 20, 'cuda': cuda / 2 ** 20}})
+                   for t, rss, cuda in self.memory]
+        return events
+
+
+def format_summary(summary):
+    lines = ['%s (pid %i): %.1f s wall, %i frames' % (summary['process'], summary['pid'], summary['wall'], summary['frames']),
+             '%-16s %8s %11s %10s %10s %7s' % ('span', 'count', 'total [s]', 'mean [ms]', 'max [ms]', 'wall %')]
+    for name, s in summary['spans'].items():
+        lines.append('%-16s %8i %11.2f %10.2f %10.2f %7.1f' % (name, s['count'], s['total'], s['mean'] * 1e3,
+                                                              s['max'] * 1e3, s['share'] * 100))
+    if summary['counters']:
+        lines.append('counters: ' + ', '.join('%s %s' % item for item in sorted(summary['counters'].items())))
+    peak = summary['peak_memory']
+    lines.append('peak memory: rss %.2f GB, cuda %.2f GB' % (peak['rss'] / 2 ** 30, peak['cuda'] / 2 ** 30))
+    if summary['dropped_events']:
+        lines.append('%i spans not in the trace (max_events), still in the table' % summary['dropped_events'])
+    return '\n'.join(lines) + '\n'
+
+
+def _parse_window(window):
+    """(start, end) frames of 'start:end', None for None or ''."""
+    if not window:
+        return None
+    if isinstance(window, str):
+        start, end = window.split(':')
+        return int(start), int(end)
+    return tuple(window)
+
+
+_profiler = Profiler()
+
+
+def configure(out_dir, name=None, torch_window=None, cuda_sync=False):
+    """
+    Profile this process into out_dir, None to leave profiling off, and the
+    processes it starts from now on. Returns the profiler.
+    """
+    global _profiler
+    if out_dir is None:
+        return _profiler
+    out_dir = os.path.abspath(out_dir)
+    os.environ[ENV] = out_dir
+    os.environ[ENV_TORCH] = torch_window or ''
+    os.environ[ENV_SYNC] = '1' if cuda_sync else ''
+    _profiler = Profiler(out_dir, name, torch_window, cuda_sync)
+    atexit.register(_save)
+    # multiprocessing children leave through os._exit, but run the finalizers first
+    util.Finalize(None, _save, exitpriority=0)
+    util.register_after_fork(_profiler, _after_fork)
+    return _profiler
+
+
+def _save():
+    _profiler.save()
+
+
+def _after_fork(profiler):
+    # a forked multiprocessing child profiles itself from scratch, its finalizers were cleared
+    profiler.name = None
+    profiler.reset()
+    util.Finalize(None, _save, exitpriority=0)
+
+
+def get():
+    return _profiler
+
+
+def enabled():
+    return _profiler.enabled
+
+
+def span(name):
+    return _profiler.span(name)
+
+
+def begin(name):
+    return _profiler.begin(name)
+
+
+def end(name, start):
+    _profiler.end(name, start)
+
+
+def count(name, value=1):
+    _profiler.count(name, value)
+
+
+def frame(idx):
+    _profiler.frame(idx)
+
+
+def iterate(iterable, name='data load'):
+    """iterable, with a span around every next(); iterable itself when profiling is off."""
+    if not _profiler.enabled:
+        return iterable
+    return _iterate(iterable, name)
+
+
+def _iterate(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        start = _profiler.begin(name)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _profiler.end(name, start)
+        yield item
+
+
+def iterations(iterable, name):
+    """
+    iterable, with a span around the loop body run on every item, ended by
+    the next item or by leaving the loop; iterable itself when profiling is off.
+    """
+    if not _profiler.enabled:
+        return iterable
+    return _iterations(iterable, name)
+
+
+def _iterations(iterable, name):
+    for item in iterable:
+        start = _profiler.begin(name)
+        try:
+            yield item
+        finally:
+            # also runs on break, when the loop drops the generator
+            _profiler.end(name, start)
+
+
+# processes started by a profiled run
+if os.environ.get(ENV) and __name__ != '__main__':
+    configure(os.environ[ENV], torch_window=os.environ.get(ENV_TORCH), cuda_sync=bool(os.environ.get(ENV_SYNC)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge the per-process traces of a profiled run and print its summaries")
+    parser.add_argument("dir", help = "--profile folder of the run")
+    args = parser.parse_args()
+
+    events = []
+    for path in sorted(glob.glob(os.path.join(args.dir, 'trace_*.json'))):
+        with open(path) as f:
+            events += json.load(f)['traceEvents']
+    with open(os.path.join(args.dir, 'trace.json'), 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    for path in sorted(glob.glob(os.path.join(args.dir, 'summary_*.json'))):
+        with open(path) as f:
+            print(format_summary(json.load(f)))
+    print("Merged trace saved to", os.path.join(args.dir, 'trace.json'))
@@ -0,0 +1,144 @@
+"""
+Name / ID registry of the perturbations.
+
+The IDs are the `perturb_type` values used by the configs and sweep scripts of
+all SLAM systems. Each entry records at which stage of a loader it applies:
+
+    rgb            the decoded RGB frame
+    depth          the raw depth map, before it is scaled to metres
+    metric_depth   the depth map in metres
+    sync           the depth stream is delayed by `severity` frames
+    clean          nothing is applied
+
+The methods are resolved on first use, so importing the registry does not
+import opencv, skimage, scipy or wand.
+"""
+
+import importlib
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from . import params
+
+RGB = 'rgb'
+DEPTH = 'depth'
+METRIC_DEPTH = 'metric_depth'
+SYNC = 'sync'
+CLEAN = 'clean'
+
+STAGES = (RGB, DEPTH, METRIC_DEPTH, SYNC, CLEAN)
+
+# perturb_type of the unperturbed and the sensor misalignment setting
+CLEAN_ID = 17
+SENSOR_MISALIGNMENT_ID = 18
+
+_MODULES = {RGB: 'image', CLEAN: 'image', DEPTH: 'depth', METRIC_DEPTH: 'depth'}
+
+
+class Perturbation(NamedTuple):
+    name: str
+    id: Optional[int]           # perturb_type, None for name-only entries
+    stage: str
+    table: Optional[tuple]      # per-severity parameters, see params
+
+    @property
+    def method(self):
+        """The perturbation method `f(x, severity)`, None for sync."""
+        if self.stage not in _MODULES:
+            return None
+        module = importlib.import_module('.' + _MODULES[self.stage], __package__)
+        return getattr(module, self.name)
+
+    def params(self, severity):
+        return self.table[severity - 1]
+
+    def __call__(self, x, severity=1):
+        if self.stage in (SYNC, CLEAN):
+            return x
+        return np.asarray(self.method(x, severity))
+
+
+PERTURBATIONS = (
+    Perturbation('brightness',               0,    RGB,          params.BRIGHTNESS),
+    Perturbation('contrast',                 1,    RGB,          params.CONTRAST),
+    Perturbation('spatter',                  2,    RGB,          params.SPATTER),
+    Perturbation('zoom_blur',                3,    RGB,          params.ZOOM_BLUR),
+    Perturbation('motion_blur',              4,    RGB,          params.MOTION_BLUR),
+    Perturbation('defocus_blur',             5,    RGB,          params.DEFOCUS_BLUR),
+    Perturbation('gaussian_noise',           6,    RGB,          params.GAUSSIAN_NOISE),
+    Perturbation('shot_noise',               7,    RGB,          params.SHOT_NOISE),
+    Perturbation('impulse_noise',            8,    RGB,          params.IMPULSE_NOISE),
+    Perturbation('speckle_noise',            9,    RGB,          params.SPECKLE_NOISE),
+    Perturbation('gaussian_blur',            10,   RGB,          params.GAUSSIAN_BLUR),
+    Perturbation('glass_blur',               11,   RGB,          params.GLASS_BLUR),
+    Perturbation('fog',                      12,   RGB,          params.FOG),
+    Perturbation('frost',                    13,   RGB,          params.FROST),
+    Perturbation('snow',                     14,   RGB,          params.SNOW),
+    Perturbation('jpeg_compression',         15,   RGB,          params.JPEG_COMPRESSION),
+    Perturbation('pixelate',                 16,   RGB,          params.PIXELATE),
+    Perturbation('none',                     17,   CLEAN,        None),
+    Perturbation('sensor_misalignment',      18,   SYNC,         None),
+    Perturbation('depth_add_gaussian_noise', 20,   DEPTH,        params.DEPTH_GAUSSIAN_NOISE),
+    Perturbation('depth_add_edge_erosion',   21,   DEPTH,        params.DEPTH_EDGE_EROSION),
+    Perturbation('depth_add_random_mask',    22,   DEPTH,        params.DEPTH_RANDOM_MASK),
+    Perturbation('depth_add_fixed_mask',     23,   DEPTH,        params.DEPTH_FIXED_MASK),
+    Perturbation('depth_range',              24,   METRIC_DEPTH, params.DEPTH_RANGE),
+    # the tables and patches of the published ORB-SLAM3 depth runs, which differ from the loaders'
+    Perturbation('depth_add_edge_erosion_orb', None, DEPTH,      params.DEPTH_EDGE_EROSION),
+    Perturbation('depth_add_random_mask_orb', None, DEPTH,       params.DEPTH_RANDOM_MASK_ORB),
+    Perturbation('depth_range_orb',          None, METRIC_DEPTH, params.DEPTH_RANGE_ORB),
+    # not part of the benchmark sweeps
+    Perturbation('saturate',                 None, RGB,          params.SATURATE),
+    Perturbation('elastic_transform',        None, RGB,          params.ELASTIC_TRANSFORM),
+    Perturbation('gaussian_noise_strong',    None, RGB,          params.GAUSSIAN_NOISE_STRONG),
+)
+
+_BY_NAME = {p.name: p for p in PERTURBATIONS}
+_BY_ID = {p.id: p for p in PERTURBATIONS if p.id is not None}
+
+
+def find(key):
+    """The perturbation with name or ID `key`, None if there is none."""
+    if isinstance(key, str):
+        return _BY_NAME.get(key)
+    return _BY_ID.get(int(key))
+
+
+def get(key):
+    """The perturbation with name or ID `key`."""
+    perturbation = find(key)
+    if perturbation is None:
+        raise KeyError("Unknown perturbation: %r" % (key,))
+    return perturbation
+
+
+def parse_perturbations(tokens):
+    """Perturbations from names, IDs and ID ranges like 0-16."""
+    perturbations = []
+    for token in tokens:
+        token = str(token)
+        if '-' in token and token.replace('-', '').isdigit():
+            start, end = token.split('-')
+            keys = range(int(start), int(end) + 1)
+        else:
+            keys = [int(token) if token.isdigit() else token]
+        for key in keys:
+            p = find(key)
+            if p is None:
+                # the ID tables have holes (19)
+                if not isinstance(key, int):
+                    raise KeyError("Unknown perturbation: %s" % key)
+                continue
+            if p not in perturbations:
+                perturbations.append(p)
+    return perturbations
+
+
+def names(stage=None):
+    return [p.name for p in PERTURBATIONS if stage is None or p.stage == stage]
+
+
+def perturb(x, key, severity=1):
+    """Apply perturbation `key` (name or ID) at `severity`, returned as an array."""
+    return get(key)(x, severity)
@@ -0,0 +1,427 @@
+"""
+Structured per-run result records and the SQLite store they are appended to.
+
+Every SLAM entry point ends with record_run(): the ATE / RPE of the estimated
+trajectory, the per-frame errors, the timings and the peak memory go with the
+config and the perturbation into a RunRecord. The record is written as
+run_record.json next to the outputs of the run, and appended to the store if
+one is given (--results_db of the entry points, or SLAM_RESULTS_DB).
+
+The store keeps one row per run: the settings and metrics the analyses filter
+and group on are indexed columns, the rest is JSON, and the per-frame errors
+sit in a side table. Aggregating all runs is one query instead of a crawl of
+the output folders:
+
+    store = ResultStore('results.db')
+    store.aggregate('ate_rmse', by=('system', 'perturbation', 'severity'))
+    store.query(['scene', 'ate_rmse'], system='coslam', severity=[3, 5])
+
+Run IDs hash the run settings, so a rerun replaces its row and a sweep can
+tell which runs already have a record. Records written on other machines are
+merged with ResultStore.ingest().
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from . import registry, trajectory
+
+RECORD_FILE = 'run_record.json'
+DB_ENV = 'SLAM_RESULTS_DB'
+
+# columns of the runs table
+COLUMNS = (
+    ('run_id', 'TEXT PRIMARY KEY'),
+    ('system', 'TEXT'),
+    ('scene', 'TEXT'),
+    ('variant', 'TEXT'),
+    ('perturbation', 'TEXT'),
+    ('perturb_type', 'INTEGER'),
+    ('severity', 'INTEGER'),
+    ('dynamic', 'INTEGER'),
+    ('downsample', 'INTEGER'),
+    ('seed', 'INTEGER'),
+    ('status', 'TEXT'),
+    ('created', 'REAL'),
+    ('frames', 'INTEGER'),
+    ('ate_rmse', 'REAL'),
+    ('ate_mean', 'REAL'),
+    ('ate_median', 'REAL'),
+    ('ate_max', 'REAL'),
+    ('rpe_trans_rmse', 'REAL'),
+    ('rpe_rot_rmse', 'REAL'),
+    ('wall_time', 'REAL'),
+    ('peak_rss', 'INTEGER'),
+    ('peak_cuda', 'INTEGER'),
+    ('output_dir', 'TEXT'),
+    ('metrics', 'TEXT'),
+    ('timings', 'TEXT'),
+    ('memory', 'TEXT'),
+    ('config', 'TEXT'),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+INDEXES = (('system', 'scene', 'perturbation', 'severity', 'dynamic'),
+           ('perturbation', 'severity', 'dynamic'))
+
+# metric columns and the RunRecord.metrics entries they hold
+METRIC_COLUMNS = {
+    'frames': 'compared_pose_pairs',            # poses compared by the ATE
+    'ate_rmse': 'absolute_translational_error.rmse',
+    'ate_mean': 'absolute_translational_error.mean',
+    'ate_median': 'absolute_translational_error.median',
+    'ate_max': 'absolute_translational_error.max',
+    'rpe_trans_rmse': 'relative_translational_error.rmse',
+    'rpe_rot_rmse': 'relative_rotational_error.rmse',
+}
+
+
+def run_id(system, scene, perturb_type, severity, dynamic, downsample=1, seed=0, variant=''):
+    """ID of a run: hash of the settings that tell it apart from the other runs of a sweep."""
+    key = '%s_%s_%s_%i_%i_%i_%i_%i' % (system, scene, variant, perturb_type, severity, dynamic, downsample, seed)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+class RunRecord(NamedTuple):
+    system: str                             # coslam, nice-slam, splatam, go-slam, ...
+    scene: str
+    perturb_type: int
+    severity: int
+    dynamic: int
+    downsample: int = 1
+    seed: int = 0
+    variant: str = ''                       # anything else telling runs apart, e.g. imap
+    status: str = 'ok'                      # 'failed' if there was no trajectory to evaluate
+    metrics: Optional[dict] = None          # scalars, the ATE / RPE statistics of evaluate() and others
+    frame_errors: Optional[np.ndarray] = None   # ATE of every compared frame
+    timings: Optional[dict] = None          # seconds, 'wall' for the whole run
+    memory: Optional[dict] = None           # peak bytes, see peak_memory
+    config: Optional[dict] = None
+    output_dir: Optional[str] = None
+    created: float = 0.
+
+    @property
+    def run_id(self):
+        return run_id(self.system, self.scene, self.perturb_type, self.severity, self.dynamic,
+                      self.downsample, self.seed, self.variant)
+
+    @property
+    def perturbation(self):
+        p = registry.find(self.perturb_type)
+        return p.name if p is not None else str(self.perturb_type)
+
+    def to_json(self):
+        d = self._asdict()
+        if self.frame_errors is not None:
+            d['frame_errors'] = np.asarray(self.frame_errors).tolist()
+        d['run_id'] = self.run_id
+        d['perturbation'] = self.perturbation
+        return d
+
+    @classmethod
+    def from_json(cls, d):
+        d = dict((k, v) for k, v in d.items() if k in cls._fields)
+        if d.get('frame_errors') is not None:
+            d['frame_errors'] = np.asarray(d['frame_errors'], dtype=np.float32)
+        return cls(**d)
+
+    def row(self):
+        """Values of COLUMNS."""
+        metrics = self.metrics or {}
+        timings = self.timings or {}
+        memory = self.memory or {}
+        values = dict(self._asdict(), run_id=self.run_id, perturbation=self.perturbation,
+                      wall_time=timings.get('wall'), peak_rss=memory.get('rss'), peak_cuda=memory.get('cuda'),
+                      metrics=_dumps(metrics), timings=_dumps(timings), memory=_dumps(memory),
+                      config=_dumps(self.config))
+        for column, key in METRIC_COLUMNS.items():
+            values[column] = metrics.get(key)
+        return tuple(values[name] for name in COLUMN_NAMES)
+
+
+def _json_default(o):
+    # configs hold numpy scalars and the odd path object
+    if isinstance(o, (np.generic, np.ndarray)):
+        return o.tolist()
+    return str(o)
+
+
+def _dumps(x):
+    return json.dumps(x, default=_json_default)
+
+
+def evaluate(gt, est, valid=None, with_scale=False, delta=1):
+    """
+    ATE and RPE of one trajectory, est [n, 4, 4] poses against gt, over the
+    poses where valid [n] is set. Returns the statistics of trajectory.ate
+    and trajectory.rpe as floats, with the Sim3 scale if with_scale, and the
+    ATE of every compared pose.
+    """
+    gt = np.asarray(gt, dtype=np.float64)[None]
+    est = np.asarray(est, dtype=np.float64)[None]
+    if valid is not None:
+        valid = np.asarray(valid, dtype=bool)[None]
+    _, _, trans_error, scale = trajectory.align_batch(trajectory.positions(est).transpose(0, 2, 1),
+                                                      trajectory.positions(gt).transpose(0, 2, 1),
+                                                      with_scale, valid)
+    results = trajectory.error_stats(trans_error, valid)
+    if with_scale:
+        results['scale'] = scale
+        est = est.copy()
+        est[..., :3, 3] *= scale[:, None, None]
+    if est.shape[1] > delta:
+        results.update(trajectory.rpe(gt, est, delta, valid))
+    metrics = dict((k, v[0].item()) for k, v in results.items())
+    frame_errors = trans_error[0] if valid is None else trans_error[0][valid[0]]
+    return metrics, frame_errors.astype(np.float32)
+
+
+def peak_memory():
+    """Peak RSS of this process and its joined children, and peak CUDA allocation of this process, in bytes."""
+    memory = {}
+    try:
+        import resource
+        rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # kilobytes on linux, bytes on macos
+        memory['rss'] = rss if sys.platform == 'darwin' else rss * 1024
+    except ImportError:
+        pass
+    # torch is only asked if the run imported it
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        memory['cuda'] = max(torch.cuda.max_memory_allocated(d) for d in range(torch.cuda.device_count()))
+    return memory
+
+
+def write_record(record, output_dir):
+    path = os.path.join(output_dir, RECORD_FILE)
+    os.makedirs(output_dir, exist_ok=True)
+    tmp = '%s.%i.tmp' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(record.to_json(), f, indent=4, default=_json_default)
+    os.replace(tmp, path)
+    return path
+
+
+def read_record(output_dir):
+    """The record of the run writing to output_dir, None if it has none."""
+    try:
+        with open(os.path.join(output_dir, RECORD_FILE)) as f:
+            return RunRecord.from_json(json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def record_run(system, scene, robustness, gt=None, est=None, valid=None, with_scale=False,
+               downsample=1, variant='', metrics=None, timings=None, config=None, output_dir=None, db=None):
+    """
+    Evaluate the trajectory est against gt (see evaluate), build the record of
+    the run from the perturb_* entries of robustness and write it to
+    output_dir and the store db (or SLAM_RESULTS_DB). Extra scalar metrics are
+    kept next to the trajectory ones. Returns the record.
+    """
+    all_metrics = {}
+    frame_errors = None
+    status = 'failed'
+    if gt is not None and est is not None and len(est) > 0:
+        all_metrics, frame_errors = evaluate(gt, est, valid, with_scale)
+        status = 'ok'
+    all_metrics.update(metrics or {})
+    record = RunRecord(system=system, scene=scene,
+                       perturb_type=int(robustness.get('perturb_type', registry.CLEAN_ID)),
+                       severity=int(robustness.get('perturb_severity', 0)),
+                       dynamic=int(robustness.get('perturb_dynamic', 0)),
+                       downsample=int(downsample), seed=int(robustness.get('perturb_seed') or 0),
+                       variant=variant, status=status, metrics=all_metrics, frame_errors=frame_errors,
+                       timings=timings, memory=peak_memory(), config=config,
+                       output_dir=None if output_dir is None else os.path.abspath(output_dir), created=time.time())
+    if output_dir is not None:
+        write_record(record, output_dir)
+    db = db or os.environ.get(DB_ENV)
+    if db:
+        with ResultStore(db) as store:
+            store.append(record)
+    return record
+
+
+class ResultStore:
+    """Run records in one SQLite file, one row per run ID."""
+
+    def __init__(self, path, timeout=60.):
+        self.path = path
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        # the runs of a sweep append concurrently, sqlite serializes them
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS runs (%s)' % ', '.join('%s %s' % c for c in COLUMNS))
+            self.conn.execute('CREATE TABLE IF NOT EXISTS frame_errors (run_id TEXT PRIMARY KEY, errors BLOB)')
+            for columns in INDEXES:
+                self.conn.execute('CREATE INDEX IF NOT EXISTS runs_%s ON runs (%s)' % ('_'.join(columns), ', '.join(columns)))
+
+    def __repr__(self):
+        return 'ResultStore(%r)' % self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def __contains__(self, key):
+        return self.conn.execute('SELECT 1 FROM runs WHERE run_id = ?', (key,)).fetchone() is not None
+
+    def append(self, record):
+        """Insert the record, replacing the one of a former run with the same ID."""
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO runs VALUES (%s)' % ', '.join('?' * len(COLUMNS)), record.row())
+            self.conn.execute('DELETE FROM frame_errors WHERE run_id = ?', (record.run_id,))
+            if record.frame_errors is not None:
+                errors = np.ascontiguousarray(record.frame_errors, dtype='<f4')
+                self.conn.execute('INSERT INTO frame_errors VALUES (?, ?)', (record.run_id, errors.tobytes()))
+
+    def get(self, key):
+        """The RunRecord with run ID key, None if there is none."""
+        row = self.conn.execute('SELECT %s FROM runs WHERE run_id = ?' % ', '.join(COLUMN_NAMES), (key,)).fetchone()
+        if row is None:
+            return None
+        d = dict(zip(COLUMN_NAMES, row))
+        for name in ('metrics', 'timings', 'memory', 'config'):
+            d[name] = json.loads(d[name]) if d[name] is not None else None
+        d['frame_errors'] = self.frame_errors(key)
+        return RunRecord.from_json(d)
+
+    def frame_errors(self, key):
+        row = self.conn.execute('SELECT errors FROM frame_errors WHERE run_id = ?', (key,)).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype='<f4')
+
+    @staticmethod
+    def _where(filters):
+        """WHERE clause of column=value filters, a list or tuple value matches any of its entries."""
+        clauses = []
+        params = []
+        for name, value in filters.items():
+            _check_column(name)
+            if isinstance(value, (list, tuple)):
+                clauses.append('%s IN (%s)' % (name, ', '.join('?' * len(value))))
+                params += list(value)
+            else:
+                clauses.append('%s = ?' % name)
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, columns=None, order_by=None, **filters):
+        """
+        Columns of the runs matching the filters, one array per column, in
+        one scan of the table (an index lookup for indexed filters).
+        """
+        columns = [c for c in COLUMN_NAMES if c not in ('metrics', 'timings', 'memory', 'config')] \
+            if columns is None else list(columns)
+        for name in columns + list(order_by or []):
+            _check_column(name)
+        where, params = self._where(filters)
+        sql = 'SELECT %s FROM runs%s' % (', '.join(columns), where)
+        if order_by:
+            sql += ' ORDER BY ' + ', '.join(order_by)
+        rows = self.conn.execute(sql, params).fetchall()
+        return dict((name, _column(values)) for name, values in zip(columns, zip(*rows) if rows else [()] * len(columns)))
+
+    def aggregate(self, metric='ate_rmse', by=('system', 'perturbation', 'severity'), **filters):
+        """Count, mean, std, min and max of metric per group of the by columns, over the runs matching the filters."""
+        for name in (metric,) + tuple(by):
+            _check_column(name)
+        where, params = self._where(filters)
+        where += (' AND ' if where else ' WHERE ') + '%s IS NOT NULL' % metric
+        group = ', '.join(by)
+        sql = ('SELECT %s, COUNT(*), AVG(%s), AVG(%s * %s), MIN(%s), MAX(%s) FROM runs%s GROUP BY %s ORDER BY %s'
+               % (group, metric, metric, metric, metric, metric, where, group, group))
+        rows = self.conn.execute(sql, params).fetchall()
+        columns = list(zip(*rows)) if rows else [()] * (len(by) + 5)
+        result = dict((name, _column(values)) for name, values in zip(by, columns))
+        mean = np.array(columns[len(by) + 1], dtype=np.float64)
+        result['count'] = np.array(columns[len(by)], dtype=np.int64)
+        result['mean'] = mean
+        result['std'] = np.sqrt(np.maximum(np.array(columns[len(by) + 2], dtype=np.float64) - mean ** 2, 0.))
+        result['min'] = np.array(columns[len(by) + 3], dtype=np.float64)
+        result['max'] = np.array(columns[len(by) + 4], dtype=np.float64)
+        return result
+
+    def ingest(self, root):
+        """Append the run_record.json files under root, e.g. the outputs of another machine. Returns their count."""
+        count = 0
+        for dirpath, _, filenames in os.walk(root):
+            if RECORD_FILE in filenames:
+                record = read_record(dirpath)
+                if record is not None:
+                    self.append(record)
+                    count += 1
+        return count
+
+    def to_csv(self, path, columns=None, order_by=None, **filters):
+        result = self.query(columns, order_by, **filters)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(result.keys()))
+            writer.writerows(zip(*[values.tolist() for values in result.values()]))
+
+
+def _check_column(name):
+    # names end up in the SQL text
+    if name not in COLUMN_NAMES:
+        raise KeyError("Unknown result column: %r" % (name,))
+
+
+def _column(values):
+    if all(isinstance(v, (int, float)) or v is None for v in values) and any(isinstance(v, float) for v in values):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if all(isinstance(v, int) for v in values) and len(values):
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=object)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query or fill a store of SLAM run records")
+    parser.add_argument("db",         help = "SQLite file of the store")
+    parser.add_argument("command",    help = "summary: aggregate metric by columns, csv: export runs, ingest: add run_record.json files",
+                        choices = ['summary', 'csv', 'ingest'])
+    parser.add_argument("--metric",   help = "metric column of summary", default = 'ate_rmse')
+    parser.add_argument("--by",       help = "group columns of summary", nargs = '+', default = ['system', 'perturbation', 'severity'])
+    parser.add_argument("--columns",  help = "columns of csv", nargs = '+', default = None)
+    parser.add_argument("--where",    help = "column=value filters, value1,value2 for any of them", nargs = '*', default = [])
+    parser.add_argument("--out",      help = "csv file", default = 'runs.csv')
+    parser.add_argument("--root",     help = "folder searched by ingest", default = '.')
+    args = parser.parse_args()
+
+    filters = {}
+    for item in args.where:
+        name, value = item.split('=', 1)
+        values = [int(v) if v.lstrip('-').isdigit() else v for v in value.split(',')]
+        filters[name] = values if len(values) > 1 else values[0]
+
+    with ResultStore(args.db) as store:
+        if args.command == 'ingest':
+            print("%i records added, %i runs in %s" % (store.ingest(args.root), len(store), args.db))
+        elif args.command == 'csv':
+            store.to_csv(args.out, args.columns, ['system', 'scene', 'perturbation', 'severity', 'dynamic'], **filters)
+            print("Results saved to", args.out)
+        else:
+            result = store.aggregate(args.metric, args.by, **filters)
+            print(' '.join('%16s' % name for name in result))
+            for row in zip(*result.values()):
+                print(' '.join('%16.4f' % v if isinstance(v, float) else '%16s' % (v,) for v in row))
@@ -0,0 +1,78 @@
+"""
+Per-frame perturbation schedule of a sequence.
+
+A schedule is a structured array with one (type, severity, delay, seed) row
+per frame, drawn once from a master seed. Loaders look frames up by index,
+so the perturbation of a frame does not depend on which DataLoader worker
+decodes it or in which order, and a run can be replayed from the saved
+schedule, which keeps the settings it was built from.
+"""
+
+import os
+
+import numpy as np
+
+from . import registry
+
+SCHEDULE_DTYPE = np.dtype([('type', np.int16), ('severity', np.int16), ('delay', np.int16), ('seed', np.uint32)])
+
+
+def build_schedule(num_frames, perturb_type, severity, dynamic=0, seed=0):
+    """
+    Static runs use (perturb_type, severity) on every frame. Dynamic runs
+    draw a severity in [0, 5] per frame, 0 being a clean frame, and under
+    sensor misalignment a delay in [severity - dynamic, severity + dynamic].
+    """
+    p = registry.get(perturb_type)
+    if p.id is None:
+        raise ValueError("%s has no ID and cannot be scheduled" % p.name)
+
+    rng = np.random.RandomState(seed)
+    schedule = np.zeros(num_frames, dtype=SCHEDULE_DTYPE)
+    schedule['type'] = p.id
+    schedule['severity'] = severity
+    if dynamic > 0:
+        drawn = rng.randint(0, 6, size=num_frames)
+        schedule['type'] = np.where(drawn > 0, p.id, registry.CLEAN_ID)
+        schedule['severity'] = np.where(drawn > 0, drawn, severity)
+    if p.id == registry.SENSOR_MISALIGNMENT_ID:
+        if dynamic > 0:
+            schedule['delay'] = rng.randint(max(0, severity - dynamic), severity + dynamic + 1, size=num_frames)
+        else:
+            schedule['delay'] = severity
+    schedule['seed'] = rng.randint(0, 2 ** 31, size=num_frames)
+    return schedule
+
+
+def save_schedule(path, schedule, perturb_type, severity, dynamic, seed):
+    """
+    Save the schedule with the settings it was built from, as an npz. Write
+    then rename, so DataLoader workers building the same schedule never see a
+    partial file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = '%s.%i.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez(f, schedule=schedule, perturb_type=registry.get(perturb_type).id,
+                 severity=severity, dynamic=dynamic, seed=seed)
+    os.replace(tmp, path)
+
+
+def load_schedule(path, perturb_type, severity, dynamic, seed):
+    """The schedule saved at path; raises if it was built from other settings."""
+    with np.load(path) as f:
+        if 'schedule' not in f or f['schedule'].dtype != SCHEDULE_DTYPE:
+            raise ValueError("%s is not a perturbation schedule" % path)
+        expected = {'perturb_type': registry.get(perturb_type).id, 'severity': severity,
+                    'dynamic': dynamic, 'seed': seed}
+        for name, value in expected.items():
+            if int(f[name]) != value:
+                raise ValueError("%s was built with %s %i, the run has %s %i" % (path, name, int(f[name]), name, value))
+        return f['schedule']
+
+
+def describe(schedule):
+    """One line summary, printed once instead of a line per frame."""
+    types, counts = np.unique(schedule[['type', 'severity']], return_counts=True)
+    return '%i frames: %s' % (len(schedule), ', '.join(
+        '%s/%i x%i' % (registry.get(int(t)).name, s, n) for (t, s), n in zip(types, counts)))
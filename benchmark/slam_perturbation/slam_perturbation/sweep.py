@@ -0,0 +1,358 @@
+"""
+Run a perturbation sweep of the SLAM systems on the local worker slots.
+
+The sweep is a declarative file (YAML or JSON) with the command template of
+each system and the matrix of settings. Every combination is one job:
+
+    results_db: results/replica.db
+    systems:
+      coslam:
+        cwd: ../Co-SLAM
+        command: python coslam.py --config configs/Replica/{scene}.yaml --perturb_type {perturb_type}
+                 --perturb_severity {severity} --perturb_dynamic {dynamic} --frame_downsample {downsample}
+    matrix:
+      system: [coslam]
+      scene: [room0, room1, office0]
+      perturbation: ['0-16']        # names, IDs or ID ranges
+      severity: [1, 3, 5]
+      dynamic: [0, 1]
+    vars:                           # more placeholders of the templates
+      data: /data/Replica
+    include:                        # extra jobs, e.g. the clean runs
+      - {system: coslam, scene: [room0, room1, office0], perturbation: none, severity: 0}
+    exclude:
+      - {perturbation: spatter, dynamic: 1}
+
+Jobs are skipped if their run record (see results) is already in the store
+with status ok, or, for systems that write no record, if the `done` path
+template of their system exists. Failed jobs are retried. --shard i/n keeps
+the jobs whose run ID hashes to i, so n machines split a matrix without
+hand-split scripts, and merge their stores afterwards with `results ingest`.
+
+    python -m slam_perturbation.sweep sweeps/replica.yaml --slots 4 --gpus 0 1 --cpus_per_slot 8 --memory_per_slot 32
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import itertools
+import subprocess
+from typing import NamedTuple, Optional
+
+from . import registry, results
+
+AXES = ('system', 'scene', 'perturbation', 'severity', 'dynamic', 'downsample', 'seed')
+DEFAULTS = {'dynamic': 0, 'downsample': 1, 'seed': 0}
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class Job(NamedTuple):
+    system: str                 # key of the systems table of the sweep
+    scene: str
+    perturb_type: int
+    severity: int
+    dynamic: int
+    downsample: int
+    seed: int
+    record_system: str          # system name of the run record
+    variant: str
+
+    @property
+    def run_id(self):
+        return results.run_id(self.record_system, self.scene, self.perturb_type, self.severity, self.dynamic,
+                              self.downsample, self.seed, self.variant)
+
+    @property
+    def perturbation(self):
+        return registry.get(self.perturb_type).name
+
+    @property
+    def name(self):
+        return '%s_%s_%s_%i_%i_ds%i_s%i' % (self.system, self.scene, self.perturbation, self.severity,
+                                           self.dynamic, self.downsample, self.seed)
+
+    def fields(self, **extra):
+        """Values of the command template placeholders."""
+        return dict(self._asdict(), perturbation=self.perturbation, run_id=self.run_id, **extra)
+
+
+class Slot(NamedTuple):
+    index: int
+    gpu: Optional[str]          # CUDA_VISIBLE_DEVICES of the jobs, None to leave it
+    cpus: Optional[tuple]       # CPUs the jobs are pinned to
+    memory: Optional[float]     # RSS limit of the job process group, bytes
+
+
+def load(path):
+    """The sweep file, YAML or JSON."""
+    with open(path) as f:
+        if os.path.splitext(path)[1] in ('.yaml', '.yml'):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _values(entry, axis):
+    value = entry.get(axis, DEFAULTS.get(axis))
+    if value is None:
+        raise KeyError("The sweep gives no %s" % axis)
+    values = value if isinstance(value, (list, tuple)) else [value]
+    if axis == 'perturbation':
+        return [p.id for p in registry.parse_perturbations(values) if p.id is not None]
+    return list(values)
+
+
+def _matches(job, entry):
+    for axis, value in entry.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if axis == 'perturbation':
+            if job.perturb_type not in [p.id for p in registry.parse_perturbations(values)]:
+                return False
+        elif getattr(job, axis) not in values:
+            return False
+    return True
+
+
+def expand(sweep):
+    """Jobs of the matrix and the include entries, minus the exclude ones, without duplicates, in a fixed order."""
+    systems = sweep['systems']
+    jobs = {}
+    for entry in [sweep['matrix']] + list(sweep.get('include') or []):
+        for values in itertools.product(*[_values(entry, axis) for axis in AXES]):
+            setting = dict(zip(AXES, values))
+            spec = systems[setting['system']]
+            job = Job(setting['system'], str(setting['scene']), int(setting['perturbation']), int(setting['severity']),
+                      int(setting['dynamic']), int(setting['downsample']), int(setting['seed']),
+                      spec.get('record_system', setting['system']), '')
+            job = job._replace(variant=str(spec.get('variant', '')).format(**job.fields()))
+            if not any(_matches(job, e) for e in sweep.get('exclude') or []):
+                jobs[job.run_id] = job
+    return sorted(jobs.values(), key=lambda j: (j.system, j.scene, j.perturb_type, j.severity, j.dynamic, j.downsample, j.seed))
+
+
+def shard(jobs, index, count):
+    """The jobs of shard index out of count, by run ID, so it does not depend on the order of the matrix."""
+    return [j for j in jobs if int(j.run_id, 16) % count == index]
+
+
+def done_path(sweep, job):
+    """The done path of the job, None if its system writes run records instead."""
+    pattern = sweep['systems'][job.system].get('done')
+    if pattern is None:
+        return None
+    return os.path.join(_cwd(sweep, job), pattern.format(**job.fields(**(sweep.get('vars') or {}))))
+
+
+def completed(sweep, jobs, db):
+    """Run IDs of the jobs that need no run: an ok record in the store, or the done path of their system exists."""
+    done = set()
+    if db is not None and os.path.exists(db):
+        with results.ResultStore(db) as store:
+            done.update(store.query(['run_id'], status='ok')['run_id'].tolist())
+    for job in jobs:
+        path = done_path(sweep, job)
+        if path is not None and os.path.exists(path):
+            done.add(job.run_id)
+    return done
+
+
+def make_slots(count, gpus=None, cpus_per_slot=None, memory_per_slot=None):
+    """count slots, round robin over gpus, each pinned to its own cpus_per_slot CPUs, memory_per_slot GB."""
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+    slots = []
+    for i in range(count):
+        cpus = None
+        if cpus_per_slot and available:
+            cpus = tuple(available[(i * cpus_per_slot + k) % len(available)] for k in range(cpus_per_slot))
+        slots.append(Slot(i, None if not gpus else str(gpus[i % len(gpus)]), cpus,
+                          None if not memory_per_slot else memory_per_slot * 2 ** 30))
+    return slots
+
+
+def _cwd(sweep, job):
+    base = sweep.get('root', '.')
+    return os.path.normpath(os.path.join(base, sweep['systems'][job.system].get('cwd', '.')))
+
+
+def group_rss(pgid):
+    """Resident memory of the process group pgid in bytes, from /proc."""
+    total = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % pid) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # fields after the command name: state ppid pgrp ... rss is the 22nd
+        fields = stat[stat.rindex(')') + 2:].split()
+        if int(fields[2]) == pgid:
+            total += int(fields[21]) * PAGE_SIZE
+    return total
+
+
+class Sweep:
+    """Runs the jobs on the slots, retrying failures; returns the jobs that still failed."""
+
+    def __init__(self, sweep, slots, db=None, log_dir='sweep_logs', retries=1, timeout=None, poll=2.):
+        self.sweep = sweep
+        self.slots = slots
+        self.db = db
+        self.log_dir = log_dir
+        self.retries = retries
+        self.timeout = timeout
+        self.poll = poll
+
+    def command(self, job, slot):
+        template = self.sweep['systems'][job.system]['command']
+        fields = dict(self.sweep.get('vars') or {}, gpu=slot.gpu, slot=slot.index, results_db=self.db or '')
+        return ' '.join(template.split()).format(**job.fields(**fields))
+
+    def env(self, slot):
+        env = dict(os.environ)
+        env.update(dict((k, str(v)) for k, v in (self.sweep.get('env') or {}).items()))
+        if self.db is not None:
+            env[results.DB_ENV] = os.path.abspath(self.db)
+        if slot.gpu is not None:
+            env['CUDA_VISIBLE_DEVICES'] = slot.gpu
+        if slot.cpus is not None:
+            for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+                env[name] = str(len(slot.cpus))
+        return env
+
+    def start(self, job, slot, attempt):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log = open(os.path.join(self.log_dir, '%s_%i.log' % (job.name, attempt)), 'w')
+        command = self.command(job, slot)
+        log.write('# %s\n# cwd %s, slot %i, gpu %s\n' % (command, _cwd(self.sweep, job), slot.index, slot.gpu))
+        log.flush()
+
+        def pin():
+            if slot.cpus is not None:
+                os.sched_setaffinity(0, slot.cpus)
+
+        # own session, so the job and the processes it spawns are killed together
+        process = subprocess.Popen(command, shell=True, cwd=_cwd(self.sweep, job), env=self.env(slot), stdout=log,
+                                   stderr=subprocess.STDOUT, start_new_session=True, preexec_fn=pin)
+        return process, log
+
+    def succeeded(self, job, returncode):
+        if returncode != 0:
+            return False
+        path = done_path(self.sweep, job)
+        if path is not None:
+            return os.path.exists(path)
+        if self.db is None:
+            return True
+        # the run exited cleanly but must also have recorded itself
+        with results.ResultStore(self.db) as store:
+            record = store.get(job.run_id)
+        return record is not None and record.status == 'ok'
+
+    def run(self, jobs):
+        queue = [(job, 0) for job in jobs]
+        running = {}            # slot index -> (job, attempt, process, log, start)
+        failed = []
+        finished = 0
+        total = len(queue)
+        start_time = time.time()
+        try:
+            while queue or running:
+                for slot in self.slots:
+                    if slot.index not in running and queue:
+                        job, attempt = queue.pop(0)
+                        process, log = self.start(job, slot, attempt)
+                        running[slot.index] = (job, attempt, process, log, time.time())
+                time.sleep(self.poll)
+                for slot in self.slots:
+                    if slot.index not in running:
+                        continue
+                    job, attempt, process, log, started = running[slot.index]
+                    reason = None
+                    if process.poll() is None:
+                        if slot.memory is not None and group_rss(process.pid) > slot.memory:
+                            reason = 'memory limit'
+                        elif self.timeout is not None and time.time() - started > self.timeout:
+                            reason = 'timeout'
+                        else:
+                            continue
+                        _kill(process)
+                    log.close()
+                    del running[slot.index]
+                    if reason is None and self.succeeded(job, process.returncode):
+                        finished += 1
+                        status = 'done'
+                    elif attempt < self.retries:
+                        queue.append((job, attempt + 1))
+                        status = 'retry (%s)' % (reason or 'exit code %i' % process.returncode)
+                    else:
+                        failed.append(job)
+                        finished += 1
+                        status = 'failed (%s)' % (reason or 'exit code %i' % process.returncode)
+                    print("[%i/%i] %s on slot %i: %s after %.0f s, %.0f s elapsed"
+                          % (finished, total, job.name, slot.index, status, time.time() - started, time.time() - start_time))
+        finally:
+            for job, attempt, process, log, started in running.values():
+                _kill(process)
+                log.close()
+        return failed
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(10)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a perturbation sweep of the SLAM systems on local worker slots")
+    parser.add_argument("sweep",             help = "sweep file (yaml or json)")
+    parser.add_argument("--slots",           help = "jobs run at once", type = int, default = 1)
+    parser.add_argument("--gpus",            help = "GPUs handed to the slots round robin", nargs = '*', default = None)
+    parser.add_argument("--cpus_per_slot",   help = "CPUs each slot is pinned to", type = int, default = None)
+    parser.add_argument("--memory_per_slot", help = "RSS limit of a job in GB, it is killed above", type = float, default = None)
+    parser.add_argument("--shard",           help = "i/n: only the i-th of n shards of the jobs", default = '0/1')
+    parser.add_argument("--retries",         help = "reruns of a failed job", type = int, default = 1)
+    parser.add_argument("--timeout",         help = "hours before a job is killed", type = float, default = None)
+    parser.add_argument("--results_db",      help = "results store, overwrites the one of the sweep file", default = None)
+    parser.add_argument("--log_dir",         help = "output of the jobs", default = 'sweep_logs')
+    parser.add_argument("--dry_run",         help = "only list the commands", action = "store_true")
+    args = parser.parse_args()
+
+    sweep = load(args.sweep)
+    sweep.setdefault('root', os.path.dirname(os.path.abspath(args.sweep)))
+    db = args.results_db or sweep.get('results_db')
+    if db is not None and not os.path.isabs(db):
+        db = os.path.join(sweep['root'], db)
+    index, count = (int(x) for x in args.shard.split('/'))
+
+    jobs = expand(sweep)
+    mine = shard(jobs, index, count)
+    done = completed(sweep, mine, db)
+    todo = [j for j in mine if j.run_id not in done]
+    print("%i jobs in the matrix, %i in shard %i/%i, %i already done, %i to run"
+          % (len(jobs), len(mine), index, count, len(mine) - len(todo), len(todo)))
+
+    slots = make_slots(args.slots, args.gpus, args.cpus_per_slot, args.memory_per_slot)
+    runner = Sweep(sweep, slots, db, args.log_dir, args.retries, None if args.timeout is None else args.timeout * 3600)
+    if args.dry_run:
+        for i, job in enumerate(todo):
+            print("(cd %s && %s)" % (_cwd(sweep, job), runner.command(job, slots[i % len(slots)])))
+        sys.exit(0)
+
+    failed = runner.run(todo)
+    if failed:
+        path = os.path.join(args.log_dir, 'failed_%i_of_%i.json' % (index, count))
+        with open(path, 'w') as f:
+            json.dump([j._asdict() for j in failed], f, indent=4)
+        print("%i jobs failed, listed in %s" % (len(failed), path))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,183 @@
+"""
+Trajectory metrics shared by the SLAM evaluation scripts (numpy only).
+
+associate() matches time stamps like the TUM RGB-D benchmark tool the
+evaluation scripts copied, closest pairs first, but draws the candidates from
+a sorted search window instead of all N x M pairs. align() is the closed-form
+Horn / Umeyama alignment with one matrix product for the cross-covariance,
+optionally with scale (Sim3). ate() and rpe() evaluate a batch of
+trajectories of the same length at once, with an optional validity mask for
+missing or invalid poses.
+"""
+
+import numpy as np
+
+
+def associate(first_list, second_list, offset=0.0, max_difference=0.02):
+    """
+    Associate two dictionaries of (stamp, data), the closest stamp pairs
+    first, with stamps at most max_difference apart once offset is added to
+    the second ones. Returns the sorted list of matched (stamp1, stamp2),
+    the same as the TUM associate.py.
+    """
+    first_keys = list(first_list.keys())
+    second_keys = list(second_list.keys())
+    if len(first_keys) == 0 or len(second_keys) == 0:
+        return []
+    a = np.array(first_keys, dtype=np.float64)
+    b = np.array(second_keys, dtype=np.float64)
+    b_shifted = b + offset
+
+    # candidate window of each first stamp in the sorted second stamps,
+    # slightly widened, the exact test below decides
+    order = np.argsort(b_shifted, kind='stable')
+    b_sorted = b_shifted[order]
+    window = max_difference * (1 + 1e-6) + 1e-12
+    lo = np.searchsorted(b_sorted, a - window, side='left')
+    hi = np.searchsorted(b_sorted, a + window, side='right')
+    counts = hi - lo
+    ia = np.repeat(np.arange(len(a)), counts)
+    starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    ib = order[starts + np.arange(counts.sum())]
+
+    diff = np.abs(a[ia] - b_shifted[ib])
+    keep = diff < max_difference
+    ia, ib, diff = ia[keep], ib[keep], diff[keep]
+    # same order as sorting the (diff, stamp1, stamp2) tuples
+    ranked = np.lexsort((b[ib], a[ia], diff))
+
+    used_a = set()
+    used_b = set()
+    matches = []
+    for i, j in zip(ia[ranked].tolist(), ib[ranked].tolist()):
+        if i not in used_a and j not in used_b:
+            used_a.add(i)
+            used_b.add(j)
+            matches.append((first_keys[i], second_keys[j]))
+
+    matches.sort()
+    return matches
+
+
+def align_batch(model, data, with_scale=False, valid=None):
+    """
+    Align trajectories model [B, 3, n] onto data [B, 3, n] in closed form
+    (Horn / Umeyama), only over the points where valid [B, n] is set.
+
+    Returns rot [B, 3, 3], trans [B, 3, 1], the translational error per point
+    [B, n] and the scale [B], 1 unless with_scale.
+    """
+    model = np.asarray(model, dtype=np.float64)
+    data = np.asarray(data, dtype=np.float64)
+    B = model.shape[0]
+    weight = np.ones((B, model.shape[2])) if valid is None else np.asarray(valid, dtype=np.float64)
+    weight = weight[:, None, :]
+    count = weight.sum(-1, keepdims=True)
+    if valid is not None:
+        # invalid points may hold nan or inf
+        model = np.where(weight > 0, model, 0.)
+        data = np.where(weight > 0, data, 0.)
+
+    model_mean = (model * weight).sum(-1, keepdims=True) / count
+    data_mean = (data * weight).sum(-1, keepdims=True) / count
+    model_zerocentered = (model - model_mean) * weight
+    data_zerocentered = (data - data_mean) * weight
+
+    W = model_zerocentered @ data_zerocentered.transpose(0, 2, 1)
+    U, d, Vh = np.linalg.svd(W.transpose(0, 2, 1))
+    S = np.tile(np.identity(3), (B, 1, 1))
+    S[np.linalg.det(U) * np.linalg.det(Vh) < 0, 2, 2] = -1
+    rot = U @ S @ Vh
+
+    if with_scale:
+        dots = (data_zerocentered * (rot @ model_zerocentered)).sum((1, 2))
+        norms = (model_zerocentered ** 2).sum((1, 2))
+        scale = dots / norms
+    else:
+        scale = np.ones(B)
+
+    trans = data_mean - scale[:, None, None] * (rot @ model_mean)
+    alignment_error = scale[:, None, None] * (rot @ model) + trans - data
+    trans_error = np.sqrt((alignment_error ** 2).sum(1))
+    return rot, trans, trans_error, scale
+
+
+def align(model, data, with_scale=False):
+    """
+    Align the trajectory model (3xn) onto data (3xn), see align_batch.
+    Returns rot (3x3), trans (3x1), trans_error (n) and scale.
+    """
+    rot, trans, trans_error, scale = align_batch(np.asarray(model)[None], np.asarray(data)[None], with_scale)
+    return rot[0], trans[0], trans_error[0], scale[0]
+
+
+def error_stats(errors, valid=None, name='absolute_translational_error'):
+    """Per-trajectory statistics of errors [B, n] over the valid entries, as in evaluate_ate."""
+    errors = np.asarray(errors, dtype=np.float64)
+    valid = np.ones(errors.shape, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    masked = np.where(valid, errors, np.nan)
+    count = valid.sum(-1)
+    return {
+        "compared_pose_pairs": count,
+        name + ".rmse": np.sqrt(np.nansum(masked ** 2, -1) / count),
+        name + ".mean": np.nanmean(masked, -1),
+        name + ".median": np.nanmedian(masked, -1),
+        name + ".std": np.nanstd(masked, -1),
+        name + ".min": np.nanmin(masked, -1),
+        name + ".max": np.nanmax(masked, -1),
+    }
+
+
+def positions(traj):
+    """[B, n, 3] positions of [B, n, 3] points or [B, n, 4, 4] poses."""
+    traj = np.asarray(traj, dtype=np.float64)
+    return traj[..., :3, 3] if traj.shape[-2:] == (4, 4) else traj
+
+
+def ate(gt, est, with_scale=False, valid=None):
+    """
+    Absolute trajectory error of a batch of estimated trajectories est onto
+    their ground truth gt, [B, n, 3] positions or [B, n, 4, 4] poses, after
+    aligning est onto gt (SE3, or Sim3 with_scale). Returns the evaluate_ate
+    statistics as [B] arrays, and the scale.
+    """
+    gt = positions(gt)
+    est = positions(est)
+    if valid is not None:
+        valid = np.asarray(valid, dtype=bool)
+    _, _, trans_error, scale = align_batch(est.transpose(0, 2, 1), gt.transpose(0, 2, 1), with_scale, valid)
+    results = error_stats(trans_error, valid)
+    results["scale"] = scale
+    return results
+
+
+def rpe(gt, est, delta=1, valid=None):
+    """
+    Relative pose error of a batch of estimated poses est [B, n, 4, 4] against
+    gt, over the pose pairs delta frames apart. Returns the translational
+    error statistics and the rotational ones in degrees, as [B] arrays, with
+    the number of pairs as relative_compared_pose_pairs.
+    """
+    gt = np.asarray(gt, dtype=np.float64)
+    est = np.asarray(est, dtype=np.float64)
+    if valid is not None:
+        # invalid poses may hold nan or inf
+        valid = np.asarray(valid, dtype=bool)
+        gt = np.where(valid[..., None, None], gt, np.identity(4))
+        est = np.where(valid[..., None, None], est, np.identity(4))
+    gt_rel = np.linalg.inv(gt[:, :-delta]) @ gt[:, delta:]
+    est_rel = np.linalg.inv(est[:, :-delta]) @ est[:, delta:]
+    error = np.linalg.inv(gt_rel) @ est_rel
+
+    trans_error = np.linalg.norm(error[..., :3, 3], axis=-1)
+    cos = (np.trace(error[..., :3, :3], axis1=-2, axis2=-1) - 1) / 2
+    rot_error = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+    pair_valid = None
+    if valid is not None:
+        pair_valid = valid[:, :-delta] & valid[:, delta:]
+    results = error_stats(trans_error, pair_valid, 'relative_translational_error')
+    results.update(error_stats(rot_error, pair_valid, 'relative_rotational_error'))
+    # compared_pose_pairs is the count of the ATE, which these results are merged with
+    results['relative_compared_pose_pairs'] = results.pop('compared_pose_pairs')
+    return results
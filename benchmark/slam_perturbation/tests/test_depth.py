@@ -0,0 +1,129 @@
+import random
+
+import numpy as np
+import cv2
+import pytest
+
+from slam_perturbation import depth, params
+
+
+def edge_erosion_loop(x, severity=1):
+    # the former per-patch depth_add_edge_erosion of the dataset loaders
+    c = params.DEPTH_EDGE_EROSION[severity - 1]
+    scaled_x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    edges = cv2.Canny(scaled_x, 20, 50)
+    edge_indices = np.column_stack(np.where(edges > 0))
+    np.random.shuffle(edge_indices)
+    erosion_edge_indices = edge_indices[:int(len(edge_indices) * c.rate)]
+    erosion_mask = edges.astype(bool)
+    for pixel in erosion_edge_indices:
+        x_range = slice(max(pixel[0] - c.patch_len, 0), min(pixel[0] + c.patch_len + 1, edges.shape[0]))
+        y_range = slice(max(pixel[1] - c.patch_len, 0), min(pixel[1] + c.patch_len + 1, edges.shape[1]))
+        erosion_mask[x_range, y_range] = True
+    noisy_image = np.copy(x)
+    noisy_image[erosion_mask] = 0
+    return noisy_image
+
+
+def edge_erosion_orb_loop(x, severity=1):
+    # the former ORB-SLAM3 depth_add_edge_erosion
+    c = params.DEPTH_EDGE_EROSION[severity - 1]
+    scaled_x = cv2.normalize(x, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    edges = cv2.Canny(scaled_x, 20, 50)
+    edge_pixel = []
+    for i in range(edges.shape[0]):
+        for j in range(edges.shape[1]):
+            if edges[i][j] > 0:
+                edge_pixel.append([i, j])
+    erosion_edge = random.sample(edge_pixel, int(len(edge_pixel) * c.rate))
+    for pixel in erosion_edge:
+        edges[pixel[0] - c.patch_len:pixel[0] + c.patch_len, pixel[1] - c.patch_len:pixel[1] + c.patch_len] = 1
+    noisy_image = np.copy(x)
+    noisy_image[edges > 0] = 0
+    return noisy_image
+
+
+def random_mask_loop(x, severity=1, table=params.DEPTH_RANDOM_MASK):
+    # the former depth_add_random_mask, whose overlap test never rejected a rectangle
+    c = table[severity - 1]
+    patch_w = int(x.shape[0] * c.scale)
+    patch_h = int(x.shape[1] * c.scale)
+    mask = np.zeros_like(x, dtype=bool)
+    for _ in range(c.count):
+        x1, y1 = np.random.randint(0, x.shape[0] - patch_w), np.random.randint(0, x.shape[1] - patch_h)
+        mask[x1:x1 + patch_w, y1:y1 + patch_h] = True
+    noisy_image = np.copy(x)
+    noisy_image[mask] = 0
+    return noisy_image
+
+
+def fixed_mask_loop(x, severity=1):
+    # the former depth_add_fixed_mask
+    c = params.DEPTH_FIXED_MASK[severity - 1]
+    patch_w = int(x.shape[0] * c.scale)
+    patch_h = int(x.shape[1] * c.scale)
+    start_point = [(1, 1), (3, 1), (5, 1), (7, 1), (1, 3), (1, 5), (1, 7), (3, 3), (5, 5), (9, 9), (9, 1), (1, 9),
+                   (7, 7)][:c.count]
+    mask = np.zeros_like(x, dtype=bool)
+    for px, py in start_point:
+        x1, y1 = (px - 1) * patch_w, (py - 1) * patch_h
+        mask[x1:x1 + patch_w, y1:y1 + patch_h] = True
+    noisy_image = np.copy(x)
+    noisy_image[mask] = 0
+    return noisy_image
+
+
+@pytest.fixture(scope='module')
+def frame():
+    # piecewise constant depth with plenty of Canny edges, some of them at the top / left border
+    rng = np.random.RandomState(0)
+    coarse = rng.randint(500, 20000, size=(12, 20)).astype(np.uint16)
+    x = cv2.resize(coarse, (200, 120), interpolation=cv2.INTER_NEAREST)
+    x[:8, :8] = rng.randint(500, 20000, size=(8, 8))
+    return x
+
+
+def seeded(fn, x, severity, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    return fn(x, severity)
+
+
+@pytest.mark.parametrize("method,reference", [
+    (depth.depth_add_edge_erosion, edge_erosion_loop),
+    (depth.depth_add_edge_erosion_orb, edge_erosion_orb_loop),
+    (depth.depth_add_random_mask, random_mask_loop),
+    (depth.depth_add_random_mask_orb, lambda x, s: random_mask_loop(x, s, params.DEPTH_RANDOM_MASK_ORB)),
+    (depth.depth_add_fixed_mask, fixed_mask_loop),
+])
+@pytest.mark.parametrize("severity", range(1, 6))
+def test_matches_loop(frame, method, reference, severity):
+    # same seed, same draws: the masks agree pixel for pixel
+    for seed in range(5):
+        out = seeded(method, frame, severity, seed)
+        assert out.dtype == frame.dtype
+        assert np.array_equal(out, seeded(reference, frame, severity, seed))
+
+
+@pytest.mark.parametrize("method", [depth.depth_add_edge_erosion, depth.depth_add_edge_erosion_orb,
+                                    depth.depth_add_random_mask])
+def test_masked_fraction_grows_with_severity(frame, method):
+    masked = [np.mean([np.mean(seeded(method, frame, severity, seed) == 0) for seed in range(10)])
+              for severity in range(1, 6)]
+    assert 0 < masked[0]
+    assert all(a <= b for a, b in zip(masked[:-1], masked[1:]))
+
+
+def test_edge_erosion_only_masks(frame):
+    out = seeded(depth.depth_add_edge_erosion, frame, 3, 0)
+    kept = out > 0
+    assert np.array_equal(out[kept], frame[kept])
+    # every edge pixel is dropped
+    edges = cv2.Canny(cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8), 20, 50) > 0
+    assert not kept[edges].any()
+
+
+def test_rect_mask():
+    mask = depth.rect_mask((10, 12), np.array([[0, 0], [5, 6]]), 3, 4)
+    assert mask.sum() == 2 * 3 * 4
+    assert mask[0:3, 0:4].all() and mask[5:8, 6:10].all()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from slam_perturbation import image
+
+# (radius, sigma) of motion_blur and snow
+LEVELS = [(10, 3), (15, 5), (15, 8), (15, 12), (20, 15), (10, 4), (12, 4), (12, 8), (12, 12)]
+
+
+def motion_blur_reference(x, radius, sigma, angle):
+    # ImageMagick's MotionBlurImage one tap at a time: gaussian weight of tap i,
+    # read at (x + ceil(i cos - 0.5), y + ceil(i sin - 0.5)) with edge pixels repeated
+    width = int(2 * np.ceil(radius) + 1)
+    weights = np.exp(-np.arange(width) ** 2 / (2.0 * sigma ** 2))
+    weights /= weights.sum()
+    theta = np.deg2rad(angle)
+    h, w = x.shape[:2]
+    rows, cols = np.arange(h), np.arange(w)
+    out = np.zeros(x.shape, dtype=np.float64)
+    for i in range(width):
+        dx = int(np.ceil(i * np.cos(theta) - 0.5))
+        dy = int(np.ceil(i * np.sin(theta) - 0.5))
+        out += weights[i] * x[np.clip(rows + dy, 0, h - 1)][:, np.clip(cols + dx, 0, w - 1)]
+    return np.clip(np.round(out), 0, 255).astype(np.uint8)
+
+
+@pytest.fixture
+def frame():
+    return np.random.RandomState(0).randint(0, 256, size=(48, 64, 3)).astype(np.uint8)
+
+
+@pytest.fixture
+def wand():
+    try:
+        image.wand_motion_image()
+    except (ImportError, OSError) as e:
+        pytest.skip("wand backend unavailable: %s" % e)
+
+
+def test_kernel_normalized():
+    for radius, sigma in LEVELS:
+        kernel = image.motion_blur_kernel(float(radius), float(sigma), 30.0)
+        assert kernel.sum() == pytest.approx(1.0, abs=1e-6)
+        assert not kernel.flags.writeable
+    # cached per (radius, sigma, angle)
+    assert image.motion_blur_kernel(10.0, 3.0, 30.0) is image.motion_blur_kernel(10.0, 3.0, 30.0)
+
+
+@pytest.mark.parametrize("radius,sigma", LEVELS)
+@pytest.mark.parametrize("angle", [-135.0, -90.0, -45.0, -12.25, 0.0, 33.5, 45.0])
+def test_opencv_matches_reference(frame, radius, sigma, angle):
+    out = image.apply_motion_blur(frame, radius, sigma, angle, backend='opencv')
+    ref = motion_blur_reference(frame, radius, sigma, angle)
+    # float32 kernel against float64 weights, rounding may flip
+    assert np.abs(out.astype(np.int16) - ref).max() <= 1
+
+
+def test_opencv_greyscale(frame):
+    grey = frame[..., 0]
+    out = image.apply_motion_blur(grey, 12, 4, -90.0, backend='opencv')
+    assert out.shape == grey.shape and out.dtype == np.uint8
+    assert np.abs(out.astype(np.int16) - motion_blur_reference(grey, 12, 4, -90.0)).max() <= 1
+
+
+def test_angle_snapped(frame):
+    step = image.MOTION_BLUR_ANGLE_STEP
+    a = image.apply_motion_blur(frame, 15, 5, 10.0 + step * 0.4, backend='opencv')
+    b = image.apply_motion_blur(frame, 15, 5, 10.0, backend='opencv')
+    assert np.array_equal(a, b)
+
+
+def test_unknown_backend(frame):
+    with pytest.raises(ValueError):
+        image.apply_motion_blur(frame, 10, 3, 0.0, backend='magick')
+
+
+@pytest.mark.parametrize("radius,sigma", LEVELS)
+def test_opencv_matches_wand(wand, frame, radius, sigma):
+    rng = np.random.RandomState(radius * 100 + sigma)
+    # on the kernel grid, so that both backends see the same angle
+    angle = round(rng.uniform(-135, 45) / image.MOTION_BLUR_ANGLE_STEP) * image.MOTION_BLUR_ANGLE_STEP
+    out_cv = image.apply_motion_blur(frame, radius, sigma, angle, backend='opencv')
+    out_wand = image.apply_motion_blur(frame, radius, sigma, angle, backend='wand')
+    diff = np.abs(out_wand.astype(np.int16) - out_cv.astype(np.int16))
+    assert diff.mean() < 0.5
+    assert diff.max() <= 2
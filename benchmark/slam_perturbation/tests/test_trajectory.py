@@ -0,0 +1,221 @@
+import numpy
+import numpy as np
+import pytest
+
+from slam_perturbation import trajectory
+
+# the reference code is numpy.matrix based
+pytestmark = pytest.mark.filterwarnings("ignore::PendingDeprecationWarning")
+
+
+def associate_reference(first_list, second_list, offset=0.0, max_difference=0.02):
+    # the former associate() of the evaluation scripts
+    first_keys = list(first_list.keys())
+    second_keys = list(second_list.keys())
+    potential_matches = [(abs(a - (b + offset)), a, b)
+                         for a in first_keys
+                         for b in second_keys
+                         if abs(a - (b + offset)) < max_difference]
+    potential_matches.sort()
+    matches = []
+    for diff, a, b in potential_matches:
+        if a in first_keys and b in second_keys:
+            first_keys.remove(a)
+            second_keys.remove(b)
+            matches.append((a, b))
+
+    matches.sort()
+    return matches
+
+
+def align_reference(model, data, with_scale=False):
+    # the former align() of the evaluation scripts (ORB_SLAM3 evaluate_ate_scale for the scale)
+    model_zerocentered = model - model.mean(1)
+    data_zerocentered = data - data.mean(1)
+
+    W = numpy.zeros((3, 3))
+    for column in range(model.shape[1]):
+        W += numpy.outer(model_zerocentered[:, column], data_zerocentered[:, column])
+    U, d, Vh = numpy.linalg.svd(W.transpose())
+    S = numpy.matrix(numpy.identity(3))
+    if numpy.linalg.det(U) * numpy.linalg.det(Vh) < 0:
+        S[2, 2] = -1
+    rot = U * S * Vh
+
+    s = 1.0
+    if with_scale:
+        rotmodel = rot * model_zerocentered
+        dots = 0.0
+        norms = 0.0
+        for column in range(data_zerocentered.shape[1]):
+            dots += numpy.dot(data_zerocentered[:, column].transpose(), rotmodel[:, column])
+            normi = numpy.linalg.norm(model_zerocentered[:, column])
+            norms += normi * normi
+        s = (dots / norms).item()
+
+    trans = data.mean(1) - s * rot * model.mean(1)
+    alignment_error = s * rot * model + trans - data
+    trans_error = numpy.sqrt(numpy.sum(numpy.multiply(alignment_error, alignment_error), 0)).A[0]
+    return rot, trans, trans_error, s
+
+
+def rpe_reference(gt, est, delta=1):
+    # one pose pair at a time
+    trans_error, rot_error = [], []
+    for i in range(len(gt) - delta):
+        gt_rel = np.linalg.inv(gt[i]) @ gt[i + delta]
+        est_rel = np.linalg.inv(est[i]) @ est[i + delta]
+        error = np.linalg.inv(gt_rel) @ est_rel
+        trans_error.append(np.linalg.norm(error[:3, 3]))
+        cos = (np.trace(error[:3, :3]) - 1) / 2
+        rot_error.append(np.degrees(np.arccos(min(1.0, max(-1.0, cos)))))
+    return np.array(trans_error), np.array(rot_error)
+
+
+def rotation(axis, angle):
+    axis = axis / np.linalg.norm(axis)
+    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.identity(3) + np.sin(angle) * K + (1 - np.cos(angle)) * K @ K
+
+
+def random_trajectory(rng, n):
+    # smooth walk with a random rigid transform and scale between estimate and ground truth
+    gt = np.cumsum(rng.normal(0, 0.01, (n, 3)), 0)
+    rot = rotation(rng.normal(size=3), rng.uniform(0, np.pi))
+    est = rng.uniform(0.5, 2) * gt @ rot.T + rng.normal(0, 1, 3) + rng.normal(0, 0.005, (n, 3))
+    return gt, est
+
+
+def random_poses(rng, n):
+    poses = np.tile(np.identity(4), (n, 1, 1))
+    for i in range(n):
+        poses[i, :3, :3] = rotation(rng.normal(size=3), rng.uniform(0, 0.5))
+        poses[i, :3, 3] = rng.normal(0, 1, 3)
+    return poses
+
+
+def random_stamps(rng, n, rate):
+    # jittered sensor stamps with a few drops, as in TUM sequences
+    stamps = 1305031102.0 + np.arange(n) / rate + rng.normal(0, 0.002, n)
+    return stamps[rng.uniform(size=n) > 0.02]
+
+
+def test_associate_ties():
+    # 1.0 is 0.25 away from 0.75 and 1.25, 2.5 is 0.5 away from 2.0 and 3.0: the smaller
+    # stamps win, as with the sorted (diff, stamp1, stamp2) tuples
+    first = dict.fromkeys([1.0, 2.0, 3.0])
+    second = dict.fromkeys([0.75, 1.25, 2.5])
+    out = trajectory.associate(first, second, 0.0, 0.6)
+    assert out == associate_reference(first, second, 0.0, 0.6)
+    assert out == [(1.0, 0.75), (2.0, 2.5)]
+
+
+def test_associate_offset():
+    first = dict.fromkeys([1.0, 2.0, 3.0])
+    second = dict.fromkeys([0.51, 1.49, 2.5, 4.0])
+    out = trajectory.associate(first, second, 0.5, 0.02)
+    assert out == associate_reference(first, second, 0.5, 0.02)
+    assert out == [(1.0, 0.51), (2.0, 1.49), (3.0, 2.5)]
+
+
+def test_associate_empty():
+    assert trajectory.associate({}, dict.fromkeys([1.0])) == []
+    assert trajectory.associate(dict.fromkeys([1.0]), dict.fromkeys([5.0])) == []
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_associate_random(seed):
+    rng = np.random.RandomState(seed)
+    first = dict.fromkeys(random_stamps(rng, 300, 30.0))
+    second = dict.fromkeys(random_stamps(rng, 300, 30.0) + 0.01)
+    assert trajectory.associate(first, second, -0.01, 0.02) == associate_reference(first, second, -0.01, 0.02)
+
+
+@pytest.mark.parametrize("with_scale", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_align(with_scale, seed):
+    rng = np.random.RandomState(seed)
+    gt, est = random_trajectory(rng, 200)
+    rot, trans, trans_error, scale = trajectory.align(est.T, gt.T, with_scale)
+    ref_rot, ref_trans, ref_error, ref_scale = align_reference(numpy.matrix(est.T), numpy.matrix(gt.T), with_scale)
+    np.testing.assert_allclose(rot, np.asarray(ref_rot), atol=1e-9)
+    np.testing.assert_allclose(trans, np.asarray(ref_trans), atol=1e-9)
+    np.testing.assert_allclose(trans_error, ref_error, atol=1e-9)
+    assert scale == pytest.approx(ref_scale, abs=1e-12)
+
+
+def test_align_reflection():
+    # a mirrored estimate still gets a proper rotation
+    rng = np.random.RandomState(0)
+    gt, _ = random_trajectory(rng, 100)
+    est = gt * [1, 1, -1]
+    rot, _, trans_error, _ = trajectory.align(est.T, gt.T)
+    ref_rot, _, ref_error, _ = align_reference(numpy.matrix(est.T), numpy.matrix(gt.T))
+    assert np.linalg.det(rot) == pytest.approx(1.0)
+    np.testing.assert_allclose(rot, np.asarray(ref_rot), atol=1e-9)
+    np.testing.assert_allclose(trans_error, ref_error, atol=1e-9)
+
+
+@pytest.mark.parametrize("with_scale", [False, True])
+def test_ate_batch(with_scale):
+    rng = np.random.RandomState(0)
+    pairs = [random_trajectory(rng, 150) for _ in range(6)]
+    out = trajectory.ate(np.stack([gt for gt, _ in pairs]), np.stack([est for _, est in pairs]), with_scale)
+    for k, (gt, est) in enumerate(pairs):
+        _, _, error, scale = align_reference(numpy.matrix(est.T), numpy.matrix(gt.T), with_scale)
+        assert out["compared_pose_pairs"][k] == len(error)
+        assert out["absolute_translational_error.rmse"][k] == pytest.approx(np.sqrt(np.dot(error, error) / len(error)))
+        assert out["absolute_translational_error.median"][k] == pytest.approx(np.median(error))
+        assert out["absolute_translational_error.max"][k] == pytest.approx(np.max(error))
+        assert out["scale"][k] == pytest.approx(scale)
+
+
+def test_ate_poses():
+    # [B, n, 4, 4] poses are evaluated on their positions
+    rng = np.random.RandomState(0)
+    gt, est = random_poses(rng, 50), random_poses(rng, 50)
+    out = trajectory.ate(gt[None], est[None])
+    ref = trajectory.ate(gt[None, :, :3, 3], est[None, :, :3, 3])
+    assert out["absolute_translational_error.rmse"] == pytest.approx(ref["absolute_translational_error.rmse"])
+
+
+@pytest.mark.parametrize("with_scale", [False, True])
+def test_ate_masked(with_scale):
+    rng = np.random.RandomState(1)
+    pairs = [random_trajectory(rng, 120) for _ in range(3)]
+    gt = np.stack([gt for gt, _ in pairs])
+    est = np.stack([est for _, est in pairs])
+    valid = rng.uniform(size=gt.shape[:2]) > 0.3
+    # invalid poses must not leak into the result, even as nan or inf
+    est[~valid] = np.nan
+    gt[~valid & (rng.uniform(size=valid.shape) > 0.5)] = np.inf
+    out = trajectory.ate(gt, est, with_scale, valid)
+    for k in range(len(pairs)):
+        ref = trajectory.ate(gt[k:k + 1, valid[k]], est[k:k + 1, valid[k]], with_scale)
+        for key, value in ref.items():
+            assert out[key][k] == pytest.approx(value[0]), key
+
+
+@pytest.mark.parametrize("delta", [1, 3])
+def test_rpe(delta):
+    rng = np.random.RandomState(0)
+    gt, est = random_poses(rng, 40), random_poses(rng, 40)
+    out = trajectory.rpe(gt[None], est[None], delta)
+    trans_error, rot_error = rpe_reference(gt, est, delta)
+    assert out["relative_compared_pose_pairs"][0] == len(trans_error)
+    assert out["relative_translational_error.rmse"][0] == pytest.approx(np.sqrt(np.mean(trans_error ** 2)))
+    assert out["relative_rotational_error.mean"][0] == pytest.approx(np.mean(rot_error))
+    assert out["relative_rotational_error.max"][0] == pytest.approx(np.max(rot_error))
+
+
+def test_rpe_masked():
+    rng = np.random.RandomState(2)
+    gt, est = random_poses(rng, 60), random_poses(rng, 60)
+    valid = rng.uniform(size=60) > 0.3
+    gt[~valid] = np.nan
+    out = trajectory.rpe(gt[None], est[None], 1, valid[None])
+    trans_error, rot_error = rpe_reference(np.where(valid[:, None, None], gt, np.identity(4)), est)
+    pairs = valid[:-1] & valid[1:]
+    assert out["relative_compared_pose_pairs"][0] == pairs.sum()
+    assert out["relative_translational_error.rmse"][0] == pytest.approx(np.sqrt(np.mean(trans_error[pairs] ** 2)))
+    assert out["relative_rotational_error.median"][0] == pytest.approx(np.median(rot_error[pairs]))